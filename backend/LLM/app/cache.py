@@ -0,0 +1,170 @@
+# Services/LLM/app/cache.py
+"""
+Response cache in front of the providers.
+
+Exact hits are keyed by normalized messages + model + temperature. With LLM_CACHE_SEMANTIC=true
+a near-duplicate lookup also runs: the last user message is embedded (same sentence-transformers
+model the RAG Embedder uses, EMBED_MODEL) and compared against cached entries that share the
+same model, temperature and preceding conversation; cosine >= LLM_CACHE_SIMILARITY is a hit.
+Entries expire after LLM_CACHE_TTL_S and the cache is LRU-bounded to LLM_CACHE_MAX_ENTRIES.
+
+Both /v1/generate (SSE) and /v1/generate_json key on the primary (OpenAI) model the request
+targets, so they share entries; only primary answers are stored. A fallback (HF) answer is
+never cached under that key, or a later hit would replay it as the primary model's.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from prometheus_client import Counter
+
+try:
+    import numpy as np
+except Exception:  # semantic lookup needs numpy
+    np = None
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+LLM_CACHE_TTL_S = float(os.getenv("LLM_CACHE_TTL_S", "3600"))
+LLM_CACHE_SEMANTIC = os.getenv("LLM_CACHE_SEMANTIC", "false").lower() == "true"
+LLM_CACHE_SIMILARITY = float(os.getenv("LLM_CACHE_SIMILARITY", "0.95"))
+EMBED_MODEL = os.getenv("EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+# Registered into the service REGISTRY by app.main
+CACHE_LOOKUPS = Counter(
+    "llm_cache_lookups_total",
+    "Response cache lookups by result (hit_exact, hit_semantic, miss)",
+    ["result"],
+    registry=None,
+)
+
+_WS = re.compile(r"\s+")
+
+
+def _norm(text: str) -> str:
+    return _WS.sub(" ", (text or "").strip()).casefold()
+
+
+def _field(m: Any, name: str) -> str:
+    return (m.get(name) if isinstance(m, dict) else getattr(m, name, "")) or ""
+
+
+@dataclass
+class CachedResponse:
+    text: str
+    provider: str
+    model: str
+    fallback_used: bool = False
+    usage: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class _Entry:
+    response: CachedResponse
+    expires_at: float
+    scope: str
+    vector: Any = None
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+        ttl_s: float = LLM_CACHE_TTL_S,
+        semantic: bool = LLM_CACHE_SEMANTIC,
+        threshold: float = LLM_CACHE_SIMILARITY,
+        embedder: Any = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.semantic = semantic and np is not None
+        self.threshold = threshold
+        self._embedder = embedder
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+
+    # -------- keys --------
+    @staticmethod
+    def keys(messages: List[Any], model: str, temperature: Optional[float]) -> Tuple[str, str, str]:
+        """(exact_key, scope_key, query): scope covers everything but the last user message."""
+        norm = [(_field(m, "role"), _norm(_field(m, "content"))) for m in messages]
+        query = norm[-1][1] if norm else ""
+        head = json.dumps([model, round(float(temperature or 0.0), 3)], ensure_ascii=False)
+        scope = hashlib.sha256((head + json.dumps(norm[:-1], ensure_ascii=False)).encode("utf-8")).hexdigest()
+        exact = hashlib.sha256((scope + "\x00" + query).encode("utf-8")).hexdigest()
+        return exact, scope, query
+
+    # -------- embedding (optional) --------
+    def _get_embedder(self):
+        if self._embedder is None:
+            from sentence_transformers import SentenceTransformer  # optional dependency
+            self._embedder = SentenceTransformer(EMBED_MODEL)
+        return self._embedder
+
+    async def _embed(self, text: str):
+        def _run():
+            vec = self._get_embedder().encode([text], convert_to_numpy=True, normalize_embeddings=True)[0]
+            return np.asarray(vec, dtype=np.float32)
+        try:
+            return await asyncio.to_thread(_run)
+        except Exception:
+            self.semantic = False  # model unavailable: degrade to exact-only
+            return None
+
+    # -------- LRU/TTL --------
+    def _live(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def get(self, messages: List[Any], model: str, temperature: Optional[float]) -> Optional[CachedResponse]:
+        if not LLM_CACHE_ENABLED:
+            return None
+        exact, scope, query = self.keys(messages, model, temperature)
+        entry = self._live(exact)
+        if entry is not None:
+            CACHE_LOOKUPS.labels(result="hit_exact").inc()
+            return entry.response
+        if self.semantic and query:
+            candidates = [(k, e) for k, e in self._entries.items() if e.scope == scope and e.vector is not None]
+            if candidates:
+                vec = await self._embed(query)
+                if vec is not None:
+                    best_key, best_sim = None, -1.0
+                    for k, e in candidates:
+                        sim = float(np.dot(vec, e.vector))
+                        if sim > best_sim:
+                            best_key, best_sim = k, sim
+                    if best_key is not None and best_sim >= self.threshold and self._live(best_key) is not None:
+                        CACHE_LOOKUPS.labels(result="hit_semantic").inc()
+                        return self._entries[best_key].response
+        CACHE_LOOKUPS.labels(result="miss").inc()
+        return None
+
+    async def put(self, messages: List[Any], model: str, temperature: Optional[float], response: CachedResponse) -> None:
+        if not LLM_CACHE_ENABLED or not response.text:
+            return
+        exact, scope, query = self.keys(messages, model, temperature)
+        vector = await self._embed(query) if self.semantic and query else None
+        self._entries[exact] = _Entry(response, time.monotonic() + self.ttl_s, scope, vector)
+        self._entries.move_to_end(exact)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,113 @@
+# Services/LLM/app/coalesce.py
+"""
+Single-flight coalescing for identical deterministic generations.
+
+When a request with temperature 0 arrives while an identical one (same messages, model,
+max_tokens, tools) is already streaming from a provider, it subscribes to that upstream
+stream instead of opening its own: every frame is recorded once and fanned out to all
+waiters, late joiners first replay what was already sent. The upstream is cancelled only
+when every subscriber has gone away.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+from typing import Any, AsyncGenerator, Callable, Dict, List, Optional
+
+from prometheus_client import Counter, Gauge
+
+LLM_COALESCE_ENABLED = os.getenv("LLM_COALESCE_ENABLED", "true").lower() == "true"
+
+# Registered into the service REGISTRY by app.main
+COALESCED_REQUESTS = Counter(
+    "llm_coalesced_requests_total",
+    "Requests served by subscribing to an identical in-flight generation",
+    registry=None,
+)
+INFLIGHT_GENERATIONS = Gauge(
+    "llm_inflight_generations",
+    "Distinct coalescable generations currently streaming from a provider",
+    registry=None,
+)
+
+
+def coalesce_key(messages: List[Any], model: str, temperature: Optional[float],
+                 max_tokens: Optional[int], tools: Optional[List[Any]] = None) -> Optional[str]:
+    """Key for deterministic requests only (temperature 0); None means don't coalesce."""
+    if not LLM_COALESCE_ENABLED or temperature is None or float(temperature) != 0.0:
+        return None
+    norm = [m if isinstance(m, dict) else m.model_dump() for m in messages]
+    raw = json.dumps([model, max_tokens, norm, tools], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    def __init__(self):
+        self.frames: List[bytes] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.changed = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+
+    async def _pump(self, key: str, flight: _Flight, producer: Callable[[], AsyncGenerator[bytes, None]]):
+        INFLIGHT_GENERATIONS.inc()
+        try:
+            async for frame in producer():
+                async with flight.changed:
+                    flight.frames.append(frame)
+                    flight.changed.notify_all()
+        except asyncio.CancelledError:
+            flight.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            INFLIGHT_GENERATIONS.dec()
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            async with flight.changed:
+                flight.done = True
+                flight.changed.notify_all()
+
+    async def stream(self, key: str, producer: Callable[[], AsyncGenerator[bytes, None]]) -> AsyncGenerator[bytes, None]:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._pump(key, flight, producer))
+        else:
+            COALESCED_REQUESTS.inc()
+
+        flight.subscribers += 1
+        idx = 0
+        try:
+            while True:
+                async with flight.changed:
+                    await flight.changed.wait_for(lambda: idx < len(flight.frames) or flight.done)
+                    pending = flight.frames[idx:]
+                    finished = flight.done
+                for frame in pending:
+                    yield frame
+                idx += len(pending)
+                if finished and idx >= len(flight.frames):
+                    break
+            if flight.error is not None and not isinstance(flight.error, asyncio.CancelledError):
+                raise flight.error
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done and flight.task is not None:
+                # Everyone disconnected: stop paying for the upstream stream
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+
+single_flight = SingleFlight()
@@ -19,6 +19,8 @@ app = FastAPI(title="LLM Service", version="1.0.0")
 
 # Import & include the SSE router (provides POST /v1/generate with streaming)
 from app.routes import generate_sse
+from app.cache import CACHE_LOOKUPS, CachedResponse, response_cache
+from app.coalesce import COALESCED_REQUESTS, INFLIGHT_GENERATIONS
 app.include_router(generate_sse.router)
 
 # -----------------------------------------------------------------------------
@@ -77,6 +79,7 @@ class ChatResponse(BaseModel):
     model: str
     output: str
     fallback_used: bool = False
+    cache_hit: bool = False
 
 # -----------------------------------------------------------------------------
 # Prometheus metrics
@@ -100,6 +103,9 @@ REQUEST_LATENCY = Histogram(
     registry=REGISTRY,
 )
 UP = Gauge("llm_up", "Service liveness gauge", registry=REGISTRY)
+REGISTRY.register(CACHE_LOOKUPS)
+REGISTRY.register(COALESCED_REQUESTS)
+REGISTRY.register(INFLIGHT_GENERATIONS)
 
 # -----------------------------------------------------------------------------
 # Provider errors
@@ -228,10 +234,19 @@ class LLMService:
         self.fallback = HFProvider()
 
     async def generate(self, req: ChatRequest) -> ChatResponse:
+        # Response cache (exact, optionally semantic) in front of both providers
+        cached = await response_cache.get(req.messages, self.primary.model, req.temperature)
+        if cached is not None:
+            jlog("info", route="/v1/generate_json", event="cache.hit", provider=cached.provider, model=cached.model)
+            return ChatResponse(provider=cached.provider, model=cached.model, output=cached.text,
+                                fallback_used=cached.fallback_used, cache_hit=True)
+
         # Try primary
         jlog("info", route="/v1/generate_json", event="provider.start", provider=self.primary.name, model=self.primary.model)
         try:
             out = await self.primary.generate(req)
+            await response_cache.put(req.messages, self.primary.model, req.temperature,
+                                     CachedResponse(text=out, provider=self.primary.name, model=self.primary.model))
             return ChatResponse(provider=self.primary.name, model=self.primary.model, output=out, fallback_used=False)
         except ProviderError as e:
             PROVIDER_ERRORS.labels(provider=self.primary.name, code=e.code).inc()
@@ -244,6 +259,7 @@ class LLMService:
         jlog("info", route="/v1/generate_json", event="provider.start", provider=self.fallback.name, model=self.fallback.model)
         try:
             out = await self.fallback.generate(req)
+            # not cached: the key names the primary model, a later hit must not replay the fallback's answer
             return ChatResponse(provider=self.fallback.name, model=self.fallback.model, output=out, fallback_used=True)
         except ProviderError as e:
             PROVIDER_ERRORS.labels(provider=self.fallback.name, code=e.code).inc()
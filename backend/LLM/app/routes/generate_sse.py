@@ -4,6 +4,7 @@ from __future__ import annotations
 import asyncio
 import json
 import os
+import re
 import time
 from typing import Any, AsyncGenerator, Dict, List, Optional
 
@@ -14,6 +15,8 @@ from pydantic import BaseModel, Field
 
 # Use your existing SSE helpers
 from app.sse import sse_event, heartbeat_comment
+from app.cache import CachedResponse, response_cache
+from app.coalesce import coalesce_key, single_flight
 
 router = APIRouter(prefix="/v1", tags=["generate-sse"])
 
@@ -34,7 +37,7 @@ class ChatRequest(BaseModel):
 # -------- Provider Config --------
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "").strip()
 OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
-OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o")  # same default as /v1/generate_json (shared cache keys)
 
 HF_API_TOKEN = os.getenv("HF_API_TOKEN", "").strip()
 HF_BASE_URL = os.getenv("HF_BASE_URL", "https://api-inference.huggingface.co").rstrip("/")
@@ -58,11 +61,12 @@ def _to_prompt(req: ChatRequest) -> str:
         return "\n".join(parts)
     return ""
 
-async def _openai_stream(req: ChatRequest) -> AsyncGenerator[bytes, None]:
+async def _openai_stream(req: ChatRequest, sink: Optional[List[str]] = None) -> AsyncGenerator[bytes, None]:
     """
     Try native OpenAI streaming. Emits:
       - event: llm.token  data: {"delta": "...", "provider":"openai"}
       - event: llm.done   data: {"model":..., "provider":"openai", "usage": {...}, "fallback_used": false}
+    Deltas are also appended to `sink` when given (used to fill the response cache).
     """
     if not OPENAI_API_KEY:
         raise RuntimeError("OPENAI_API_KEY not set")
@@ -77,7 +81,7 @@ async def _openai_stream(req: ChatRequest) -> AsyncGenerator[bytes, None]:
     body = {
         "model": req.model or OPENAI_MODEL,
         "messages": [m if isinstance(m, dict) else m.model_dump() for m in messages],
-        "temperature": req.temperature or 0.2,
+        "temperature": 0.2 if req.temperature is None else req.temperature,
         "stream": True,
         "max_tokens": req.max_tokens or 512,
     }
@@ -97,7 +101,7 @@ async def _openai_stream(req: ChatRequest) -> AsyncGenerator[bytes, None]:
             async for raw in resp.aiter_lines():
                 if not raw:
                     # keepalive for clients
-                    yield heartbeat_comment().encode("utf-8")
+                    yield heartbeat_comment()
                     continue
                 if raw.startswith("data: "):
                     data = raw[6:]
@@ -111,7 +115,7 @@ async def _openai_stream(req: ChatRequest) -> AsyncGenerator[bytes, None]:
                         "usage": {},
                         "fallback_used": False,
                     }
-                    yield sse_event("llm.done", done_payload).encode("utf-8")
+                    yield sse_event("llm.done", done_payload)
                     break
 
                 try:
@@ -123,7 +127,9 @@ async def _openai_stream(req: ChatRequest) -> AsyncGenerator[bytes, None]:
                 choice = (payload.get("choices") or [{}])[0]
                 delta = (choice.get("delta") or {}).get("content")
                 if delta:
-                    yield sse_event("llm.token", {"delta": delta, "provider": provider}).encode("utf-8")
+                    if sink is not None:
+                        sink.append(delta)
+                    yield sse_event("llm.token", {"delta": delta, "provider": provider})
 
 async def _hf_complete(req: ChatRequest) -> str:
     """
@@ -137,7 +143,7 @@ async def _hf_complete(req: ChatRequest) -> str:
     prompt = _to_prompt(req) or (req.messages[-1].content if req.messages else "")
     body = {
         "messages": req.messages,
-        "temperature": req.temperature or 0.2,
+        "temperature": 0.2 if req.temperature is None else req.temperature,
         "max_new_tokens": req.max_tokens or 512,
         "return_full_text": False,
         "model": HF_MODEL
@@ -177,6 +183,19 @@ async def _emit_chunked_tokens(text: str, provider: str, model: Optional[str]) -
         "fallback_used": provider != "openai",  # mark true for HF fallback
     })
 
+async def _replay_cached(cached: CachedResponse) -> AsyncGenerator[bytes, None]:
+    """Stream a cached answer as llm.token/llm.done frames (whitespace preserved), marked cache_hit."""
+    for piece in re.findall(r"\S+\s*|\s+", cached.text):
+        yield sse_event("llm.token", {"delta": piece, "provider": cached.provider, "cache_hit": True})
+        await asyncio.sleep(0)
+    yield sse_event("llm.done", {
+        "model": cached.model,
+        "provider": cached.provider,
+        "usage": cached.usage,
+        "fallback_used": cached.fallback_used,
+        "cache_hit": True,
+    })
+
 # -------- The streaming endpoint (SAME PATH as existing JSON /v1/generate) --------
 @router.post("/generate")
 async def generate_stream(
@@ -204,12 +223,20 @@ async def generate_stream(
         # Here we force streaming for orchestrator scenario.
         wants_stream = True
 
-    async def gen() -> AsyncGenerator[bytes, None]:
+    cache_messages = req.messages or [ChatMessage(role="user", content=_to_prompt(req))]
+    # Same key inputs as /v1/generate_json: the primary model and the temperature it's called with
+    cache_model = req.model or OPENAI_MODEL
+    cache_temperature = 0.2 if req.temperature is None else req.temperature
+
+    async def generate_frames() -> AsyncGenerator[bytes, None]:
         # Try OpenAI native streaming first
         if OPENAI_API_KEY:
             try:
-                async for frame in _openai_stream(req):
+                parts: List[str] = []
+                async for frame in _openai_stream(req, sink=parts):
                     yield frame
+                await response_cache.put(cache_messages, cache_model, cache_temperature, CachedResponse(
+                    text="".join(parts), provider="openai", model=req.model or OPENAI_MODEL))
                 return
             except Exception as e:
                 # Log error but don't emit error event yet - try fallback first
@@ -220,6 +247,7 @@ async def generate_stream(
         if HF_API_TOKEN:
             try:
                 text = await _hf_complete(req)
+                # not cached: the key names the primary model (see cache_model)
                 async for frame in _emit_chunked_tokens(text, provider="huggingface", model=req.model or HF_MODEL):
                     yield frame
                 return
@@ -232,6 +260,21 @@ async def generate_stream(
         # If we get here, OpenAI failed and no HF token
         yield sse_event("error", {"code": "OPENAI_STREAM_FAIL", "message": "OpenAI failed and no fallback configured"})
 
+    # Identical deterministic requests share one upstream stream
+    flight_key = coalesce_key(cache_messages, cache_model, req.temperature, req.max_tokens, req.tools)
+
+    async def gen() -> AsyncGenerator[bytes, None]:
+        # Serve repeated / near-duplicate questions from the response cache
+        cached = await response_cache.get(cache_messages, cache_model, cache_temperature)
+        if cached is not None:
+            async for frame in _replay_cached(cached):
+                yield frame
+            return
+
+        frames = single_flight.stream(flight_key, generate_frames) if flight_key else generate_frames()
+        async for frame in frames:
+            yield frame
+
     return StreamingResponse(
         gen(),
         status_code=200,
@@ -0,0 +1,101 @@
+# tests/test_coalesce.py
+"""
+Single-flight coalescing: identical deterministic requests share one upstream stream, late
+joiners replay what was already sent, errors reach every subscriber, and the upstream is
+cancelled only when the last subscriber leaves.
+"""
+
+import asyncio
+
+from app.coalesce import SingleFlight, coalesce_key
+
+MSGS = [{"role": "user", "content": "hi"}]
+
+
+def test_only_deterministic_requests_get_a_key():
+    assert coalesce_key(MSGS, "gpt-4o", 0.0, 512) == coalesce_key(MSGS, "gpt-4o", 0, 512)
+    assert coalesce_key(MSGS, "gpt-4o", 0.2, 512) is None
+    assert coalesce_key(MSGS, "gpt-4o", None, 512) is None
+    assert coalesce_key(MSGS, "gpt-4o", 0.0, 512) != coalesce_key(MSGS, "gpt-4o", 0.0, 256)
+
+
+def test_identical_requests_share_one_upstream_and_late_joiners_replay():
+    async def run():
+        flights = SingleFlight()
+        started = 0
+        release = asyncio.Event()
+
+        async def producer():
+            nonlocal started
+            started += 1
+            yield b"a"
+            yield b"b"
+            await release.wait()
+            yield b"c"
+
+        async def collect():
+            return [f async for f in flights.stream("k", producer)]
+
+        first = asyncio.ensure_future(collect())
+        await asyncio.sleep(0.01)  # first subscriber has seen a, b
+        late = asyncio.ensure_future(collect())
+        await asyncio.sleep(0.01)
+        release.set()
+        assert await first == await late == [b"a", b"b", b"c"]
+        assert started == 1
+        assert not flights._flights  # finished flights are forgotten: the next request starts fresh
+
+    asyncio.run(run())
+
+
+def test_errors_reach_every_subscriber():
+    async def run():
+        flights = SingleFlight()
+
+        async def producer():
+            yield b"a"
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream reset")
+
+        async def collect():
+            frames = []
+            try:
+                async for f in flights.stream("k", producer):
+                    frames.append(f)
+            except RuntimeError as e:
+                return frames, str(e)
+
+        results = await asyncio.gather(collect(), collect())
+        assert results == [([b"a"], "upstream reset")] * 2
+
+    asyncio.run(run())
+
+
+def test_upstream_is_cancelled_only_when_everyone_leaves():
+    async def run():
+        flights = SingleFlight()
+        cancelled = asyncio.Event()
+
+        async def producer():
+            try:
+                yield b"a"
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        async def read_one():
+            stream = flights.stream("k", producer)
+            frame = await stream.__anext__()
+            return stream, frame
+
+        (s1, f1), (s2, f2) = await asyncio.gather(read_one(), read_one())
+        assert f1 == f2 == b"a"
+        await s1.aclose()
+        await asyncio.sleep(0.01)
+        assert not cancelled.is_set()  # one subscriber is still listening
+        await s2.aclose()
+        await asyncio.wait_for(cancelled.wait(), 1.0)
+        assert not flights._flights
+
+    asyncio.run(run())
@@ -0,0 +1,147 @@
+# tests/test_response_cache.py
+"""
+Response cache: normalized exact keys, TTL/LRU bounds, near-duplicate (semantic) hits, and
+one key derivation shared by /v1/generate (SSE) and /v1/generate_json, with fallback answers
+kept out of the cache.
+"""
+
+import asyncio
+import json
+
+import numpy as np
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.cache import CachedResponse, ResponseCache
+
+MSGS = [{"role": "system", "content": "Be brief."}, {"role": "user", "content": "What is BM25?"}]
+
+
+class _FakeEmbedder:
+    """Bag of letters: near-identical strings get near-identical vectors."""
+
+    def encode(self, texts, convert_to_numpy=True, normalize_embeddings=True):
+        out = np.zeros((len(texts), 26), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for ch in text:
+                if "a" <= ch <= "z":
+                    out[row, ord(ch) - 97] += 1.0
+        return out / np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-9)
+
+
+def test_exact_hits_ignore_case_and_whitespace_but_not_model_or_temperature():
+    async def run():
+        cache = ResponseCache(max_entries=8, ttl_s=60, semantic=False)
+        await cache.put(MSGS, "gpt-4o", 0.2, CachedResponse(text="A ranking function.", provider="openai", model="gpt-4o"))
+        hit = await cache.get([{"role": "system", "content": "be brief."},
+                               {"role": "user", "content": "  what is   BM25? "}], "gpt-4o", 0.2)
+        assert hit is not None and hit.text == "A ranking function."
+        assert await cache.get(MSGS, "gpt-4o-mini", 0.2) is None
+        assert await cache.get(MSGS, "gpt-4o", 0.7) is None
+        assert await cache.get(MSGS[1:], "gpt-4o", 0.2) is None  # different conversation
+
+    asyncio.run(run())
+
+
+def test_ttl_and_lru_bounds():
+    async def run():
+        cache = ResponseCache(max_entries=2, ttl_s=60, semantic=False)
+        for q in ("one", "two", "three"):
+            await cache.put([{"role": "user", "content": q}], "m", 0.0, CachedResponse(text=q, provider="openai", model="m"))
+        assert await cache.get([{"role": "user", "content": "one"}], "m", 0.0) is None
+        assert (await cache.get([{"role": "user", "content": "three"}], "m", 0.0)).text == "three"
+
+        expired = ResponseCache(max_entries=2, ttl_s=-1, semantic=False)
+        await expired.put(MSGS, "m", 0.0, CachedResponse(text="x", provider="openai", model="m"))
+        assert await expired.get(MSGS, "m", 0.0) is None
+
+    asyncio.run(run())
+
+
+def test_semantic_hits_only_within_the_same_conversation_scope():
+    async def run():
+        cache = ResponseCache(max_entries=8, ttl_s=60, semantic=True, threshold=0.9, embedder=_FakeEmbedder())
+        await cache.put(MSGS, "m", 0.0, CachedResponse(text="ranking", provider="openai", model="m"))
+        near = MSGS[:-1] + [{"role": "user", "content": "what's BM25"}]
+        assert (await cache.get(near, "m", 0.0)).text == "ranking"
+        assert await cache.get(MSGS[:-1] + [{"role": "user", "content": "tell me a joke"}], "m", 0.0) is None
+        assert await cache.get([{"role": "user", "content": "what's BM25"}], "m", 0.0) is None
+
+    asyncio.run(run())
+
+
+def _sse_client(monkeypatch, cache, openai_fails):
+    from app.routes import generate_sse
+
+    calls = {"openai": 0, "hf": 0}
+
+    async def openai_stream(req, sink=None):
+        calls["openai"] += 1
+        if openai_fails:
+            raise RuntimeError("openai down")
+        sink.append("From OpenAI.")
+        yield generate_sse.sse_event("llm.token", {"delta": "From OpenAI.", "provider": "openai"})
+        yield generate_sse.sse_event("llm.done", {"provider": "openai"})
+
+    async def hf_complete(req):
+        calls["hf"] += 1
+        return "From HF."
+
+    monkeypatch.setattr(generate_sse, "response_cache", cache)
+    monkeypatch.setattr(generate_sse, "OPENAI_API_KEY", "k")
+    monkeypatch.setattr(generate_sse, "HF_API_TOKEN", "t")
+    monkeypatch.setattr(generate_sse, "_openai_stream", openai_stream)
+    monkeypatch.setattr(generate_sse, "_hf_complete", hf_complete)
+    app = FastAPI()
+    app.include_router(generate_sse.router)
+    return TestClient(app), calls
+
+
+def _done(body: str):
+    frames = [f for f in body.split("\n\n") if f.startswith("event: llm.done")]
+    return json.loads(frames[-1].split("data: ", 1)[1])
+
+
+def test_streaming_and_json_endpoints_share_keys(monkeypatch):
+    from app import main
+
+    cache = ResponseCache(max_entries=8, ttl_s=60, semantic=False)
+    client, calls = _sse_client(monkeypatch, cache, openai_fails=False)
+    monkeypatch.setattr(main, "response_cache", cache)
+    body = {"messages": MSGS, "temperature": 0.2}
+    assert _done(client.post("/v1/generate", json=body).text).get("cache_hit") is None
+    assert _done(client.post("/v1/generate", json=body).text)["cache_hit"] is True
+    assert calls["openai"] == 1
+
+    async def primary_unused(req):
+        raise AssertionError("should be served from the cache")
+
+    monkeypatch.setattr(main.svc.primary, "generate", primary_unused)
+    resp = asyncio.run(main.svc.generate(main.ChatRequest(messages=MSGS, temperature=0.2)))
+    assert resp.cache_hit and resp.output == "From OpenAI." and resp.provider == "openai"
+
+
+def test_fallback_answers_are_not_cached(monkeypatch):
+    from app import main
+
+    cache = ResponseCache(max_entries=8, ttl_s=60, semantic=False)
+    client, calls = _sse_client(monkeypatch, cache, openai_fails=True)
+    body = {"messages": MSGS, "temperature": 0.2}
+    for _ in range(2):
+        done = _done(client.post("/v1/generate", json=body).text)
+        assert done["fallback_used"] is True and "cache_hit" not in done
+    assert calls == {"openai": 2, "hf": 2}
+
+    async def primary_down(req):
+        raise main.ProviderError("UPSTREAM_ERROR", "down", 503)
+
+    async def fallback(req):
+        return "From HF."
+
+    monkeypatch.setattr(main, "response_cache", cache)
+    monkeypatch.setattr(main.svc.primary, "generate", primary_down)
+    monkeypatch.setattr(main.svc.fallback, "generate", fallback)
+    for _ in range(2):
+        resp = asyncio.run(main.svc.generate(main.ChatRequest(messages=MSGS, temperature=0.2)))
+        assert resp.fallback_used and not resp.cache_hit
+    assert len(cache._entries) == 0
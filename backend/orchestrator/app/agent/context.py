@@ -0,0 +1,141 @@
+"""
+Token-budgeted prompt assembly.
+
+Packs system instructions, retrieved snippets and session history into CONTEXT_TOKEN_BUDGET
+tokens, counted with the same cl100k_base encoder the RAG service chunks with. The system
+text and the user message always go in; snippets get up to CONTEXT_SNIPPET_SHARE of what is
+left (in rank order); history fills the rest newest-first, so the oldest turns are truncated
+and then dropped first as a session grows.
+"""
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from ..config import settings
+from ..metrics import prompt_history_dropped, prompt_tokens
+
+try:
+    import tiktoken
+except Exception:
+    tiktoken = None
+
+# Per-message framing overhead in chat formats (role, separators)
+_MESSAGE_OVERHEAD = 4
+# Don't bother keeping a truncated snippet/message shorter than this
+_MIN_PARTIAL_TOKENS = 32
+
+
+@lru_cache(maxsize=1)
+def _encoder():
+    if tiktoken:
+        try:
+            return tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            return None
+    return None
+
+
+def count_tokens(text: str) -> int:
+    enc = _encoder()
+    if enc:
+        return len(enc.encode(text))
+    return (len(text) + 3) // 4  # ~4 chars/token heuristic
+
+
+def truncate_tokens(text: str, max_tokens: int, keep: str = "head") -> str:
+    """Cut `text` to at most `max_tokens`, keeping its start ("head") or its end ("tail")."""
+    if max_tokens <= 0:
+        return ""
+    enc = _encoder()
+    if enc:
+        toks = enc.encode(text)
+        if len(toks) <= max_tokens:
+            return text
+        return enc.decode(toks[:max_tokens] if keep == "head" else toks[-max_tokens:])
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars] if keep == "head" else text[-max_chars:]
+
+
+@dataclass
+class PromptContext:
+    messages: List[Dict[str, str]]
+    snippets: List[Dict[str, Any]] = field(default_factory=list)  # snippets that made it in
+    tokens: int = 0
+    history_dropped: int = 0
+
+
+def _format_snippet(s: Dict[str, Any], text: str) -> str:
+    src = s.get("source_url") or s.get("doc_id") or ""
+    return f"[source:{src}] {text}" if src else text
+
+
+def build_prompt(
+    user_text: str,
+    history: Optional[List[Dict[str, str]]] = None,
+    snippets: Optional[List[Dict[str, Any]]] = None,
+    system: Optional[str] = None,
+    budget: Optional[int] = None,
+) -> PromptContext:
+    budget = settings.CONTEXT_TOKEN_BUDGET if budget is None else budget
+    history = history or []
+    snippets = snippets or []
+
+    system_parts = [p for p in [settings.CHAT_SYSTEM_PROMPT, system] if p]
+    base_system = "\n\n".join(system_parts)
+    used = count_tokens(user_text) + _MESSAGE_OVERHEAD
+    if base_system:
+        used += count_tokens(base_system) + _MESSAGE_OVERHEAD
+    remaining = available = max(0, budget - used)
+
+    # Snippets: rank order, capped at a share of what's left after the fixed parts
+    snippet_budget = int(remaining * settings.CONTEXT_SNIPPET_SHARE)
+    packed: List[Dict[str, Any]] = []
+    lines: List[str] = []
+    for s in snippets:
+        text = s.get("text") or ""
+        cost = count_tokens(_format_snippet(s, text)) + 2
+        if cost > snippet_budget:
+            if snippet_budget - 2 < _MIN_PARTIAL_TOKENS:
+                break
+            text = truncate_tokens(text, snippet_budget - 2 - count_tokens(_format_snippet(s, "")))
+            cost = snippet_budget
+        lines.append(_format_snippet(s, text))
+        packed.append({**s, "text": text})
+        snippet_budget -= cost
+        remaining -= cost
+        if snippet_budget <= 0:
+            break
+    if lines:
+        header = "Context snippets (read-only):"
+        remaining -= count_tokens(header) + (0 if base_system else _MESSAGE_OVERHEAD)
+        system_parts.append(header + "\n" + "\n\n".join(lines))
+
+    # History: newest first; the oldest message that doesn't fit keeps its tail, older ones drop
+    kept: List[Dict[str, str]] = []
+    for m in reversed(history):
+        content = m.get("content") or ""
+        cost = count_tokens(content) + _MESSAGE_OVERHEAD
+        if cost > remaining:
+            room = remaining - _MESSAGE_OVERHEAD - 1
+            if room >= _MIN_PARTIAL_TOKENS:
+                kept.append({"role": m.get("role", "user"), "content": "…" + truncate_tokens(content, room, keep="tail")})
+                remaining -= room + _MESSAGE_OVERHEAD + 1
+            break
+        kept.append({"role": m.get("role", "user"), "content": content})
+        remaining -= cost
+    kept.reverse()
+    dropped = len(history) - len(kept)
+
+    messages: List[Dict[str, str]] = []
+    if system_parts:
+        messages.append({"role": "system", "content": "\n\n".join(system_parts)})
+    messages.extend(kept)
+    messages.append({"role": "user", "content": user_text})
+
+    tokens = used + (available - remaining)
+    prompt_tokens.observe(tokens)
+    if dropped:
+        prompt_history_dropped.inc(dropped)
+    return PromptContext(messages=messages, snippets=packed, tokens=tokens, history_dropped=dropped)
@@ -1,20 +1,99 @@
 import json
-from typing import List, Dict
+import time
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
 import redis.asyncio as redis
 from ..config import settings
+from ..metrics import memory_cache_total
 
 SESSION_KEY = "sess:{sid}:chat"
 
 class MemoryStore:
-    def __init__(self):
-        self.r = redis.from_url(settings.REDIS_URL, decode_responses=True)
+    """
+    Session chat history in Redis, shared process-wide (see get_memory()).
 
-    async def append(self, sid: str, role: str, content: str, max_items: int = 20):
+    One connection pool per process; writes go out as a single MULTI pipeline
+    (RPUSH + LTRIM + EXPIRE + LRANGE); recent histories are kept in a small in-process LRU
+    so an active session's fetch doesn't hit Redis every turn. The cached list is always the
+    trimmed list Redis returned, never patched locally, so it can't drift or duplicate.
+    """
+
+    def __init__(self, url: Optional[str] = None, cache_size: Optional[int] = None,
+                 cache_ttl: Optional[float] = None, session_ttl: Optional[int] = None):
+        self.pool = redis.ConnectionPool.from_url(url or settings.REDIS_URL, decode_responses=True)
+        self.r = redis.Redis(connection_pool=self.pool)
+        self.cache_size = settings.MEMORY_CACHE_SIZE if cache_size is None else cache_size
+        self.cache_ttl = settings.MEMORY_CACHE_TTL_SECONDS if cache_ttl is None else cache_ttl
+        self.session_ttl = settings.MEMORY_SESSION_TTL_SECONDS if session_ttl is None else session_ttl
+        self._cache: "OrderedDict[str, Tuple[float, List[Dict]]]" = OrderedDict()
+        self._writes = 0  # bumped per append; a fetch that overlapped one doesn't cache its read
+
+    # ---- in-process LRU ----
+    def _cache_get(self, sid: str) -> Optional[List[Dict]]:
+        hit = self._cache.get(sid)
+        if hit is None or time.monotonic() - hit[0] > self.cache_ttl:
+            self._cache.pop(sid, None)
+            return None
+        self._cache.move_to_end(sid)
+        return hit[1]
+
+    def _cache_put(self, sid: str, items: List[Dict]):
+        if self.cache_size <= 0:
+            return
+        self._cache[sid] = (time.monotonic(), items)
+        self._cache.move_to_end(sid)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    # ---- Redis ----
+    async def append_many(self, sid: str, messages: List[Dict[str, str]], max_items: int = 20):
+        """Append messages and trim/expire the session in one round-trip."""
         key = SESSION_KEY.format(sid=sid)
-        await self.r.rpush(key, json.dumps({"role":role,"content":content}))
-        await self.r.ltrim(key, -max_items, -1)
+        async with self.r.pipeline(transaction=True) as pipe:
+            pipe.rpush(key, *[json.dumps({"role":m["role"],"content":m["content"]}) for m in messages])
+            pipe.ltrim(key, -max_items, -1)
+            if self.session_ttl:
+                pipe.expire(key, self.session_ttl)
+            pipe.lrange(key, 0, -1)
+            self._writes += 1
+            results = await pipe.execute()
+        self._cache_put(sid, [json.loads(i) for i in results[-1]])
+
+    async def append(self, sid: str, role: str, content: str, max_items: int = 20):
+        await self.append_many(sid, [{"role":role,"content":content}], max_items=max_items)
+
+    async def append_turn(self, sid: str, user: str, assistant: str, max_items: int = 20):
+        await self.append_many(sid, [{"role":"user","content":user}, {"role":"assistant","content":assistant}], max_items=max_items)
 
     async def fetch(self, sid: str) -> List[Dict]:
+        cached = self._cache_get(sid)
+        if cached is not None:
+            memory_cache_total.labels("hit").inc()
+            return list(cached)
+        memory_cache_total.labels("miss").inc()
         key = SESSION_KEY.format(sid=sid)
-        items = await self.r.lrange(key, 0, -1)
-        return [json.loads(i) for i in items]
+        writes = self._writes
+        items = [json.loads(i) for i in await self.r.lrange(key, 0, -1)]
+        if writes == self._writes:
+            self._cache_put(sid, items)
+        return list(items)
+
+    async def aclose(self):
+        self._cache.clear()
+        await self.pool.disconnect()
+
+
+_store: Optional[MemoryStore] = None
+
+def get_memory() -> MemoryStore:
+    """Process-wide MemoryStore (one Redis connection pool, one LRU)."""
+    global _store
+    if _store is None:
+        _store = MemoryStore()
+    return _store
+
+async def close_memory():
+    global _store
+    if _store is not None:
+        await _store.aclose()
+        _store = None
@@ -0,0 +1,116 @@
+"""
+Pre-LLM turn preparation.
+
+Retrieval, session memory, style lookup and LLM connection warm-up are independent, so they
+run concurrently. The turn waits at most RAG_RETRIEVAL_DEADLINE_SECONDS for retrieval and
+TURN_PREP_DEADLINE_SECONDS for memory and style, then proceeds with whatever finished.
+First-token latency becomes max() of the stages instead of their sum.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from ..config import settings
+from ..logging import json_log
+from ..metrics import rag_deadline_exceeded, turn_prep_latency
+from ..upstreams import get_registry
+from .memory import get_memory
+from .tools import sentiment_style
+
+# Keep references to fire-and-forget tasks so they aren't garbage collected mid-flight
+_background: set = set()
+
+
+@dataclass
+class TurnPrep:
+    snippets: Optional[List[Dict[str, Any]]] = None  # None when RAG wasn't requested
+    history: List[Dict[str, Any]] = field(default_factory=list)
+    style_instructions: Optional[str] = None
+    rag_timed_out: bool = False
+    rag_seconds: Optional[float] = None  # how long retrieval took (None if it didn't finish)
+
+
+def _spawn(coro: Awaitable) -> asyncio.Task:
+    task = asyncio.ensure_future(coro)
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+    return task
+
+
+async def _timed(stage: str, coro: Awaitable, elapsed: Optional[Dict[str, float]] = None) -> Any:
+    t0 = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        seconds = time.perf_counter() - t0
+        turn_prep_latency.labels(stage).observe(seconds)
+        if elapsed is not None:
+            elapsed[stage] = seconds
+
+
+async def _fetch_history(sid: str) -> List[Dict[str, Any]]:
+    return await get_memory().fetch(sid)
+
+
+async def _bounded(tasks: List[asyncio.Task], timeout: float) -> set:
+    """Wait up to `timeout` for `tasks`; cancel the ones still running."""
+    if not tasks:
+        return set()
+    done, pending = await asyncio.wait(tasks, timeout=timeout)
+    for t in pending:
+        t.cancel()
+    return done
+
+
+def _result(task: Optional[asyncio.Task], done: set, stage: str, cid: str) -> Any:
+    if task is None or task not in done:
+        return None
+    exc = task.exception()
+    if exc is not None:
+        json_log(event="turn_prep_failed", stage=stage, error=str(exc), cid=cid)
+        return None
+    return task.result()
+
+
+async def prepare_turn(
+    query: str,
+    retrieve: Optional[Callable[[], Awaitable[List[Dict[str, Any]]]]] = None,
+    sid: str = "",
+    cid: str = "",
+) -> TurnPrep:
+    """Run the pre-LLM stages of a turn concurrently, each bounded by its deadline."""
+    _spawn(get_registry().warm("llm"))
+
+    elapsed: Dict[str, float] = {}
+    rag_task = asyncio.ensure_future(_timed("rag", retrieve(), elapsed)) if retrieve else None
+    mem_task = asyncio.ensure_future(_timed("memory", _fetch_history(sid))) if sid else None
+    style_task = (
+        asyncio.ensure_future(_timed("style", sentiment_style(query, cid=cid, sid=sid)))
+        if settings.SENTIMENT_URL else None
+    )
+    others = [t for t in (mem_task, style_task) if t is not None]
+
+    rag_done, other_done = await asyncio.gather(
+        _bounded([rag_task] if rag_task is not None else [], settings.RAG_RETRIEVAL_DEADLINE_SECONDS),
+        _bounded(others, settings.TURN_PREP_DEADLINE_SECONDS),
+    )
+    done = rag_done | other_done
+    for task, stage in ((mem_task, "memory"), (style_task, "style")):
+        if task is not None and task not in done:
+            json_log(event="turn_prep_deadline_exceeded", stage=stage,
+                     deadline_s=settings.TURN_PREP_DEADLINE_SECONDS, cid=cid)
+
+    prep = TurnPrep()
+    if rag_task is not None:
+        prep.snippets = _result(rag_task, done, "rag", cid) or []
+        if rag_task in done:
+            prep.rag_seconds = elapsed.get("rag")
+        else:
+            prep.rag_timed_out = True
+            rag_deadline_exceeded.inc()
+            json_log(event="rag_deadline_exceeded", deadline_s=settings.RAG_RETRIEVAL_DEADLINE_SECONDS, cid=cid)
+    prep.history = _result(mem_task, done, "memory", cid) or []
+    style = _result(style_task, done, "style", cid) or {}
+    prep.style_instructions = style.get("system_instructions") or None
+    return prep
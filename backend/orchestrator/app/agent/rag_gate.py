@@ -0,0 +1,205 @@
+"""
+RAG gating: decide per turn whether retrieval is worth its round-trip.
+
+Shared by the chat routes and run_turn; the policy is picked with RAG_GATE_POLICY:
+
+- "length": the original heuristic (query length >= RAG_AUTO_LENGTH_THRESHOLD).
+- "adaptive" (default): scores cheap signals and compares against a threshold it tunes itself
+  from how useful past retrievals turned out:
+    * knowledge cues (keyword classifier) and question shape,
+    * similarity of the query's terms to a profile of the collection built from snippets that
+      proved useful (a lexical stand-in for the collection centroid: the orchestrator has no
+      embedder of its own),
+    * the session's usefulness history (sessions whose retrievals keep missing need a stronger
+      signal, sessions that keep citing snippets a weaker one).
+  A retrieval is useful when its top score clears RAG_GATE_MIN_USEFUL_SCORE and the reply
+  actually used (cited) a snippet.
+  The learned threshold can't lock retrieval out: it's capped below the keyword signal, relaxes
+  back toward its starting value by RAG_GATE_DECAY per decision, and every
+  RAG_GATE_EXPLORE_EVERY-th query that the starting threshold would have let through retrieves
+  anyway (reason "explore"), so the gate keeps getting feedback.
+
+An explicit use_rag flag from the client always wins.
+"""
+import math
+import re
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from ..config import settings
+from ..metrics import rag_gate_decisions, rag_gate_seconds_saved, rag_gate_threshold
+
+_KNOWLEDGE_CUES = re.compile(
+    r"\b(what is|what are|how to|how do|how does|explain|compare|reference|cite|define|difference between"
+    r"|according to|documentation|docs|policy|specification|why does|where can)\b"
+)
+_TERM = re.compile(r"[a-z0-9][a-z0-9_\-]{2,}")
+_STOPWORDS = frozenset(
+    "the and for are but not you your with this that from have has was were what when where which who why how "
+    "can could would should will about into over than then them they their there these those does did its it's "
+    "our out all any also just like more most some such very".split()
+)
+_SHINGLE = 5  # words in a reply run that must appear verbatim in a snippet to count as cited
+_SHARED_TERMS = 4  # or: distinct snippet terms (not from the query) the reply reuses, for paraphrases
+_MIN_THRESHOLD = 0.15
+_MAX_THRESHOLD = 0.4  # below the keyword signal (0.45): a knowledge question alone can always retrieve
+
+_MAX_SESSIONS = 4096
+_MAX_PROFILE_TERMS = 5000
+
+
+def _terms(text: str) -> List[str]:
+    return [t for t in _TERM.findall((text or "").lower()) if t not in _STOPWORDS]
+
+
+@dataclass
+class GateDecision:
+    use_rag: bool
+    reason: str  # forced | length | keyword | topic | session | explore | below_threshold
+    score: float = 0.0
+
+
+def cited(reply: str, snippets: List[Dict[str, Any]], query: str = "") -> bool:
+    """Did the reply use a snippet: mention its source, repeat a run of its words, or reuse
+    several of its terms that the query didn't already contain (a paraphrase)?"""
+    if not reply or not snippets:
+        return False
+    low = reply.lower()
+    words = low.split()
+    shingles = {" ".join(words[i:i + _SHINGLE]) for i in range(max(0, len(words) - _SHINGLE + 1))}
+    reply_terms = set(_terms(low)) - set(_terms(query))
+    for s in snippets:
+        for ref in (s.get("doc_id"), s.get("source_url")):
+            if ref and str(ref).lower() in low:
+                return True
+        text = " ".join((s.get("text") or "").lower().split())
+        if shingles and any(sh in text for sh in shingles):
+            return True
+        if len(reply_terms.intersection(_terms(text))) >= _SHARED_TERMS:
+            return True
+    return False
+
+
+class RagGate:
+    """Length heuristic; also the interface other policies implement."""
+    name = "length"
+
+    def decide(self, query: str, sid: str = "", use_rag_flag: Optional[bool] = None) -> GateDecision:
+        if use_rag_flag is not None:
+            return self._count(GateDecision(bool(use_rag_flag), "forced"))
+        use = len(query.strip()) >= settings.RAG_AUTO_LENGTH_THRESHOLD
+        return self._count(GateDecision(use, "length" if use else "below_threshold"))
+
+    def record(self, sid: str, query: str, snippets: Optional[List[Dict[str, Any]]], reply: str,
+               retrieval_seconds: Optional[float] = None) -> None:
+        """Feedback after a turn that retrieved; no-op for static policies."""
+
+    def _count(self, decision: GateDecision) -> GateDecision:
+        rag_gate_decisions.labels("use" if decision.use_rag else "skip", decision.reason).inc()
+        return decision
+
+
+class AdaptiveRagGate(RagGate):
+    name = "adaptive"
+
+    def __init__(self, threshold: Optional[float] = None, min_useful_score: Optional[float] = None,
+                 learning_rate: Optional[float] = None, decay: Optional[float] = None,
+                 explore_every: Optional[int] = None):
+        self.threshold = settings.RAG_GATE_THRESHOLD if threshold is None else threshold
+        self.initial_threshold = self.threshold
+        self.min_useful_score = settings.RAG_GATE_MIN_USEFUL_SCORE if min_useful_score is None else min_useful_score
+        self.learning_rate = settings.RAG_GATE_LEARNING_RATE if learning_rate is None else learning_rate
+        self.decay = settings.RAG_GATE_DECAY if decay is None else decay
+        self.explore_every = settings.RAG_GATE_EXPLORE_EVERY if explore_every is None else explore_every
+        self._explore_skips = 0  # skipped queries the initial threshold would have retrieved for
+        self._sessions: "OrderedDict[str, float]" = OrderedDict()  # sid -> usefulness EMA
+        self._profile: Counter = Counter()                         # term -> weight from useful snippets
+        self._profile_norm = 0.0
+        self._retrieval_seconds = 0.0                              # EMA of what a retrieval costs
+        rag_gate_threshold.set(self.threshold)
+
+    # ---- signals ----
+    def _topic_similarity(self, terms: List[str]) -> float:
+        if not terms or not self._profile_norm:
+            return 0.0
+        q = Counter(terms)
+        dot = sum(c * self._profile.get(t, 0) for t, c in q.items())
+        return dot / (math.sqrt(sum(c * c for c in q.values())) * self._profile_norm)
+
+    def score(self, query: str, sid: str = "") -> Dict[str, float]:
+        low = query.lower()
+        terms = _terms(low)
+        signals = {
+            "keyword": 0.45 if _KNOWLEDGE_CUES.search(low) else 0.0,
+            "question": 0.1 if low.rstrip().endswith("?") and len(terms) >= 2 else 0.0,
+            "length": 0.25 * min(1.0, len(query.strip()) / max(1, settings.RAG_AUTO_LENGTH_THRESHOLD)),
+            "topic": 0.5 * self._topic_similarity(terms),
+            "session": 0.3 * (self._sessions.get(sid, 0.5) - 0.5) if sid else 0.0,
+        }
+        return signals
+
+    def decide(self, query: str, sid: str = "", use_rag_flag: Optional[bool] = None) -> GateDecision:
+        if use_rag_flag is not None:
+            return self._count(GateDecision(bool(use_rag_flag), "forced"))
+        self._set_threshold(self.threshold + self.decay * (self.initial_threshold - self.threshold))
+        signals = self.score(query, sid)
+        total = sum(signals.values())
+        if total >= self.threshold:
+            reason = max(signals, key=signals.get)
+            return self._count(GateDecision(True, "keyword" if reason == "question" else reason, total))
+        if total >= self.initial_threshold and self.explore_every > 0:
+            self._explore_skips += 1
+            if self._explore_skips >= self.explore_every:
+                self._explore_skips = 0
+                return self._count(GateDecision(True, "explore", total))
+        if self._retrieval_seconds:
+            rag_gate_seconds_saved.inc(self._retrieval_seconds)
+        return self._count(GateDecision(False, "below_threshold", total))
+
+    # ---- feedback ----
+    def _set_threshold(self, value: float) -> None:
+        self.threshold = min(_MAX_THRESHOLD, max(_MIN_THRESHOLD, value))
+        rag_gate_threshold.set(self.threshold)
+
+    def record(self, sid: str, query: str, snippets: Optional[List[Dict[str, Any]]], reply: str,
+               retrieval_seconds: Optional[float] = None) -> None:
+        if snippets is None:
+            return  # didn't retrieve: nothing to learn
+        top = max((float(s.get("score") or 0.0) for s in snippets), default=0.0)
+        was_cited = cited(reply, snippets, query)
+        usefulness = 0.5 * (top >= self.min_useful_score) + 0.5 * was_cited
+
+        if sid:
+            prev = self._sessions.pop(sid, 0.5)
+            self._sessions[sid] = 0.7 * prev + 0.3 * usefulness
+            while len(self._sessions) > _MAX_SESSIONS:
+                self._sessions.popitem(last=False)
+
+        # Useless retrievals push the bar up, useful ones pull it down
+        self._set_threshold(self.threshold + self.learning_rate * (0.5 - usefulness))
+
+        if usefulness >= 0.5:
+            for s in snippets:
+                self._profile.update(_terms(s.get("text") or ""))
+            self._profile.update(_terms(query))
+            if len(self._profile) > _MAX_PROFILE_TERMS:
+                self._profile = Counter(dict(self._profile.most_common(_MAX_PROFILE_TERMS // 2)))
+            self._profile_norm = math.sqrt(sum(c * c for c in self._profile.values()))
+
+        if retrieval_seconds is not None:
+            self._retrieval_seconds = (
+                retrieval_seconds if not self._retrieval_seconds
+                else 0.8 * self._retrieval_seconds + 0.2 * retrieval_seconds
+            )
+
+
+_POLICIES = {"length": RagGate, "adaptive": AdaptiveRagGate}
+_gate: Optional[RagGate] = None
+
+
+def get_rag_gate() -> RagGate:
+    global _gate
+    if _gate is None:
+        _gate = _POLICIES.get(settings.RAG_GATE_POLICY, AdaptiveRagGate)()
+    return _gate
@@ -0,0 +1,133 @@
+"""
+In-process cache for RAG /v1/retrieve responses.
+
+Follow-up turns often re-ask the same thing ("what is X?" / "What is X"), so responses
+(results plus mode/reranked) are kept keyed by normalized query + top_k + filters in two LRU tiers: a small one per session
+(an active conversation keeps its hits even when the global tier churns) and a global one
+shared by all sessions. Entries expire after RETRIEVAL_CACHE_TTL_SECONDS.
+
+The RAG index is shared by every session, so a new or re-ingested document can change the
+ranking of any query: /v1/ingest empties both tiers and bumps a generation counter, so a
+retrieval that was already in flight during the ingest isn't cached either. RAG indexes in the
+background (202 + job id), so the cache is invalidated again when that job ends.
+"""
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from ..config import settings
+from ..metrics import retrieval_cache_total
+
+_WS = re.compile(r"\s+")
+_TRAILING_PUNCT = re.compile(r"[\s?.!,;:]+$")
+
+# (generation, stored_at, response)
+_Entry = Tuple[int, float, Dict[str, Any]]
+
+
+def normalize_query(q: str) -> str:
+    return _TRAILING_PUNCT.sub("", _WS.sub(" ", (q or "").strip()).casefold())
+
+
+def _copy(response: Dict[str, Any]) -> Dict[str, Any]:
+    return {**response, "results": [dict(r) for r in response.get("results", [])]}
+
+
+def cache_key(query: str, top_k: int, filters: Optional[Dict[str, Any]] = None) -> str:
+    raw = json.dumps([normalize_query(query), int(top_k), filters or None], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class RetrievalCache:
+    def __init__(self, max_entries: Optional[int] = None, session_entries: Optional[int] = None,
+                 max_sessions: Optional[int] = None, ttl: Optional[float] = None):
+        self.max_entries = settings.RETRIEVAL_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.session_entries = settings.RETRIEVAL_CACHE_SESSION_ENTRIES if session_entries is None else session_entries
+        self.max_sessions = settings.RETRIEVAL_CACHE_MAX_SESSIONS if max_sessions is None else max_sessions
+        self.ttl = settings.RETRIEVAL_CACHE_TTL_SECONDS if ttl is None else ttl
+        self.generation = 0
+        self._global: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._sessions: "OrderedDict[str, OrderedDict[str, _Entry]]" = OrderedDict()
+
+    def _live(self, tier: "OrderedDict[str, _Entry]", key: str) -> Optional[Dict[str, Any]]:
+        hit = tier.get(key)
+        if hit is None:
+            return None
+        gen, stored_at, response = hit
+        if gen != self.generation or time.monotonic() - stored_at > self.ttl:
+            del tier[key]
+            return None
+        tier.move_to_end(key)
+        return response
+
+    def get(self, sid: str, query: str, top_k: int, filters: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        if not settings.RETRIEVAL_CACHE_ENABLED:
+            return None
+        key = cache_key(query, top_k, filters)
+        session = self._sessions.get(sid) if sid else None
+        if session is not None:
+            self._sessions.move_to_end(sid)
+            response = self._live(session, key)
+            if response is not None:
+                retrieval_cache_total.labels("hit_session").inc()
+                return _copy(response)
+        response = self._live(self._global, key)
+        if response is not None:
+            retrieval_cache_total.labels("hit_global").inc()
+            if sid:
+                self._put_session(sid, key, self._global[key])
+            return _copy(response)
+        retrieval_cache_total.labels("miss").inc()
+        return None
+
+    def put(self, sid: str, query: str, top_k: int, response: Dict[str, Any],
+            filters: Optional[Dict[str, Any]] = None, generation: Optional[int] = None) -> None:
+        """`generation` is `self.generation` read before the retrieval started."""
+        if not settings.RETRIEVAL_CACHE_ENABLED:
+            return
+        if generation is not None and generation != self.generation:
+            return  # an ingest landed while this retrieval was running
+        key = cache_key(query, top_k, filters)
+        entry = (self.generation, time.monotonic(), _copy(response))
+        self._global[key] = entry
+        self._global.move_to_end(key)
+        while len(self._global) > self.max_entries:
+            self._global.popitem(last=False)
+        if sid:
+            self._put_session(sid, key, entry)
+
+    def _put_session(self, sid: str, key: str, entry: _Entry) -> None:
+        if self.session_entries <= 0:
+            return
+        session = self._sessions.get(sid)
+        if session is None:
+            session = self._sessions[sid] = OrderedDict()
+        self._sessions.move_to_end(sid)
+        session[key] = entry
+        session.move_to_end(key)
+        while len(session) > self.session_entries:
+            session.popitem(last=False)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def invalidate(self) -> None:
+        """Called after an ingest: everything cached so far may be out of date."""
+        self.generation += 1
+        self.clear()
+
+    def clear(self) -> None:
+        self._global.clear()
+        self._sessions.clear()
+
+
+_cache: Optional[RetrievalCache] = None
+
+
+def get_retrieval_cache() -> RetrievalCache:
+    global _cache
+    if _cache is None:
+        _cache = RetrievalCache()
+    return _cache
@@ -1,33 +1,92 @@
-from typing import AsyncIterator, Dict, Any
-from .tools import rag_retrieve, llm_generate, tts_speak
-from .memory import MemoryStore
+import asyncio, time
+from typing import AsyncIterator, Dict, Any, List, Optional
+from ..config import settings
+from ..metrics import time_to_first_audio_ms
+from .tools import rag_retrieve, llm_stream
+from .memory import MemoryStore, get_memory
+from .context import build_prompt
+from .pipeline import prepare_turn
+from .rag_gate import get_rag_gate
+from .speech import SentenceSegmenter, SpeechPipeline
+
+async def _remember(mem: MemoryStore, sid: str, text: str, reply: str):
+    await mem.append_turn(sid, text, reply)
 
 async def run_turn(text: str, voice: bool, cid: str, sid: str) -> AsyncIterator[Dict[str, Any]]:
     # Yield dict events: {"event": str, "data": Any} in the stable schema.
-    mem = MemoryStore()
+    t0 = time.perf_counter()
+    mem = get_memory()
 
-    # Simple policy: check for knowledge-y cues to use RAG
-    is_knowledge = any(q in text.lower() for q in ["what is", "how to", "explain", "compare", "reference", "cite"])
-    context = ""
-    if is_knowledge:
+    # Same gate as the chat routes (RAG_GATE_POLICY)
+    gate = get_rag_gate()
+    is_knowledge = gate.decide(text, sid=sid).use_rag
+
+    async def _retrieve():
         res = await rag_retrieve(text, top_k=3, cid=cid, sid=sid)
-        context = "\n\n".join([r.get("text","") for r in res.get("results", [])])
-        yield {"event":"tool.status","data":{"tool":"rag_retrieve","status":"ok","hits":len(res.get("results",[]))}}
-
-    # Build final prompt
-    prompt = f"{context}\n\nUser: {text}\nAssistant:" if context else text
-
-    # LLM
-    reply = await llm_generate(prompt, cid=cid, sid=sid)
-    await mem.append(sid, "user", text)
-    await mem.append(sid, "assistant", reply)
-
-    # Stream tokens primitively (split by space)
-    for tok in reply.split(" "):
-        yield {"event":"llm.token","data":tok}
-    yield {"event":"llm.done","data":{"length":len(reply)}}
-
-    if voice:
-        async for chunk in tts_speak(reply, cid=cid, sid=sid):
-            yield {"event":"tts.audio.chunk","data":chunk}
-        yield {"event":"tts.audio.done","data":{}}  # end of audio
+        return res.get("results", [])
+
+    # RAG, memory and style run concurrently; RAG is dropped past the retrieval deadline
+    prep = await prepare_turn(text, retrieve=_retrieve if is_knowledge else None, sid=sid, cid=cid)
+    if is_knowledge:
+        status = "timeout" if prep.rag_timed_out else "ok"
+        yield {"event":"tool.status","data":{"tool":"rag_retrieve","status":status,"hits":len(prep.snippets or [])}}
+
+    # Style, snippets and prior turns packed into the prompt token budget
+    messages = build_prompt(text, history=prep.history, snippets=prep.snippets, system=prep.style_instructions).messages
+
+    # LLM: forward tokens as they arrive; voice turns send each finished sentence to TTS
+    speech = SpeechPipeline(cid=cid, sid=sid) if voice else None
+    segmenter = SentenceSegmenter(min_chars=settings.TTS_MIN_SENTENCE_CHARS)
+    first_audio_ms: Optional[float] = None
+
+    def _audio(chunk: bytes) -> Dict[str, Any]:
+        nonlocal first_audio_ms
+        if first_audio_ms is None:
+            first_audio_ms = (time.perf_counter() - t0) * 1000.0
+            time_to_first_audio_ms.observe(first_audio_ms)
+        return {"event":"tts.audio.chunk","data":chunk}
+
+    parts: List[str] = []
+    done: Dict[str, Any] = {}
+    remember: Optional[asyncio.Future] = None
+    try:
+        async for event, data in llm_stream(messages, cid=cid, sid=sid):
+            if event == "llm.token":
+                delta = data.get("delta") or ""
+                if delta:
+                    parts.append(delta)
+                    yield {"event":"llm.token","data":delta}
+                    if speech:
+                        for sentence in segmenter.feed(delta):
+                            speech.submit(sentence)
+            elif event == "llm.done":
+                done = data
+            elif event == "error":
+                yield {"event":"error","data":data}
+                return
+            if speech:
+                for chunk in speech.ready():
+                    yield _audio(chunk)
+        reply = "".join(parts)
+        gate.record(sid, text, prep.snippets, reply, prep.rag_seconds)
+
+        # Persist the exchange while the remaining audio is synthesized
+        remember = asyncio.ensure_future(_remember(mem, sid, text, reply))
+        done = {**done, "length":len(reply)}
+        if prep.rag_timed_out:
+            done["rag_timed_out"] = True
+        yield {"event":"llm.done","data":done}
+
+        if speech:
+            tail = segmenter.flush()
+            if tail:
+                speech.submit(tail)
+            async for chunk in speech.drain():
+                yield _audio(chunk)
+            audio_done = {"time_to_first_audio_ms": first_audio_ms} if first_audio_ms is not None else {}
+            yield {"event":"tts.audio.done","data":audio_done}  # end of audio
+    finally:
+        if speech:
+            await speech.aclose()
+        if remember is not None:
+            await remember
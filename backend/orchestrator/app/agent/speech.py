@@ -0,0 +1,103 @@
+"""
+Sentence-pipelined TTS for voice turns.
+
+SentenceSegmenter cuts the LLM token stream into sentences as soon as each one is complete;
+SpeechPipeline synthesizes them concurrently (bounded) and hands audio back strictly in
+sentence order, so speaking starts after the first sentence instead of after the full reply.
+"""
+import asyncio
+import re
+from typing import AsyncIterator, List, Optional
+
+from ..config import settings
+from ..logging import json_log
+from ..metrics import errors_total
+from .tools import tts_speak
+
+# Sentence end: terminal punctuation (optionally closed by quotes/brackets) followed by whitespace
+_BOUNDARY = re.compile(r"[.!?…]+[\"')\]]*\s+|\n{2,}")
+
+_END = object()
+
+
+class SentenceSegmenter:
+    """Incrementally split streamed text into sentences of at least `min_chars` characters."""
+
+    def __init__(self, min_chars: int = 20):
+        self.min_chars = min_chars
+        self._buf = ""
+
+    def feed(self, delta: str) -> List[str]:
+        self._buf += delta
+        out: List[str] = []
+        start = 0
+        for m in _BOUNDARY.finditer(self._buf):
+            candidate = self._buf[start:m.end()].strip()
+            if len(candidate) >= self.min_chars:
+                out.append(candidate)
+                start = m.end()
+        self._buf = self._buf[start:]
+        return out
+
+    def flush(self) -> Optional[str]:
+        rest, self._buf = self._buf.strip(), ""
+        return rest or None
+
+
+class SpeechPipeline:
+    """Concurrent per-sentence synthesis with in-order audio delivery."""
+
+    def __init__(self, cid: str = "", sid: str = "", max_concurrency: Optional[int] = None):
+        self.cid = cid
+        self.sid = sid
+        self._sem = asyncio.Semaphore(max_concurrency or settings.TTS_MAX_CONCURRENT_SYNTHESES)
+        self._queues: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+        self._head = 0
+
+    def submit(self, sentence: str) -> None:
+        q: asyncio.Queue = asyncio.Queue()
+        self._queues.append(q)
+        self._tasks.append(asyncio.ensure_future(self._synthesize(sentence, q)))
+
+    async def _synthesize(self, sentence: str, q: asyncio.Queue) -> None:
+        try:
+            async with self._sem:
+                async for chunk in tts_speak(sentence, cid=self.cid, sid=self.sid):
+                    q.put_nowait(chunk)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            errors_total.labels("tts_sentence_failed").inc()
+            json_log(event="tts_sentence_failed", error=str(e), cid=self.cid)
+        finally:
+            q.put_nowait(_END)
+
+    def ready(self) -> List[bytes]:
+        """Audio already synthesized and next in order; never blocks."""
+        out: List[bytes] = []
+        while self._head < len(self._queues):
+            q = self._queues[self._head]
+            while not q.empty():
+                item = q.get_nowait()
+                if item is _END:
+                    self._head += 1
+                    break
+                out.append(item)
+            else:
+                break
+        return out
+
+    async def drain(self) -> AsyncIterator[bytes]:
+        """Remaining audio in order, waiting for outstanding syntheses."""
+        while self._head < len(self._queues):
+            item = await self._queues[self._head].get()
+            if item is _END:
+                self._head += 1
+            else:
+                yield item
+
+    async def aclose(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
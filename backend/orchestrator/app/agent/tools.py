@@ -1,55 +1,115 @@
-import asyncio, json, time
-from typing import Dict, Any, AsyncIterator
+import asyncio, time
+from typing import Dict, Any, AsyncIterator, List, Set, Tuple
 import httpx, backoff
 from ..config import settings
-from ..metrics import tool_latency
+from ..metrics import tool_latency, llm_tokens_total
+from ..sse import SSEParser
+from ..upstreams import upstream
+from .retrieval_cache import get_retrieval_cache
 
 def with_backoff():
     return backoff.on_exception(backoff.expo, (httpx.HTTPError, asyncio.TimeoutError), max_tries=settings.RETRIES+1)
 
 @with_backoff()
 async def rag_retrieve(query: str, top_k: int = 3, cid: str = "", sid: str = "") -> Dict[str, Any]:
-    url = f"{settings.RAG_URL}/v1/retrieve"
+    cache = get_retrieval_cache()
+    cached = cache.get(sid, query, top_k)
+    if cached is not None:
+        return cached
+    generation = cache.generation
     headers = {"x-correlation-id": cid, "x-session-id": sid}
     t0 = time.time()
-    async with httpx.AsyncClient(timeout=settings.REQUEST_TIMEOUT_SECONDS) as client:
-        resp = await client.get(url, params={"q": query, "top_k": top_k}, headers=headers)
-        resp.raise_for_status()
-        data = resp.json()
+    resp = await upstream("rag").get("/v1/retrieve", params={"q": query, "top_k": top_k}, headers=headers)
+    resp.raise_for_status()
+    data = resp.json()
     tool_latency.labels("rag_retrieve").observe(time.time()-t0)
+    cache.put(sid, query, top_k, data, generation=generation)
     return data
 
+# Background watchers of accepted RAG ingest jobs (kept referenced until they finish)
+_ingest_watchers: Set["asyncio.Task[None]"] = set()
+
+async def _invalidate_when_indexed(job_id: str, headers: Dict[str, str]) -> None:
+    """RAG indexes after answering 202; drop cached retrievals again once the job is over,
+    so results cached while it was still indexing (partial or old version) don't linger."""
+    deadline = time.monotonic() + settings.RAG_INGEST_WATCH_SECONDS
+    try:
+        while time.monotonic() < deadline:
+            await asyncio.sleep(settings.RAG_INGEST_POLL_SECONDS)
+            try:
+                resp = await upstream("rag").get(f"/v1/ingest/{job_id}", headers=headers)
+            except httpx.HTTPError:
+                continue
+            if resp.status_code == 404:  # job no longer known to RAG (restart): can't tell
+                break
+            if resp.status_code == 200 and resp.json().get("status") in ("done", "failed"):
+                break
+    finally:
+        get_retrieval_cache().invalidate()
+
 @with_backoff()
 async def rag_ingest(payload: Dict[str, Any], cid: str = "", sid: str = "") -> Dict[str, Any]:
-    url = f"{settings.RAG_URL}/v1/ingest"
     headers = {"x-correlation-id": cid, "x-session-id": sid}
     t0 = time.time()
-    async with httpx.AsyncClient(timeout=settings.REQUEST_TIMEOUT_SECONDS) as client:
-        resp = await client.post(url, json=payload, headers=headers)
-        resp.raise_for_status()
-        data = resp.json()
+    resp = await upstream("rag").post("/v1/ingest", json=payload, headers=headers)
+    get_retrieval_cache().invalidate()
+    resp.raise_for_status()
+    data = resp.json()
+    if resp.status_code == 202 and data.get("job_id"):
+        watcher = asyncio.ensure_future(_invalidate_when_indexed(data["job_id"], headers))
+        _ingest_watchers.add(watcher)
+        watcher.add_done_callback(_ingest_watchers.discard)
     tool_latency.labels("rag_ingest").observe(time.time()-t0)
     return data
 
 @with_backoff()
 async def llm_generate(prompt: str, cid: str = "", sid: str = "") -> str:
-    url = f"{settings.LLM_URL}/v1/generate"
     headers = {"x-correlation-id": cid, "x-session-id": sid}
     t0 = time.time()
-    async with httpx.AsyncClient(timeout=settings.REQUEST_TIMEOUT_SECONDS) as client:
-        resp = await client.post(url, json={"prompt": prompt}, headers=headers)
-        resp.raise_for_status()
-        data = resp.json()
+    resp = await upstream("llm").post("/v1/generate", json={"prompt": prompt}, headers=headers)
+    resp.raise_for_status()
+    data = resp.json()
     tool_latency.labels("llm_generate").observe(time.time()-t0)
     return data.get("text","")
 
+async def llm_stream(messages: List[Dict[str, str]], cid: str = "", sid: str = "") -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """Stream (event, data) pairs from the LLM's SSE /v1/generate as frames arrive."""
+    headers = {"x-correlation-id": cid, "x-session-id": sid, "Accept": "text/event-stream"}
+    prompt = messages[-1]["content"] if messages else ""
+    body = {"prompt": prompt, "messages": messages, "stream": True}
+    t0 = time.time()
+    async with upstream("llm").stream("POST", "/v1/generate", json=body, headers=headers) as resp:
+        if resp.status_code != 200:
+            detail = (await resp.aread()).decode("utf-8", "ignore")
+            yield "error", {"code": "LLM_UPSTREAM_ERROR", "message": f"LLM status {resp.status_code}", "details": detail}
+            return
+        parser = SSEParser()
+        async for chunk in resp.aiter_bytes():
+            for frame in parser.feed(chunk):
+                if not frame.event:
+                    continue
+                if frame.event == "llm.token":
+                    llm_tokens_total.labels("completion").inc()
+                yield frame.event, frame.json()
+    tool_latency.labels("llm_stream").observe(time.time()-t0)
+
 async def tts_speak(text: str, cid: str = "", sid: str = "") -> AsyncIterator[bytes]:
-    url = f"{settings.TTS_URL}/v1/tts"
     headers = {"x-correlation-id": cid, "x-session-id": sid}
     t0 = time.time()
-    async with httpx.AsyncClient(timeout=None) as client:
-        async with client.stream("POST", url, json={"text": text}, headers=headers) as resp:
-            resp.raise_for_status()
-            async for chunk in resp.aiter_bytes():
-                yield chunk
+    async with upstream("tts").stream("POST", "/v1/tts", json={"text": text}, headers=headers, timeout=None) as resp:
+        resp.raise_for_status()
+        async for chunk in resp.aiter_bytes():
+            yield chunk
     tool_latency.labels("tts_speak").observe(time.time()-t0)
+
+async def sentiment_style(text: str, cid: str = "", sid: str = "") -> Dict[str, Any]:
+    """Ask the sentiment service for style directives; {} when it isn't configured."""
+    if not settings.SENTIMENT_URL:
+        return {}
+    headers = {"x-correlation-id": cid, "x-session-id": sid}
+    t0 = time.time()
+    resp = await upstream("sentiment").post("/v1/analyze", json={"text": text, "return_style": True}, headers=headers)
+    resp.raise_for_status()
+    data = resp.json()
+    tool_latency.labels("sentiment_style").observe(time.time()-t0)
+    return data.get("style_directives") or {}
@@ -9,6 +9,8 @@ from fastapi import FastAPI, Request
 from .config import settings
 from .logging import RequestContextMiddleware
 from .middleware import add_cors, auth_hook
+from .upstreams import close_upstreams, get_registry
+from .agent.memory import close_memory
 from .routes import (
     health,
     config as cfg,
@@ -43,6 +45,17 @@ def create_app() -> FastAPI:
 
     app = FastAPI(title="Orchestrator", version="1.0.0")
 
+    # App-lifetime pooled clients for RAG/LLM/TTS/analytics (keep-alive across turns)
+    @app.on_event("startup")
+    async def _open_upstreams():
+        app.state.upstreams = get_registry()
+        app.state.upstreams.open_all()
+
+    @app.on_event("shutdown")
+    async def _close_shared_clients():
+        await close_upstreams()
+        await close_memory()
+
     # CORS + request context middleware (correlation IDs, etc.)
     add_cors(app)
     app.add_middleware(RequestContextMiddleware)
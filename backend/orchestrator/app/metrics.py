@@ -1,7 +1,42 @@
-from prometheus_client import Counter, Histogram
+from prometheus_client import Counter, Gauge, Histogram
 
 http_requests_total = Counter("orchestrator_requests_total", "HTTP requests", ["route","method"])
 ws_connections = Counter("orchestrator_ws_connections_total", "WS connections", ["route"])
+ws_open_connections = Gauge("orchestrator_ws_open_connections", "Currently open /v1/chat/ws sockets")
+ws_turns_per_connection = Histogram("orchestrator_ws_turns_per_connection", "Turns served per WS connection",
+                                    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89))
+ws_turns_cancelled = Counter("orchestrator_ws_turns_cancelled_total", "In-flight WS turns cancelled (barge-in)")
 tool_latency = Histogram("orchestrator_tool_latency_seconds", "Tool latency seconds", ["tool"])
 errors_total = Counter("orchestrator_errors_total", "Errors", ["code"])
 llm_tokens_total = Counter("orchestrator_llm_tokens_total", "Tokens", ["kind"])
+
+# Upstream connection pools (app/upstreams.py)
+upstream_inflight = Gauge("orchestrator_upstream_inflight_requests", "In-flight requests per upstream pool", ["upstream"])
+upstream_pool_limit = Gauge("orchestrator_upstream_pool_max_connections", "Configured max connections per upstream pool", ["upstream"])
+upstream_pool_timeouts = Counter("orchestrator_upstream_pool_timeouts_total", "Requests that timed out waiting for a pooled connection", ["upstream"])
+
+# Turn preparation (app/agent/pipeline.py)
+turn_prep_latency = Histogram("orchestrator_turn_prep_seconds", "Concurrent pre-LLM stage latency", ["stage"])
+rag_deadline_exceeded = Counter("orchestrator_rag_deadline_exceeded_total", "Turns that proceeded without RAG after the retrieval deadline")
+
+# Voice turns (app/agent/speech.py)
+time_to_first_audio_ms = Histogram(
+    "orchestrator_time_to_first_audio_ms", "Turn start to first TTS audio chunk (ms)",
+    buckets=(100, 250, 500, 750, 1000, 1500, 2000, 3000, 5000, 8000, 13000),
+)
+
+# Session memory (app/agent/memory.py)
+memory_cache_total = Counter("orchestrator_memory_cache_total", "Session history lookups by in-process cache result", ["result"])
+
+# RAG gating (app/agent/rag_gate.py)
+rag_gate_decisions = Counter("orchestrator_rag_gate_decisions_total", "RAG gate decisions per turn", ["decision", "reason"])
+rag_gate_seconds_saved = Counter("orchestrator_rag_gate_seconds_saved_total", "Estimated retrieval time saved by skipped retrievals")
+rag_gate_threshold = Gauge("orchestrator_rag_gate_threshold", "Current adaptive RAG gate threshold")
+
+# RAG result cache (app/agent/retrieval_cache.py)
+retrieval_cache_total = Counter("orchestrator_retrieval_cache_total", "RAG retrieve lookups by cache result (hit_session, hit_global, miss)", ["result"])
+
+# Prompt assembly (app/agent/context.py)
+prompt_tokens = Histogram("orchestrator_prompt_tokens", "Tokens in the assembled LLM prompt",
+                          buckets=(64, 128, 256, 512, 1024, 2048, 3072, 4096, 8192, 16384))
+prompt_history_dropped = Counter("orchestrator_prompt_history_dropped_total", "History messages dropped to fit the token budget")
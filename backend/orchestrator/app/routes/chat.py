@@ -39,7 +39,14 @@ except Exception:  # minimal shims if shared/ isn't vendored yet
     def sse_event(event: str, data: dict) -> bytes:
         return (f"event: {event}\n" + "data: " + json.dumps(data, ensure_ascii=False) + "\n\n").encode("utf-8")
 
+from ..agent.context import build_prompt
+from ..agent.memory import get_memory
+from ..agent.pipeline import TurnPrep, prepare_turn
+from ..agent.rag_gate import get_rag_gate
+from ..agent.retrieval_cache import get_retrieval_cache
 from ..config import settings
+from ..sse import SSEFrame, SSEParser
+from ..upstreams import upstream
 
 router = APIRouter(prefix="/v1", tags=["chat"])
 log = get_logger("orchestrator.chat")
@@ -63,165 +70,253 @@ CHAT_FALLBACK = Counter(
 )
 
 # ---------- Helpers ----------
-def _should_use_rag(query: str, use_rag_flag: Optional[bool]) -> bool:
-    if use_rag_flag is True:
-        return True
-    if use_rag_flag is False:
-        return False
-    # heuristic: use RAG for longer questions (customize as you like)
-    return len(query.strip()) >= settings.RAG_AUTO_LENGTH_THRESHOLD
-
-async def _retrieve_context(query: str, authorization: Optional[str]) -> List[Dict]:
-    """Call RAG /v1/retrieve top_k=3 and return results list."""
-    rag_url = settings.RAG_URL.rstrip("/") + "/v1/retrieve"
+def _should_use_rag(query: str, use_rag_flag: Optional[bool], sid: str = "") -> bool:
+    # explicit flag wins; otherwise the configured gate policy (RAG_GATE_POLICY) decides
+    return get_rag_gate().decide(query, sid=sid, use_rag_flag=use_rag_flag).use_rag
+
+async def _retrieve_context(query: str, authorization: Optional[str], sid: str = "") -> List[Dict]:
+    """Call RAG /v1/retrieve top_k=3 and return results list (served from the retrieval cache when fresh)."""
+    cache = get_retrieval_cache()
+    cached = cache.get(sid, query, 3)
+    if cached is not None:
+        return cached.get("results", [])
+    generation = cache.generation
     params = {"q": query, "top_k": 3}
     headers = {}
     if authorization:
         headers["Authorization"] = authorization
 
-    timeout = httpx.Timeout(15.0, connect=5.0)
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        r = await client.get(rag_url, params=params, headers=headers)
-        if r.status_code != 200:
-            log.warning("RAG retrieve failed: %s %s", r.status_code, r.text)
-            return []
-        payload = r.json()
-        return payload.get("results", [])
+    timeout = httpx.Timeout(15.0, connect=5.0, pool=settings.UPSTREAM_POOL_TIMEOUT_SECONDS)
+    r = await upstream("rag").get("/v1/retrieve", params=params, headers=headers, timeout=timeout)
+    if r.status_code != 200:
+        log.warning("RAG retrieve failed: %s %s", r.status_code, r.text)
+        return []
+    data = r.json()
+    cache.put(sid, query, 3, data, generation=generation)
+    return data.get("results", [])
 
 async def _emit_analytics(event_name: str, data: Dict, authorization: Optional[str]) -> None:
     """Fire-and-forget analytics emit; never block the response path."""
     if not settings.ANALYTICS_URL:
         return
-    url = settings.ANALYTICS_URL.rstrip("/") + "/v1/ingest"
     headers = {"Content-Type": "application/json"}
     if authorization:
         headers["Authorization"] = authorization
 
     async def _do():
         try:
-            async with httpx.AsyncClient(timeout=httpx.Timeout(5.0, connect=2.0)) as client:
-                await client.post(url, json={"event": event_name, "data": data}, headers=headers)
+            timeout = httpx.Timeout(5.0, connect=2.0, pool=settings.UPSTREAM_POOL_TIMEOUT_SECONDS)
+            await upstream("analytics").post(
+                "/v1/ingest", json={"event": event_name, "data": data}, headers=headers, timeout=timeout
+            )
         except Exception as e:
             log.debug("Analytics emit failed: %s", e)
 
     asyncio.create_task(_do())
 
-async def _stream_llm_sse(
+async def _llm_events(
     prompt: str,
-    context_snippets: Optional[List[Dict]],
     authorization: Optional[str],
-) -> AsyncGenerator[bytes, None]:
+    messages: Optional[List[Dict]] = None,
+) -> AsyncGenerator[SSEFrame, None]:
     """
-    Connect to LLM /v1/generate (SSE), pipe events to client, track first token latency,
-    count tokens, and forward final done event with provenance if used.
+    Typed event iterator over LLM /v1/generate (SSE). Frames are split without decoding their
+    payloads; first-token latency, token counts and fallbacks are metered here. Raises
+    HTTPException when the upstream answers with a non-200 status.
     """
-    llm_url = settings.LLM_URL.rstrip("/") + "/v1/generate"
     headers = {"Accept": "text/event-stream"}
     if authorization:
         headers["Authorization"] = authorization
 
     body = {
         "prompt": prompt,  # keep for providers that accept plain prompt
-        "messages": [
+        "messages": messages or [
             {"role": "user", "content": prompt}
-        ],                 # add for chat-style providers
+        ],                 # add for chat-style providers; snippets are packed into the system message
         "stream": True,
     }
-    if context_snippets:
-        body["context"] = context_snippets  # the LLM service can optionally leverage this
 
-    provider_seen: Optional[str] = None
     first_token_ms: Optional[float] = None
+    tokens = 0
     t0 = time.perf_counter()
 
-    timeout = httpx.Timeout(30.0, connect=5.0)
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        try:
-            async with client.stream("POST", llm_url, json=body, headers=headers) as resp:
-                if resp.status_code != 200:
-                    text = await resp.aread()
-                    raise HTTPException(status_code=resp.status_code, detail=text.decode("utf-8", "ignore"))
-
-                buffer = b""
-                async for chunk in resp.aiter_bytes():
-                    if not chunk:
-                        continue
-                    buffer += chunk
-
-                    while b"\n\n" in buffer:
-                        frame, buffer = buffer.split(b"\n\n", 1)
-                        # parse SSE frame
-                        event_name = None
-                        data_lines: List[bytes] = []
-                        for line in frame.split(b"\n"):
-                            if line.startswith(b"event:"):
-                                event_name = line[len(b"event:"):].strip().decode("utf-8", "ignore")
-                            elif line.startswith(b"data:"):
-                                data_lines.append(line[len(b"data:"):].strip())
-
-                        if not event_name:
-                            # skip comments/keepalives
-                            continue
-
-                        data_json: Dict = {}
-                        if data_lines:
-                            try:
-                                data_json = json.loads(b"\n".join(data_lines).decode("utf-8"))
-                            except Exception:
-                                data_json = {"raw": (b"\n".join(data_lines)).decode("utf-8", "ignore")}
-
-                        # Observe metrics & enrich
-                        if event_name == "llm.token":
-                            if first_token_ms is None:
-                                first_token_ms = (time.perf_counter() - t0) * 1000.0
-                                if provider_seen:
-                                    CHAT_FIRST_TOKEN_MS.labels(provider=provider_seen).observe(first_token_ms)
-                            # count tokens if available
-                            CHAT_TOKENS_STREAMED.labels(provider=provider_seen or "unknown").inc()
-                        elif event_name == "llm.done":
-                            provider_seen = data_json.get("provider") or provider_seen
-                            # fallbacks reported by LLM
-                            if data_json.get("fallback_used"):
-                                CHAT_FALLBACK.labels(provider=provider_seen or "unknown").inc()
-                            # attach provenance if we had context snippets
-                            if context_snippets is not None:
-                                data_json["provenance"] = [
-                                    {
-                                        "text": s.get("text"),
-                                        "score": s.get("score"),
-                                        "source_url": s.get("source_url"),
-                                        "doc_id": s.get("doc_id"),
-                                        "chunk_id": s.get("chunk_id"),
-                                    } for s in context_snippets
-                                ]
-                                # Re-emit the mutated llm.done payload
-                                yield sse_event("llm.done", data_json)
-                                # Also push analytics (fire-and-forget)
-                                await _emit_analytics(
-                                    "llm_complete",
-                                    {
-                                        "provider": data_json.get("provider"),
-                                        "model": data_json.get("model"),
-                                        "first_token_ms": first_token_ms,
-                                        "fallback_used": bool(data_json.get("fallback_used")),
-                                    },
-                                    authorization
-                                )
-                                continue
-
-                        # Remember provider if tokens carry it (some impls put it on token frames)
-                        if not provider_seen:
-                            provider_seen = data_json.get("provider")
-
-                        # pipe original frame through
-                        yield sse_event(event_name, data_json)
-
-        except HTTPException:
-            raise
-        except Exception as e:
-            log.exception("LLM streaming error: %s", e)
-            err = {"code": "LLM_STREAM_ERROR", "message": "Failed while streaming from LLM", "details": str(e)}
-            yield sse_event("error", err)
+    timeout = httpx.Timeout(30.0, connect=5.0, pool=settings.UPSTREAM_POOL_TIMEOUT_SECONDS)
+    async with upstream("llm").stream("POST", "/v1/generate", json=body, headers=headers, timeout=timeout) as resp:
+        if resp.status_code != 200:
+            text = await resp.aread()
+            raise HTTPException(status_code=resp.status_code, detail=text.decode("utf-8", "ignore"))
+
+        parser = SSEParser()
+        async for chunk in resp.aiter_bytes():
+            for frame in parser.feed(chunk):
+                if not frame.event:
+                    continue  # data-only frames carry nothing we relay
+                if frame.event == "llm.token":
+                    if first_token_ms is None:
+                        first_token_ms = (time.perf_counter() - t0) * 1000.0
+                    tokens += 1
+                elif frame.event == "llm.done":
+                    done = frame.json()
+                    provider = done.get("provider") or "unknown"
+                    if first_token_ms is not None:
+                        CHAT_FIRST_TOKEN_MS.labels(provider=provider).observe(first_token_ms)
+                    CHAT_TOKENS_STREAMED.labels(provider=provider).inc(tokens)
+                    # fallbacks reported by LLM
+                    if done.get("fallback_used"):
+                        CHAT_FALLBACK.labels(provider=provider).inc()
+                    yield _DoneFrame(frame, done, first_token_ms)
+                    continue
+                yield frame
+
+
+class _DoneFrame(SSEFrame):
+    """llm.done with its payload already decoded (the only frame the relay has to read)."""
+    __slots__ = ("payload", "first_token_ms")
+
+    def __init__(self, frame: SSEFrame, payload: Dict, first_token_ms: Optional[float]):
+        super().__init__(frame.event, frame.raw, frame._data_start)
+        self.payload = payload
+        self.first_token_ms = first_token_ms
+
+    def json(self) -> Dict:
+        return self.payload
+
+
+async def _stream_llm_sse(
+    prompt: str,
+    context_snippets: Optional[List[Dict]],
+    authorization: Optional[str],
+    messages: Optional[List[Dict]] = None,
+    done_extra: Optional[Dict] = None,
+    sink: Optional[List[str]] = None,
+) -> AsyncGenerator[bytes, None]:
+    """
+    Relay LLM /v1/generate (SSE) to the client. Frames are forwarded verbatim; only llm.done is
+    re-encoded, when provenance or `done_extra` (e.g. rag_timed_out) has to be attached.
+    `messages` is the assembled chat prompt (defaults to the bare user prompt) and token deltas
+    are appended to `sink` when given (the only case token payloads are decoded).
+    """
+    try:
+        async for frame in _llm_events(prompt, authorization, messages):
+            if frame.event == "llm.token":
+                if sink is not None:
+                    delta = frame.json().get("delta")
+                    if isinstance(delta, str):
+                        sink.append(delta)
+            elif frame.event == "llm.done" and (done_extra or context_snippets is not None):
+                data_json = dict(frame.json())
+                if done_extra:
+                    data_json.update(done_extra)
+                # attach provenance if we had context snippets
+                if context_snippets is not None:
+                    data_json["provenance"] = [
+                        {
+                            "text": s.get("text"),
+                            "score": s.get("score"),
+                            "source_url": s.get("source_url"),
+                            "doc_id": s.get("doc_id"),
+                            "chunk_id": s.get("chunk_id"),
+                        } for s in context_snippets
+                    ]
+                    # Also push analytics (fire-and-forget)
+                    await _emit_analytics(
+                        "llm_complete",
+                        {
+                            "provider": data_json.get("provider"),
+                            "model": data_json.get("model"),
+                            "first_token_ms": frame.first_token_ms,
+                            "fallback_used": bool(data_json.get("fallback_used")),
+                        },
+                        authorization
+                    )
+                # Re-emit the mutated llm.done payload
+                yield sse_event("llm.done", data_json)
+                continue
+
+            # pipe original frame through
+            yield frame.raw
+
+    except HTTPException as e:
+        # Headers are already sent on the streaming path: surface upstream failures in-band
+        log.warning("LLM upstream returned %s: %s", e.status_code, e.detail)
+        yield sse_event("error", {"code": "LLM_UPSTREAM_ERROR", "message": "LLM service returned an error",
+                                  "status": e.status_code, "details": e.detail})
+    except Exception as e:
+        log.exception("LLM streaming error: %s", e)
+        err = {"code": "LLM_STREAM_ERROR", "message": "Failed while streaming from LLM", "details": str(e)}
+        yield sse_event("error", err)
+
+
+async def _llm_collect(prompt: str, authorization: Optional[str], messages: List[Dict]) -> Dict:
+    """Aggregate the streamed reply from typed events: text plus llm.done metadata."""
+    parts: List[str] = []
+    done: Dict = {}
+    first_token_ms: Optional[float] = None
+    async for frame in _llm_events(prompt, authorization, messages):
+        if frame.event == "llm.token":
+            delta = frame.json().get("delta")
+            if isinstance(delta, str):
+                parts.append(delta)
+        elif frame.event == "llm.done":
+            done = frame.json()
+            first_token_ms = frame.first_token_ms
+        elif frame.event == "error":
+            raise HTTPException(status_code=502, detail=frame.json())
+    return {
+        "text": "".join(parts),
+        "provider": done.get("provider"),
+        "model": done.get("model"),
+        "fallback_used": bool(done.get("fallback_used")),
+        "first_token_ms": first_token_ms,
+    }
+
+
+async def _llm_complete(authorization: Optional[str], messages: List[Dict]) -> Dict:
+    """One non-streaming call to LLM /v1/generate_json (no SSE framing at all)."""
+    headers = {}
+    if authorization:
+        headers["Authorization"] = authorization
+    timeout = httpx.Timeout(30.0, connect=5.0, pool=settings.UPSTREAM_POOL_TIMEOUT_SECONDS)
+    r = await upstream("llm").post("/v1/generate_json", json={"messages": messages}, headers=headers, timeout=timeout)
+    if r.status_code != 200:
+        raise HTTPException(status_code=r.status_code, detail=r.text)
+    data = r.json()
+    if data.get("fallback_used"):
+        CHAT_FALLBACK.labels(provider=data.get("provider") or "unknown").inc()
+    return {
+        "text": data.get("output") or "",
+        "provider": data.get("provider"),
+        "model": data.get("model"),
+        "fallback_used": bool(data.get("fallback_used")),
+        "first_token_ms": None,
+    }
+
+
+def _turn_stream(
+    query: str,
+    prep: TurnPrep,
+    authorization: Optional[str],
+    sink: Optional[List[str]] = None,
+) -> AsyncGenerator[bytes, None]:
+    """LLM stream for a prepared turn: style, snippets and history packed into the token budget."""
+    ctx = build_prompt(query, history=prep.history, snippets=prep.snippets, system=prep.style_instructions)
+    return _stream_llm_sse(
+        query,
+        ctx.snippets if prep.snippets is not None else None,
+        authorization,
+        messages=ctx.messages,
+        done_extra={"rag_timed_out": True} if prep.rag_timed_out else None,
+        sink=sink,
+    )
+
+async def _remember(sid: str, query: str, reply: str) -> None:
+    """Append the exchange to session memory; never fails the response path."""
+    if not sid or not reply:
+        return
+    try:
+        await get_memory().append_turn(sid, query, reply)
+    except Exception as e:
+        log.warning("Session memory write failed: %s", e)
 
 
 # ---------- Routes ----------
@@ -234,7 +329,8 @@ async def chat_sync(
     """
     Optional sync mode:
     - If use_rag flag (or query length over threshold) -> fetch snippets from RAG
-    - Call LLM (still streamed internally), collect into a final string and return JSON
+    - Call LLM (streamed internally and aggregated from typed events, or one /v1/generate_json
+      call when CHAT_SYNC_GENERATE_JSON is set) and return JSON with model/provider/fallback_used
     """
     payload = await request.json()
     query: str = payload.get("query", "") or ""
@@ -243,55 +339,45 @@ async def chat_sync(
     if not query.strip():
         raise HTTPException(status_code=400, detail="query is required")
 
-    will_use_rag = _should_use_rag(query, use_rag_flag)
+    sid = request.headers.get("x-session-id", "")
+    will_use_rag = _should_use_rag(query, use_rag_flag, sid)
     CHAT_REQ_TOTAL.labels(mode="sync", used_rag=str(will_use_rag).lower()).inc()
 
-    snippets = await _retrieve_context(query, authorization) if will_use_rag else None
-
-    # Stream internally, concatenate tokens
-    final_text_parts: List[str] = []
-    first_token_ms: Optional[float] = None
-    provider_seen: Optional[str] = None
-    t0 = time.perf_counter()
+    prep = await prepare_turn(
+        query,
+        retrieve=(lambda: _retrieve_context(query, authorization, sid)) if will_use_rag else None,
+        sid=sid,
+        cid=request.headers.get("x-correlation-id", ""),
+    )
 
-    async for sse_bytes in _stream_llm_sse(query, snippets, authorization):
-        # parse our own SSE back
-        text = sse_bytes.decode("utf-8", "ignore")
-        current_event = None
-        for line in text.splitlines():
-            if line.startswith("event:"):
-                current_event = line.split("event:", 1)[1].strip()
-            elif line.startswith("data:"):
-                try:
-                    data = json.loads(line.split("data:", 1)[1].strip())
-                except Exception:
-                    data = {}
-
-                if current_event == "llm.token":
-                    if first_token_ms is None:
-                        first_token_ms = (time.perf_counter() - t0) * 1000.0
-                    delta = data.get("delta")
-                    if isinstance(delta, str):
-                        final_text_parts.append(delta)
-                    provider_seen = provider_seen or data.get("provider")
-                elif current_event == "llm.done":
-                    provider_seen = provider_seen or data.get("provider")
+    ctx = build_prompt(query, history=prep.history, snippets=prep.snippets, system=prep.style_instructions)
+    if settings.CHAT_SYNC_GENERATE_JSON:
+        result = await _llm_complete(authorization, ctx.messages)
+    else:
+        result = await _llm_collect(query, authorization, ctx.messages)
 
     # Emit analytics once per sync call
     await _emit_analytics(
         "llm_complete",
         {
-            "provider": provider_seen,
-            "model": None,  # filled by llm.done above in stream path if available; unknown here if not seen
-            "first_token_ms": first_token_ms,
-            "fallback_used": False,  # unknown unless llm.done observed; conservatively False
+            "provider": result["provider"],
+            "model": result["model"],
+            "first_token_ms": result["first_token_ms"],
+            "fallback_used": result["fallback_used"],
         },
         authorization
     )
 
-    return JSONResponse(
-        {"text": "".join(final_text_parts), "used_rag": will_use_rag, "provider": provider_seen}
-    )
+    await _remember(sid, query, result["text"])
+    get_rag_gate().record(sid, query, prep.snippets, result["text"], prep.rag_seconds)
+
+    return JSONResponse({
+        "text": result["text"],
+        "used_rag": will_use_rag,
+        "provider": result["provider"],
+        "model": result["model"],
+        "fallback_used": result["fallback_used"],
+    })
 
 
 @router.get("/chat/stream")
@@ -308,18 +394,30 @@ async def chat_stream(
       * llm.token {delta}
       * llm.done  {model,provider,usage,fallback_used}
       * error     {code,message,details}
-    - If RAG used, appends provenance to llm.done
+    - If RAG used, appends provenance to llm.done (plus rag_timed_out when the retrieval deadline hit)
     """
     if not q.strip():
         raise HTTPException(status_code=400, detail="q is required")
 
-    will_use_rag = _should_use_rag(q, use_rag)
+    headers = request.headers if request is not None else {}
+
+    sid = headers.get("x-session-id", "")
+    will_use_rag = _should_use_rag(q, use_rag, sid)
     CHAT_REQ_TOTAL.labels(mode="sse", used_rag=str(will_use_rag).lower()).inc()
 
     async def event_gen() -> AsyncGenerator[bytes, None]:
-        snippets = await _retrieve_context(q, authorization) if will_use_rag else None
-        async for frame in _stream_llm_sse(q, snippets, authorization):
+        prep = await prepare_turn(
+            q,
+            retrieve=(lambda: _retrieve_context(q, authorization, sid)) if will_use_rag else None,
+            sid=sid,
+            cid=headers.get("x-correlation-id", ""),
+        )
+        parts: List[str] = []
+        async for frame in _turn_stream(q, prep, authorization, sink=parts if sid or will_use_rag else None):
             yield frame
+        reply = "".join(parts)
+        await _remember(sid, q, reply)
+        get_rag_gate().record(sid, q, prep.snippets, reply, prep.rag_seconds)
 
     return StreamingResponse(
         event_gen(),
@@ -1,29 +1,155 @@
+"""
+Long-lived chat sessions on /v1/chat/ws.
+
+Client -> server (JSON text frames):
+  {"type": "turn", "text": "...", "voice": false, "session_id": "..."}   start a turn ("type" optional)
+  {"type": "cancel"}                                                    cancel the in-flight turn
+  {"type": "ping"} / {"type": "pong"}                                   keepalive
+Server -> client: {"event", "data", "turn_id"} JSON frames (turn.started, llm.token, llm.done,
+turn.done, turn.cancelled, ping, pong, ...) and binary frames for TTS audio.
+
+Many turns share one socket. A new turn while one is in flight barges in: the old turn is
+cancelled and its queued output dropped. Outbound frames go through a bounded queue; a client
+that stops reading for WS_SEND_TIMEOUT_SECONDS is disconnected.
+"""
+import asyncio
 import json
+import time
+from typing import Any, Optional, Set
+
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from ..metrics import ws_connections
+from ..config import settings
+from ..metrics import errors_total, ws_connections, ws_open_connections, ws_turns_cancelled, ws_turns_per_connection
 from ..agent.router import run_turn
 
 router = APIRouter()
 
+
+class _SlowConsumer(Exception):
+    pass
+
+
+class _Connection:
+    def __init__(self, ws: WebSocket):
+        self.ws = ws
+        self.outbox: asyncio.Queue = asyncio.Queue(maxsize=settings.WS_MAX_OUTBOUND_QUEUE)
+        self.closed = asyncio.Event()
+        self.cid = ws.headers.get("x-correlation-id","")
+        self.sid = ws.headers.get("x-session-id","")
+        self.turn: Optional[asyncio.Task] = None
+        self.turn_id = 0
+        self.turns = 0
+        self.cancelled: Set[int] = set()
+
+    async def send(self, item: Any, turn_id: Optional[int] = None):
+        """Queue a frame; blocks (backpressure) up to WS_SEND_TIMEOUT_SECONDS when the outbox is full."""
+        try:
+            await asyncio.wait_for(self.outbox.put((turn_id, item)), timeout=settings.WS_SEND_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            raise _SlowConsumer()
+
+    async def write_loop(self):
+        while True:
+            turn_id, item = await self.outbox.get()
+            if turn_id is not None and turn_id in self.cancelled:
+                continue  # output of a barged-in turn
+            if isinstance(item, (bytes, bytearray)):
+                await self.ws.send_bytes(item)
+            else:
+                await self.ws.send_text(json.dumps(item))
+
+    async def read_loop(self):
+        last_seen = time.monotonic()
+        while True:
+            try:
+                raw = await asyncio.wait_for(self.ws.receive_text(), timeout=settings.WS_PING_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                if time.monotonic() - last_seen >= settings.WS_IDLE_TIMEOUT_SECONDS:
+                    return
+                await self.send({"event":"ping","data":{}})
+                continue
+            last_seen = time.monotonic()
+            try:
+                payload = json.loads(raw)
+            except ValueError:
+                await self.send({"event":"tool.error","data":{"message":"invalid JSON"}})
+                continue
+            kind = payload.get("type") or ("turn" if "text" in payload else "")
+            if kind == "ping":
+                await self.send({"event":"pong","data":{}})
+            elif kind == "pong":
+                pass
+            elif kind == "cancel":
+                await self.cancel_turn()
+            elif kind == "turn":
+                await self.start_turn(payload)
+            else:
+                await self.send({"event":"tool.error","data":{"message":f"unknown message type: {kind!r}"}})
+
+    async def start_turn(self, payload: dict):
+        await self.cancel_turn()  # barge-in
+        self.turn_id += 1
+        self.turns += 1
+        text = payload.get("text","")
+        voice = bool(payload.get("voice", False))
+        sid = payload.get("session_id") or self.sid
+        cid = payload.get("correlation_id") or self.cid
+        self.turn = asyncio.ensure_future(self._run_turn(self.turn_id, text, voice, cid, sid))
+
+    async def cancel_turn(self):
+        if self.turn is None or self.turn.done():
+            return
+        turn_id = self.turn_id
+        self.cancelled.add(turn_id)
+        self.turn.cancel()
+        await asyncio.gather(self.turn, return_exceptions=True)
+        ws_turns_cancelled.inc()
+        await self.send({"event":"turn.cancelled","data":{},"turn_id":turn_id})
+
+    async def _run_turn(self, turn_id: int, text: str, voice: bool, cid: str, sid: str):
+        try:
+            await self.send({"event":"turn.started","data":{},"turn_id":turn_id}, turn_id)
+            async for event in run_turn(text, voice, cid, sid):
+                if event["event"].startswith("tts.audio.") and isinstance(event["data"], (bytes, bytearray)):
+                    await self.send(event["data"], turn_id)
+                else:
+                    await self.send({**event, "turn_id":turn_id}, turn_id)
+            await self.send({"event":"turn.done","data":{},"turn_id":turn_id}, turn_id)
+        except asyncio.CancelledError:
+            raise
+        except _SlowConsumer:
+            errors_total.labels("ws_slow_consumer").inc()
+            self.closed.set()
+        except Exception as e:
+            try:
+                await self.send({"event":"tool.error","data":{"message":str(e)},"turn_id":turn_id}, turn_id)
+            except _SlowConsumer:
+                self.closed.set()
+
+
 @router.websocket("/v1/chat/ws")
 async def chat_ws(ws: WebSocket):
     await ws.accept()
     ws_connections.labels("/v1/chat/ws").inc()
+    ws_open_connections.inc()
+    conn = _Connection(ws)
+    reader = asyncio.ensure_future(conn.read_loop())
+    writer = asyncio.ensure_future(conn.write_loop())
+    closed = asyncio.ensure_future(conn.closed.wait())
     try:
-        raw = await ws.receive_text()
-        payload = json.loads(raw)
-        text = payload.get("text","")
-        voice = bool(payload.get("voice", False))
-        cid = ws.headers.get("x-correlation-id","")
-        sid = payload.get("session_id") or ws.headers.get("x-session-id","")
-        async for event in run_turn(text, voice, cid, sid):
-            if event["event"].startswith("tts.audio.") and isinstance(event["data"], (bytes, bytearray)):
-                await ws.send_bytes(event["data"])
-            else:
-                await ws.send_text(json.dumps(event))
-    except WebSocketDisconnect:
-        pass
-    except Exception as e:
-        await ws.send_text(json.dumps({"event":"tool.error","data":{"message":str(e)}}))
+        done, _ = await asyncio.wait([reader, writer, closed], return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            exc = None if task.cancelled() else task.exception()
+            if exc is not None and not isinstance(exc, (WebSocketDisconnect, _SlowConsumer)):
+                errors_total.labels("ws_connection_error").inc()
     finally:
-        await ws.close()
+        pending = [t for t in (conn.turn, reader, writer, closed) if t is not None]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        ws_open_connections.dec()
+        ws_turns_per_connection.observe(conn.turns)
+        try:
+            await ws.close()
+        except Exception:
+            pass
@@ -10,6 +10,7 @@ class Downstreams(BaseModel):
     stt: str | None = str(settings.STT_URL) if settings.STT_URL else None
     tts: str | None = str(settings.TTS_URL) if settings.TTS_URL else None
     analytics: str | None = str(settings.ANALYTICS_URL) if settings.ANALYTICS_URL else None
+    sentiment: str | None = str(settings.SENTIMENT_URL) if settings.SENTIMENT_URL else None
 
 class ConfigResponse(BaseModel):
     service: str = "orchestrator"
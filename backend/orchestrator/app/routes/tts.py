@@ -1,6 +1,7 @@
-import httpx
-from fastapi import APIRouter, Request, Response
-from ..config import settings
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from ..upstreams import upstream
 router = APIRouter()
 
 @router.post("/v1/tts")
@@ -8,10 +9,15 @@ async def tts(request: Request, payload: dict):
     cid = request.headers.get("x-correlation-id","")
     sid = request.headers.get("x-session-id","")
     headers = {"x-correlation-id": cid, "x-session-id": sid}
-    async with httpx.AsyncClient(timeout=None) as client:
-        async with client.stream("POST", f"{settings.TTS_URL}/v1/tts", json=payload, headers=headers) as resp:
-            resp.raise_for_status()
-            async def aiter():
-                async for chunk in resp.aiter_bytes():
-                    yield chunk
-            return Response(aiter(), media_type=resp.headers.get("content-type","application/octet-stream"))
+    client = upstream("tts")
+    req = client.build_request("POST", "/v1/tts", json=payload, headers=headers, timeout=None)
+    resp = await client.send(req, stream=True)
+    if resp.is_error:
+        await resp.aread()
+        await resp.aclose()
+    resp.raise_for_status()
+    return StreamingResponse(
+        resp.aiter_bytes(),
+        media_type=resp.headers.get("content-type","application/octet-stream"),
+        background=BackgroundTask(resp.aclose),
+    )
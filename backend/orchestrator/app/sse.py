@@ -1,4 +1,6 @@
-from typing import AsyncIterator
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional
+
 from starlette.responses import StreamingResponse
 
 def sse_response(event_stream: AsyncIterator[str]):
@@ -6,3 +8,91 @@ def sse_response(event_stream: AsyncIterator[str]):
 
 def format_event(event: str, data: str):
     return f"event: {event}\ndata: {data}\n\n"
+
+
+class SSEFrame:
+    """One parsed frame. `raw` is the original bytes (terminator included) for verbatim forwarding;
+    the data payload is only decoded when `.json()` is called."""
+    __slots__ = ("event", "raw", "_data_start")
+
+    def __init__(self, event: Optional[str], raw: bytes, data_start: int):
+        self.event = event
+        self.raw = raw
+        self._data_start = data_start
+
+    @property
+    def data(self) -> bytes:
+        if self._data_start < 0:
+            return b""
+        lines = []
+        for line in self.raw[self._data_start:].split(b"\n"):
+            if line.startswith(b"data:"):
+                lines.append(line[5:].strip())
+        return b"\n".join(lines)
+
+    def json(self) -> Dict[str, Any]:
+        data = self.data
+        if not data:
+            return {}
+        try:
+            out = json.loads(data)
+        except Exception:
+            return {"raw": data.decode("utf-8", "ignore")}
+        return out if isinstance(out, dict) else {"value": out}
+
+
+class SSEParser:
+    """Incremental SSE frame splitter over a bytearray buffer (no per-chunk re-copying of the
+    accumulated stream). Only the event name is read when splitting; data stays as bytes.
+    CRLF and lone CR line endings are normalized to LF, also when a CRLF is split across chunks."""
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._cr = False  # previous chunk ended in CR: held back until we know if LF follows
+
+    def feed(self, chunk: bytes) -> List[SSEFrame]:
+        buf = self._buf
+        # A terminator may straddle the previous chunk boundary
+        scan = max(0, len(buf) - 1)
+        if self._cr:
+            chunk = b"\r" + chunk
+            self._cr = False
+        if b"\r" in chunk:
+            if chunk.endswith(b"\r"):
+                chunk = chunk[:-1]
+                self._cr = True
+            chunk = chunk.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+        buf += chunk
+        frames: List[SSEFrame] = []
+        start = 0
+        while True:
+            end = buf.find(b"\n\n", max(start, scan))
+            if end < 0:
+                break
+            frame = self._frame(bytes(buf[start:end + 2]))
+            if frame is not None:
+                frames.append(frame)
+            start = end + 2
+        if start:
+            del buf[:start]
+        return frames
+
+    @staticmethod
+    def _frame(raw: bytes) -> Optional[SSEFrame]:
+        event: Optional[str] = None
+        data_start = -1
+        pos = 0
+        n = len(raw) - 2
+        while pos < n:
+            nl = raw.find(b"\n", pos, n)
+            nl = n if nl < 0 else nl
+            if raw.startswith(b"event:", pos):
+                event = raw[pos + 6:nl].strip().decode("utf-8", "ignore")
+            elif data_start < 0 and raw.startswith(b"data:", pos):
+                data_start = pos
+            if event is not None and data_start >= 0:
+                break
+            pos = nl + 1
+        if event is None and data_start < 0:
+            return None  # comment / keepalive
+        return SSEFrame(event, raw, data_start)
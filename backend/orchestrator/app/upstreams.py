@@ -0,0 +1,152 @@
+"""
+App-lifetime pooled HTTP clients for the orchestrator's upstreams (RAG, LLM, TTS, analytics).
+
+One httpx.AsyncClient per upstream, created once in create_app() and shared by every
+request, so a chat turn reuses warm keep-alive connections instead of paying a fresh
+TCP/TLS handshake per call. HTTP/2 is negotiated for https upstreams when `h2` is installed
+(httpx only speaks HTTP/1.1 to plain http:// URLs).
+"""
+import time
+from typing import Dict, Optional
+
+import httpx
+
+from .config import settings
+from .metrics import upstream_inflight, upstream_pool_limit, upstream_pool_timeouts
+
+try:
+    import h2  # noqa: F401  (enables httpx HTTP/2 support)
+    _HAS_H2 = True
+except Exception:
+    _HAS_H2 = False
+
+
+def _upstream_urls() -> Dict[str, str]:
+    return {
+        "rag": settings.RAG_URL,
+        "llm": settings.LLM_URL,
+        "tts": settings.TTS_URL,
+        "analytics": settings.ANALYTICS_URL,
+        "sentiment": settings.SENTIMENT_URL,
+    }
+
+
+class _MeteredStream(httpx.AsyncByteStream):
+    """Response stream wrapper that releases the in-flight gauge once the body is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, name: str):
+        self._stream = stream
+        self._name = name
+        self._closed = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        if not self._closed:
+            self._closed = True
+            upstream_inflight.labels(self._name).dec()
+        await self._stream.aclose()
+
+
+class _MeteredTransport(httpx.AsyncBaseTransport):
+    """Tracks in-flight requests per upstream pool and counts pool-acquire timeouts."""
+
+    def __init__(self, name: str, transport: httpx.AsyncBaseTransport):
+        self._name = name
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        upstream_inflight.labels(self._name).inc()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except httpx.PoolTimeout:
+            upstream_pool_timeouts.labels(self._name).inc()
+            upstream_inflight.labels(self._name).dec()
+            raise
+        except BaseException:
+            upstream_inflight.labels(self._name).dec()
+            raise
+        response.stream = _MeteredStream(response.stream, self._name)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class UpstreamClients:
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._warmed_at: Dict[str, float] = {}
+
+    def _build(self, name: str, base_url: str) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=settings.UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.UPSTREAM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.UPSTREAM_KEEPALIVE_EXPIRY_SECONDS,
+        )
+        http2 = settings.UPSTREAM_HTTP2 and _HAS_H2 and base_url.startswith("https://")
+        transport = httpx.AsyncHTTPTransport(limits=limits, http2=http2, retries=0)
+        upstream_pool_limit.labels(name).set(settings.UPSTREAM_MAX_CONNECTIONS)
+        return httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            transport=_MeteredTransport(name, transport),
+            timeout=httpx.Timeout(settings.REQUEST_TIMEOUT_SECONDS, pool=settings.UPSTREAM_POOL_TIMEOUT_SECONDS),
+        )
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            base_url = _upstream_urls().get(name)
+            if not base_url:
+                raise KeyError(f"unknown upstream: {name}")
+            client = self._build(name, base_url)
+            self._clients[name] = client
+        return client
+
+    async def warm(self, name: str, path: str = "/v1/health") -> None:
+        """Make sure the named pool holds a live keep-alive connection (at most once per half expiry)."""
+        now = time.monotonic()
+        if now - self._warmed_at.get(name, 0.0) < settings.UPSTREAM_KEEPALIVE_EXPIRY_SECONDS / 2:
+            return
+        self._warmed_at[name] = now
+        try:
+            await self.get(name).get(path, timeout=httpx.Timeout(2.0, pool=settings.UPSTREAM_POOL_TIMEOUT_SECONDS))
+        except Exception:
+            self._warmed_at.pop(name, None)
+
+    def open_all(self) -> None:
+        for name, url in _upstream_urls().items():
+            if url:
+                self.get(name)
+
+    async def aclose(self) -> None:
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            try:
+                await client.aclose()
+            except Exception:
+                pass
+
+
+_registry: Optional[UpstreamClients] = None
+
+
+def get_registry() -> UpstreamClients:
+    global _registry
+    if _registry is None:
+        _registry = UpstreamClients()
+    return _registry
+
+
+def upstream(name: str) -> httpx.AsyncClient:
+    """Shared pooled client for the named upstream ("rag", "llm", "tts", "analytics", "sentiment")."""
+    return get_registry().get(name)
+
+
+async def close_upstreams() -> None:
+    global _registry
+    if _registry is not None:
+        await _registry.aclose()
+        _registry = None
@@ -77,6 +77,31 @@ def test_chat_sync_no_rag(client):
     assert data["text"] == "Hello world!"
     assert data.get("used_rag") in (False, None)
     assert data.get("provider") in ("openai", None)
+    assert data["model"] == "gpt-4o"
+    assert data["fallback_used"] is False
+
+
+@respx.mock
+def test_chat_sync_uses_generate_json_when_configured(client, monkeypatch):
+    """
+    POST /v1/chat with CHAT_SYNC_GENERATE_JSON: one non-streaming LLM call, metadata surfaced.
+    """
+    from app.config import settings
+    monkeypatch.setattr(settings, "CHAT_SYNC_GENERATE_JSON", True)
+
+    stream_route = respx.post("http://llm:8012/v1/generate")
+    json_route = respx.post("http://llm:8012/v1/generate_json").mock(return_value=httpx.Response(200, json={
+        "provider": "huggingface", "model": "tgi", "output": "Hello world!", "fallback_used": True,
+    }))
+    respx.post("http://analytics:8090/v1/ingest").mock(return_value=httpx.Response(200, json={"ok": True}))
+
+    r = client.post("/v1/chat", json={"query": "Hi", "use_rag": False}, headers={"Authorization": "Bearer devtoken"})
+    assert r.status_code == 200, r.text
+    assert r.json() == {"text": "Hello world!", "used_rag": False, "provider": "huggingface",
+                        "model": "tgi", "fallback_used": True}
+    assert json_route.call_count == 1
+    assert json.loads(json_route.calls[0].request.content)["messages"][-1] == {"role": "user", "content": "Hi"}
+    assert stream_route.call_count == 0
 
 
 @respx.mock
@@ -164,3 +189,121 @@ def test_chat_stream_handles_upstream_llm_error(client):
         # The router should emit an SSE 'error' frame when upstream != 200
         assert "event: error" in body
 
+
+
+@respx.mock
+def test_chat_stream_proceeds_without_rag_after_deadline(client, monkeypatch):
+    """
+    GET /v1/chat/stream with a RAG upstream slower than the retrieval deadline:
+      - LLM is still called and tokens stream
+      - llm.done records rag_timed_out and carries empty provenance
+    """
+    from app.config import settings
+    monkeypatch.setattr(settings, "RAG_RETRIEVAL_DEADLINE_SECONDS", 0.05)
+
+    async def slow_rag(request: httpx.Request):
+        import asyncio
+        await asyncio.sleep(1.0)
+        return httpx.Response(200, json={"results": [{"text": "late", "doc_id": "late"}]})
+
+    respx.get("http://rag:8011/v1/retrieve").mock(side_effect=slow_rag)
+    respx.get("http://llm:8012/v1/health").mock(return_value=httpx.Response(200, json={"status": "ok"}))
+    respx.post("http://llm:8012/v1/generate").mock(return_value=httpx.Response(
+        200,
+        content=_sse_frame("llm.token", {"delta": "Fast"}) + _sse_frame("llm.done", {"provider": "openai"}),
+        headers={"Content-Type": "text/event-stream"},
+    ))
+    respx.post("http://analytics:8090/v1/ingest").mock(return_value=httpx.Response(200, json={"ok": True}))
+
+    with client.stream("GET", "/v1/chat/stream", params={"q": "what is the refund policy", "use_rag": "true"},
+                       headers={"Authorization": "Bearer devtoken"}) as s:
+        body = b"".join(list(s.iter_bytes())).decode("utf-8", "ignore")
+
+    assert '"delta": "Fast"' in body or '"delta":"Fast"' in body
+    assert '"rag_timed_out": true' in body or '"rag_timed_out":true' in body
+    assert '"doc_id": "late"' not in body
+
+
+class _FakeMemory:
+    """In-process stand-in for the Redis-backed MemoryStore (see get_memory())."""
+    items = []
+
+    async def append_turn(self, sid, user, assistant, max_items=20):
+        self.items.append({"role": "user", "content": user})
+        self.items.append({"role": "assistant", "content": assistant})
+
+    async def fetch(self, sid):
+        return list(self.items)
+
+
+@respx.mock
+def test_legacy_sse_forwards_llm_tokens_as_streamed(client, monkeypatch):
+    """
+    GET /v1/chat/sse runs the agent turn on the streaming LLM path:
+      - each upstream llm.token delta is forwarded unchanged (no split-by-space replay)
+      - the full reply is appended to session memory
+    """
+    from app.agent import router as agent_router
+    from app.agent import pipeline as agent_pipeline
+    monkeypatch.setattr(agent_router, "get_memory", _FakeMemory)
+    monkeypatch.setattr(agent_pipeline, "get_memory", _FakeMemory)
+    _FakeMemory.items = []
+
+    respx.get("http://llm:8012/v1/health").mock(return_value=httpx.Response(200, json={"status": "ok"}))
+    respx.post("http://llm:8012/v1/generate").mock(return_value=httpx.Response(
+        200,
+        content=b"".join([
+            _sse_frame("llm.token", {"delta": "Hello there, "}),
+            _sse_frame("llm.token", {"delta": "friend."}),
+            _sse_frame("llm.done", {"provider": "openai", "model": "gpt-4o"}),
+        ]),
+        headers={"Content-Type": "text/event-stream"},
+    ))
+
+    with client.stream("GET", "/v1/chat/sse", params={"text": "hi"}) as s:
+        body = b"".join(list(s.iter_bytes())).decode("utf-8", "ignore")
+
+    assert 'data: "Hello there, "' in body
+    assert 'data: "friend."' in body
+    assert '"model": "gpt-4o"' in body
+    assert _FakeMemory.items[-1] == {"role": "assistant", "content": "Hello there, friend."}
+
+
+@respx.mock
+def test_ws_serves_multiple_turns_per_connection(client, monkeypatch):
+    """
+    /v1/chat/ws keeps the socket open across turns and answers keepalive pings.
+    """
+    from app.agent import router as agent_router
+    from app.agent import pipeline as agent_pipeline
+    monkeypatch.setattr(agent_router, "get_memory", _FakeMemory)
+    monkeypatch.setattr(agent_pipeline, "get_memory", _FakeMemory)
+    _FakeMemory.items = []
+
+    respx.get("http://llm:8012/v1/health").mock(return_value=httpx.Response(200, json={"status": "ok"}))
+    respx.post("http://llm:8012/v1/generate").mock(side_effect=lambda request: httpx.Response(
+        200,
+        content=_sse_frame("llm.token", {"delta": "Hi!"}) + _sse_frame("llm.done", {"provider": "openai"}),
+        headers={"Content-Type": "text/event-stream"},
+    ))
+
+    def _until_turn_done(ws):
+        events = []
+        while True:
+            msg = ws.receive_json()
+            events.append(msg)
+            if msg["event"] == "turn.done":
+                return events
+
+    with client.websocket_connect("/v1/chat/ws") as ws:
+        ws.send_text(json.dumps({"text": "hello", "session_id": "s1"}))
+        first = _until_turn_done(ws)
+        ws.send_text(json.dumps({"type": "ping"}))
+        assert ws.receive_json()["event"] == "pong"
+        ws.send_text(json.dumps({"type": "turn", "text": "again", "session_id": "s1"}))
+        second = _until_turn_done(ws)
+
+    assert [e["event"] for e in first] == ["turn.started", "llm.token", "llm.done", "turn.done"]
+    assert {e["turn_id"] for e in first} == {1}
+    assert {e["turn_id"] for e in second} == {2}
+    assert second[1]["data"] == "Hi!"
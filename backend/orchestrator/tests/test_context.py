@@ -0,0 +1,39 @@
+# tests/test_context.py
+"""
+Token-budgeted prompt assembly: fixed parts always fit, snippets are capped,
+and the oldest history is truncated/dropped first.
+"""
+
+from app.agent.context import build_prompt, count_tokens
+
+
+def _history(n: int, words: int = 40):
+    roles = ["user", "assistant"]
+    return [{"role": roles[i % 2], "content": f"turn{i} " + "word " * words} for i in range(n)]
+
+
+def test_small_prompt_keeps_everything_in_order():
+    ctx = build_prompt("What now?", history=_history(2, words=3),
+                       snippets=[{"text": "Refunds take 5 days.", "doc_id": "faq"}], system="Be brief.", budget=1000)
+    roles = [m["role"] for m in ctx.messages]
+    assert roles == ["system", "user", "assistant", "user"]
+    assert "Be brief." in ctx.messages[0]["content"]
+    assert "[source:faq] Refunds take 5 days." in ctx.messages[0]["content"]
+    assert ctx.messages[-1]["content"] == "What now?"
+    assert ctx.history_dropped == 0
+
+
+def test_budget_drops_oldest_history_and_caps_snippets():
+    history = _history(20)
+    snippets = [{"text": "snippet " * 300, "doc_id": f"d{i}"} for i in range(3)]
+    ctx = build_prompt("latest question", history=history, snippets=snippets, budget=600)
+
+    assert ctx.tokens <= 600
+    assert sum(count_tokens(m["content"]) + 4 for m in ctx.messages) <= 600
+    assert ctx.history_dropped > 0
+    # Newest history survives, oldest goes
+    contents = " ".join(m["content"] for m in ctx.messages)
+    assert "turn19" in contents and "turn0 " not in contents
+    # Snippets stay within their share and are truncated, not dropped wholesale
+    assert 1 <= len(ctx.snippets) < 3
+    assert ctx.messages[-1] == {"role": "user", "content": "latest question"}
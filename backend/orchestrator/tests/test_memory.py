@@ -0,0 +1,100 @@
+# tests/test_memory.py
+"""
+MemoryStore: one pipelined write per turn and an in-process LRU in front of Redis.
+"""
+
+import asyncio
+import json
+
+from app.agent.memory import MemoryStore
+
+
+class _FakePipeline:
+    def __init__(self, redis):
+        self.redis, self.ops = redis, []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def rpush(self, key, *values):
+        self.ops.append(("rpush", key, values))
+
+    def ltrim(self, key, start, end):
+        self.ops.append(("ltrim", key, start, end))
+
+    def expire(self, key, ttl):
+        self.ops.append(("expire", key, ttl))
+
+    def lrange(self, key, start, end):
+        self.ops.append(("lrange", key, start, end))
+
+    async def execute(self):
+        self.redis.round_trips += 1
+        results = []
+        for op in self.ops:
+            if op[0] == "rpush":
+                self.redis.lists.setdefault(op[1], []).extend(op[2])
+                results.append(len(self.redis.lists[op[1]]))
+            elif op[0] == "ltrim":
+                self.redis.lists[op[1]] = self.redis.lists[op[1]][op[2]:]
+                results.append(True)
+            elif op[0] == "expire":
+                self.redis.ttls[op[1]] = op[2]
+                results.append(True)
+            elif op[0] == "lrange":
+                results.append(list(self.redis.lists.get(op[1], [])))
+        return results
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.lists, self.ttls, self.round_trips = {}, {}, 0
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+    async def lrange(self, key, start, end):
+        self.round_trips += 1
+        return list(self.lists.get(key, []))
+
+
+def test_append_turn_is_one_round_trip_and_fetch_is_cached():
+    async def run():
+        store = MemoryStore(url="redis://localhost:6379/0", cache_size=2, cache_ttl=60, session_ttl=120)
+        store.r = _FakeRedis()
+
+        assert await store.fetch("s1") == []          # miss -> Redis, then cached
+        await store.append_turn("s1", "hi", "hello", max_items=3)
+        assert store.r.round_trips == 2
+        assert store.r.ttls["sess:s1:chat"] == 120
+
+        history = await store.fetch("s1")             # served from cache, kept in sync on write
+        assert store.r.round_trips == 2
+        assert history == [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]
+
+        await store.append_turn("s1", "again", "sure", max_items=3)
+        assert [m["content"] for m in await store.fetch("s1")] == ["hello", "again", "sure"]
+        assert [json.loads(v)["content"] for v in store.r.lists["sess:s1:chat"]] == ["hello", "again", "sure"]
+
+    asyncio.run(run())
+
+
+def test_cache_mirrors_redis_after_concurrent_writes():
+    async def run():
+        a = MemoryStore(url="redis://localhost:6379/0", cache_size=2, cache_ttl=60, session_ttl=120)
+        b = MemoryStore(url="redis://localhost:6379/0", cache_size=2, cache_ttl=60, session_ttl=120)
+        a.r = b.r = _FakeRedis()
+
+        await a.fetch("s1")
+        await b.append_turn("s1", "from b", "ok", max_items=4)   # another replica writes
+        await a.append_turn("s1", "from a", "sure", max_items=4)
+        assert [m["content"] for m in await a.fetch("s1")] == ["from b", "ok", "from a", "sure"]
+
+        await asyncio.gather(a.append_turn("s1", "x", "y", max_items=4), a.append_turn("s1", "z", "w", max_items=4))
+        assert await a.fetch("s1") == [json.loads(v) for v in a.r.lists["sess:s1:chat"]]
+        assert len(await a.fetch("s1")) == 4
+
+    asyncio.run(run())
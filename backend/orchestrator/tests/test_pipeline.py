@@ -0,0 +1,57 @@
+# tests/test_pipeline.py
+"""
+Turn preparation: retrieval and session memory run concurrently under separate deadlines,
+and rag_seconds is retrieval's own duration, not the slowest stage's.
+"""
+
+import asyncio
+
+import pytest
+
+from app.agent import pipeline
+from app.config import settings
+
+
+class _Registry:
+    async def warm(self, name):
+        pass
+
+
+def _memory(delay):
+    class _SlowMemory:
+        async def fetch(self, sid):
+            await asyncio.sleep(delay)
+            return [{"role": "user", "content": "earlier"}]
+
+    return _SlowMemory
+
+
+@pytest.fixture(autouse=True)
+def _no_upstreams(monkeypatch):
+    monkeypatch.setattr(pipeline, "get_registry", lambda: _Registry())
+    monkeypatch.setattr(settings, "SENTIMENT_URL", None)
+
+
+async def _retrieve():
+    await asyncio.sleep(0.01)
+    return [{"text": "refunds take 5 days", "score": 0.8}]
+
+
+def test_rag_seconds_is_retrieval_time_not_slowest_stage(monkeypatch):
+    monkeypatch.setattr(pipeline, "get_memory", _memory(0.3))
+    monkeypatch.setattr(settings, "RAG_RETRIEVAL_DEADLINE_SECONDS", 1.0)
+    prep = asyncio.run(pipeline.prepare_turn("refund policy?", retrieve=_retrieve, sid="s1"))
+    assert prep.snippets and prep.history
+    assert prep.rag_seconds < 0.2
+
+
+def test_memory_is_not_cut_off_by_the_rag_deadline(monkeypatch):
+    monkeypatch.setattr(pipeline, "get_memory", _memory(0.2))
+    monkeypatch.setattr(settings, "RAG_RETRIEVAL_DEADLINE_SECONDS", 0.05)
+    monkeypatch.setattr(settings, "TURN_PREP_DEADLINE_SECONDS", 1.0)
+    prep = asyncio.run(pipeline.prepare_turn("hello", sid="s1"))  # no RAG on this turn
+    assert prep.history == [{"role": "user", "content": "earlier"}] and prep.snippets is None
+
+    monkeypatch.setattr(settings, "TURN_PREP_DEADLINE_SECONDS", 0.05)
+    prep = asyncio.run(pipeline.prepare_turn("hello", retrieve=_retrieve, sid="s1"))
+    assert prep.history == [] and prep.snippets and not prep.rag_timed_out
@@ -0,0 +1,96 @@
+# tests/test_retrieval_cache.py
+"""
+RAG result cache: normalized keys, per-session tier surviving global churn, TTL, and
+invalidation on ingest (including retrievals that were in flight during it).
+"""
+import asyncio
+
+import httpx
+import respx
+
+from app.agent.retrieval_cache import RetrievalCache
+
+HITS = {"results": [{"text": "Chunk A", "doc_id": "docA", "chunk_id": "1", "score": 0.9}],
+        "mode": "dense", "reranked": False}
+
+
+def test_follow_up_with_same_normalized_query_hits():
+    cache = RetrievalCache(max_entries=8, session_entries=4, max_sessions=4, ttl=60)
+    assert cache.get("s1", "What is Qdrant?", 3) is None
+    cache.put("s1", "What is Qdrant?", 3, HITS)
+    assert cache.get("s1", "  what is   qdrant ", 3) == HITS
+    assert cache.get("s2", "what is qdrant", 3) == HITS  # global tier
+    assert cache.get("s1", "what is qdrant", 5) is None  # top_k is part of the key
+    assert cache.get("s1", "what is qdrant", 3, filters={"doc_id": "docA"}) is None
+
+
+def test_session_tier_outlives_global_eviction():
+    cache = RetrievalCache(max_entries=1, session_entries=4, max_sessions=4, ttl=60)
+    cache.put("s1", "first question", 3, HITS)
+    cache.put("s2", "another question", 3, {"results": []})
+    assert cache.get("s3", "first question", 3) is None
+    assert cache.get("s1", "first question", 3) == HITS
+
+
+def test_ttl_expires_entries():
+    cache = RetrievalCache(max_entries=8, session_entries=4, max_sessions=4, ttl=0)
+    cache.put("s1", "q", 3, HITS)
+    assert cache.get("s1", "q", 3) is None
+
+
+def test_ingest_invalidates_everything_and_inflight_puts():
+    cache = RetrievalCache(max_entries=8, session_entries=4, max_sessions=4, ttl=60)
+    cache.put("s1", "q", 3, HITS)
+    generation = cache.generation  # a retrieval starts...
+    cache.invalidate()             # ...an ingest lands...
+    cache.put("s2", "other", 3, HITS, generation=generation)  # ...and its result is dropped
+    assert cache.get("s1", "q", 3) is None
+    assert cache.get("s2", "other", 3) is None
+
+
+@respx.mock
+def test_accepted_ingest_invalidates_again_when_the_job_ends(monkeypatch):
+    from app.agent import tools
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "RAG_INGEST_POLL_SECONDS", 0.0)
+    respx.post("http://rag:8011/v1/ingest").mock(
+        return_value=httpx.Response(202, json={"job_id": "j1", "status": "queued"}))
+    respx.get("http://rag:8011/v1/ingest/j1").mock(side_effect=[
+        httpx.Response(200, json={"job_id": "j1", "status": "running"}),
+        httpx.Response(200, json={"job_id": "j1", "status": "done"}),
+    ])
+
+    async def run():
+        cache = RetrievalCache(max_entries=8, session_entries=4, max_sessions=4, ttl=60)
+        monkeypatch.setattr(tools, "get_retrieval_cache", lambda: cache)
+        async with httpx.AsyncClient(base_url="http://rag:8011") as client:
+            monkeypatch.setattr(tools, "upstream", lambda name: client)
+            data = await tools.rag_ingest({"text": "new doc"})
+            assert data["job_id"] == "j1"
+            cache.put("s1", "q", 3, HITS)  # cached while the document is still being indexed
+            await asyncio.gather(*tools._ingest_watchers)
+        assert cache.get("s1", "q", 3) is None
+
+    asyncio.run(run())
+
+
+@respx.mock
+def test_rag_retrieve_returns_the_same_response_on_hit_and_miss(monkeypatch):
+    from app.agent import tools
+
+    route = respx.get("http://rag:8011/v1/retrieve").mock(return_value=httpx.Response(200, json=HITS))
+
+    async def run():
+        cache = RetrievalCache(max_entries=8, session_entries=4, max_sessions=4, ttl=60)
+        monkeypatch.setattr(tools, "get_retrieval_cache", lambda: cache)
+        async with httpx.AsyncClient(base_url="http://rag:8011") as client:
+            monkeypatch.setattr(tools, "upstream", lambda name: client)
+            miss = await tools.rag_retrieve("what is qdrant", sid="s1")
+            miss["results"][0]["text"] = "edited by the caller"
+            hit = await tools.rag_retrieve("What is Qdrant?", sid="s1")
+        return miss, hit
+
+    miss, hit = asyncio.run(run())
+    assert route.call_count == 1
+    assert hit == HITS and set(miss) == set(hit) == {"results", "mode", "reranked"}
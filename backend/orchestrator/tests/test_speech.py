@@ -0,0 +1,42 @@
+# tests/test_speech.py
+"""
+Sentence-pipelined TTS: segmentation of streamed tokens and in-order audio delivery.
+"""
+
+import asyncio
+
+from app.agent import speech
+from app.agent.speech import SentenceSegmenter, SpeechPipeline
+
+
+def test_segmenter_emits_sentences_as_they_complete():
+    seg = SentenceSegmenter(min_chars=10)
+    out = []
+    for delta in ["Hello there", ", my friend. ", "Ok. ", "This is the second", " sentence! And a tail"]:
+        out.extend(seg.feed(delta))
+    assert out == ["Hello there, my friend.", "Ok. This is the second sentence!"]
+    assert seg.flush() == "And a tail"
+    assert seg.flush() is None
+
+
+def test_pipeline_delivers_audio_in_sentence_order(monkeypatch):
+    # First sentence synthesizes slowest; audio must still come out in submit order
+    delays = {"one": 0.05, "two": 0.0, "three": 0.01}
+
+    async def fake_tts(text, cid="", sid=""):
+        await asyncio.sleep(delays[text])
+        yield f"{text}-a".encode()
+        yield f"{text}-b".encode()
+
+    monkeypatch.setattr(speech, "tts_speak", fake_tts)
+
+    async def run():
+        pipe = SpeechPipeline(max_concurrency=3)
+        for s in ["one", "two", "three"]:
+            pipe.submit(s)
+        assert pipe.ready() == []
+        chunks = [c async for c in pipe.drain()]
+        await pipe.aclose()
+        return chunks
+
+    assert asyncio.run(run()) == [b"one-a", b"one-b", b"two-a", b"two-b", b"three-a", b"three-b"]
@@ -0,0 +1,48 @@
+# tests/test_sse.py
+"""
+Incremental SSE frame parsing used by the chat relay: frames split across arbitrary chunk
+boundaries come out intact and byte-identical, keepalives are dropped.
+"""
+from app.sse import SSEParser
+
+
+def _frames(chunks):
+    parser = SSEParser()
+    out = []
+    for c in chunks:
+        out.extend(parser.feed(c))
+    return out
+
+
+def test_frames_survive_any_chunking():
+    stream = (
+        b'event: llm.token\ndata: {"delta": "Hel"}\n\n'
+        b": keepalive\n\n"
+        b'event: llm.token\ndata: {"delta": "lo"}\n\n'
+        b'event: llm.done\ndata: {"provider": "openai"}\n\n'
+    )
+    for size in (1, 2, 3, 7, len(stream)):
+        frames = _frames([stream[i:i + size] for i in range(0, len(stream), size)])
+        assert [f.event for f in frames] == ["llm.token", "llm.token", "llm.done"]
+        assert b"".join(f.raw for f in frames) == stream.replace(b": keepalive\n\n", b"")
+        assert [f.json().get("delta") for f in frames[:2]] == ["Hel", "lo"]
+        assert frames[2].json() == {"provider": "openai"}
+
+
+def test_incomplete_frame_is_held_back():
+    parser = SSEParser()
+    assert parser.feed(b'event: llm.token\ndata: {"delta": "x"}\n') == []
+    (frame,) = parser.feed(b"\n")
+    assert frame.event == "llm.token" and frame.data == b'{"delta": "x"}'
+
+
+def test_crlf_and_cr_line_endings_split_anywhere():
+    lf = b'event: llm.token\ndata: {"delta": "a"}\n\nevent: llm.done\ndata: {}\n\n'
+    for stream in (lf.replace(b"\n", b"\r\n"), lf.replace(b"\n", b"\r")):
+        for size in (1, 2, 3, 5, len(stream)):
+            frames = _frames([stream[i:i + size] for i in range(0, len(stream), size)] + [b": ping\n\n"])
+            assert [f.event for f in frames] == ["llm.token", "llm.done"]
+            assert b"".join(f.raw for f in frames) == lf
+    # "\r\n\r" | "\n": the LF completes the CRLF, it doesn't start another blank line
+    frames = _frames([b"event: a\r\ndata: 1\r\n\r", b"\nevent: b\r\ndata: 2\r\n\r\n"])
+    assert [(f.event, f.data) for f in frames] == [("a", b"1"), ("b", b"2")]
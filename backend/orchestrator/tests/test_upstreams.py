@@ -0,0 +1,38 @@
+# tests/test_upstreams.py
+"""
+Pooled upstream clients: one client per upstream, reused across calls, and the
+in-flight gauge is released once a streamed response is closed.
+"""
+
+import asyncio
+
+import httpx
+import respx
+from prometheus_client import REGISTRY
+
+from app.upstreams import UpstreamClients
+
+
+def _inflight(name: str) -> float:
+    return REGISTRY.get_sample_value("orchestrator_upstream_inflight_requests", {"upstream": name}) or 0.0
+
+
+@respx.mock
+def test_registry_reuses_client_and_releases_inflight():
+    respx.post("http://llm:8012/v1/generate").mock(return_value=httpx.Response(200, content=b"event: llm.done\ndata: {}\n\n"))
+
+    async def run():
+        reg = UpstreamClients()
+        client = reg.get("llm")
+        assert reg.get("llm") is client
+
+        async with client.stream("POST", "/v1/generate", json={}) as resp:
+            assert _inflight("llm") == 1.0
+            await resp.aread()
+        assert _inflight("llm") == 0.0
+
+        await reg.aclose()
+        assert reg.get("llm") is not client
+        await reg.aclose()
+
+    asyncio.run(run())
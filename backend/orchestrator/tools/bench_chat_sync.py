@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+CPU cost of aggregating a long LLM reply on the POST /v1/chat path, before vs after.
+
+before: concatenated-bytes frame split, json decode + sse_event re-encode per frame (relay),
+        then decode/splitlines/json.loads again in chat_sync
+after:  SSEParser frames, one json decode per token payload (typed events)
+
+Network is excluded (same for both); the stream is fed in fixed-size chunks like aiter_bytes.
+Usage: PYTHONPATH=. python tools/bench_chat_sync.py [tokens] [chunk_bytes] [runs]
+"""
+import json
+import sys
+import time
+
+from app.sse import SSEParser
+
+
+def _frame(event, data):
+    return (f"event: {event}\n" + "data: " + json.dumps(data, ensure_ascii=False) + "\n\n").encode("utf-8")
+
+
+def build_stream(tokens):
+    body = b"".join(_frame("llm.token", {"delta": f"word{i} "}) for i in range(tokens))
+    return body + _frame("llm.done", {"provider": "openai", "model": "gpt-4o", "fallback_used": False})
+
+
+def before(chunks):
+    relayed = []
+    buffer = b""
+    for chunk in chunks:
+        buffer += chunk
+        while b"\n\n" in buffer:
+            frame, buffer = buffer.split(b"\n\n", 1)
+            event_name, data_lines = None, []
+            for line in frame.split(b"\n"):
+                if line.startswith(b"event:"):
+                    event_name = line[len(b"event:"):].strip().decode("utf-8", "ignore")
+                elif line.startswith(b"data:"):
+                    data_lines.append(line[len(b"data:"):].strip())
+            data_json = json.loads(b"\n".join(data_lines).decode("utf-8"))
+            relayed.append(_frame(event_name, data_json))
+    parts = []
+    for sse_bytes in relayed:
+        current_event = None
+        for line in sse_bytes.decode("utf-8", "ignore").splitlines():
+            if line.startswith("event:"):
+                current_event = line.split("event:", 1)[1].strip()
+            elif line.startswith("data:"):
+                data = json.loads(line.split("data:", 1)[1].strip())
+                if current_event == "llm.token":
+                    parts.append(data.get("delta"))
+    return "".join(parts)
+
+
+def after(chunks):
+    parser = SSEParser()
+    parts = []
+    for chunk in chunks:
+        for frame in parser.feed(chunk):
+            if frame.event == "llm.token":
+                parts.append(frame.json().get("delta"))
+            elif frame.event == "llm.done":
+                frame.json()
+    return "".join(parts)
+
+
+def main():
+    tokens = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+    chunk_bytes = int(sys.argv[2]) if len(sys.argv) > 2 else 512
+    runs = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    stream = build_stream(tokens)
+    chunks = [stream[i:i + chunk_bytes] for i in range(0, len(stream), chunk_bytes)]
+    assert before(chunks) == after(chunks)
+
+    print(f"{tokens} tokens, {len(stream)} bytes, {len(chunks)} chunks, {runs} runs")
+    results = {}
+    for name, fn in (("before", before), ("after", after)):
+        t0 = time.process_time()
+        for _ in range(runs):
+            fn(chunks)
+        results[name] = (time.process_time() - t0) / runs * 1000.0
+        print(f"{name:>6}: {results[name]:8.2f} ms CPU / request")
+    print(f"speedup: {results['before'] / results['after']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
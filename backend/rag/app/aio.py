@@ -0,0 +1,122 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+
+class Limiter:
+    """Concurrency limit for one storage dependency, with its own bounded thread pool.
+
+    At most `max_concurrent` calls run against the dependency at a time; the rest wait on a
+    semaphore (time spent there goes to STORAGE_QUEUE_WAIT{dependency}), so a burst of slow
+    upserts queues behind its own limit instead of taking every thread of the default pool.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, metrics: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.metrics = metrics or {}
+        self._sem = asyncio.Semaphore(self.max_concurrent)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix=name)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        t0 = time.perf_counter()
+        async with self._sem:
+            if "STORAGE_QUEUE_WAIT" in self.metrics:
+                self.metrics["STORAGE_QUEUE_WAIT"].labels(dependency=self.name).observe(time.perf_counter() - t0)
+            inflight = self.metrics.get("STORAGE_INFLIGHT")
+            if inflight is not None:
+                inflight.labels(dependency=self.name).inc()
+            try:
+                yield
+            finally:
+                if inflight is not None:
+                    inflight.labels(dependency=self.name).dec()
+
+    async def run(self, fn: Callable, *args: Any, **kwargs: Any) -> Any:
+        """Run a blocking call in this dependency's pool, within its limit."""
+        async with self.slot():
+            return await asyncio.get_running_loop().run_in_executor(self._pool, partial(fn, *args, **kwargs))
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class AsyncMinioStore:
+    """Async face of MinioStore for route handlers and ingest jobs: blocking MinIO calls go to
+    the limiter's pool. The presigned URL cache lookup is in-memory and stays synchronous;
+    other attributes (bucket, build_content_key, ...) are the wrapped store's."""
+
+    def __init__(self, store, limiter: Limiter):
+        self.sync = store
+        self.limiter = limiter
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.sync, name)
+
+    async def put_bytes(self, key: str, data: bytes, content_type: Optional[str] = None) -> None:
+        await self.limiter.run(self.sync.put_bytes, key, data, content_type)
+
+    async def exists(self, key: str) -> bool:
+        return await self.limiter.run(self.sync.exists, key)
+
+    async def presigned_get(self, key: str) -> str:
+        url, stale = self.sync.cached_presigned(key)
+        if url is not None and not stale:
+            return url
+        return await self.limiter.run(self.sync.presigned_get, key)
+
+    async def presign_many(self, keys: List[str]) -> Dict[str, str]:
+        return await self.limiter.run(self.sync.presign_many, keys)
+
+    def close(self) -> None:
+        self.limiter.shutdown()
+
+
+class AsyncVectorStore:
+    """Async face of the vector store (QdrantStore or LocalVectorStore).
+
+    Search uses the store's native coroutine when it has one (QdrantStore.asearch, on
+    qdrant-client's AsyncQdrantClient: no thread per query); everything else runs in the
+    limiter's pool. All calls count against the same concurrency limit. `sync` is the wrapped
+    store, for code that already runs on a worker thread (e.g. the BM25 rebuild scroll).
+    """
+
+    def __init__(self, store, limiter: Limiter):
+        self.sync = store
+        self.limiter = limiter
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.sync, name)
+
+    async def search(self, query_vec: Any, top_k: int = 3, filters: Optional[Dict[str, Any]] = None):
+        asearch = getattr(self.sync, "asearch", None)
+        if asearch is not None:
+            async with self.limiter.slot():
+                return await asearch(query_vec, top_k=top_k, filters=filters)
+        return await self.limiter.run(self.sync.search, query_vec, top_k=top_k, filters=filters)
+
+    async def upsert(self, texts: List[str], vectors: Any, payloads: List[Dict[str, Any]]) -> None:
+        await self.limiter.run(self.sync.upsert, texts, vectors, payloads)
+
+    async def doc_points(self, doc_id: str) -> Dict[str, Dict[str, Any]]:
+        return await self.limiter.run(self.sync.doc_points, doc_id)
+
+    async def get_payloads(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        return await self.limiter.run(self.sync.get_payloads, ids)
+
+    async def delete_points(self, ids: List[str]) -> None:
+        await self.limiter.run(self.sync.delete_points, ids)
+
+    async def set_payload(self, ids: List[str], payload: Dict[str, Any]) -> None:
+        await self.limiter.run(self.sync.set_payload, ids, payload)
+
+    async def aclose(self) -> None:
+        aclose = getattr(self.sync, "aclose", None)
+        if aclose is not None:
+            await aclose()
+        self.sync.close()
+        self.limiter.shutdown()
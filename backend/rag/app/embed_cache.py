@@ -0,0 +1,106 @@
+import hashlib
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+try:
+    import redis.asyncio as aioredis  # optional: share query vectors across replicas
+except Exception:
+    aioredis = None
+
+logger = logging.getLogger("rag.embed_cache")
+
+_WS = re.compile(r"\s+")
+
+
+class QueryEmbeddingCache:
+    """Bounded LRU of query text -> float32 vector, keyed by model name + normalized text.
+
+    With `redis_url` set (and redis installed) misses fall through to Redis before the model,
+    so replicas share hot queries. Redis calls time out after `redis_timeout_ms`: a slow Redis
+    must not cost more than the embedding it saves. An error or timeout pauses that tier for
+    `redis_retry_s` (memory only meanwhile) instead of failing retrieval; the client is kept and
+    reconnects when the pause is over.
+    """
+
+    def __init__(self, model_name: str, max_entries: int = 4096, redis_url: Optional[str] = None,
+                 redis_ttl_s: int = 86400, redis_timeout_ms: float = 100.0, redis_retry_s: float = 30.0,
+                 metrics: Optional[Dict[str, Any]] = None):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.redis_ttl_s = redis_ttl_s
+        self.redis_retry_s = max(0.0, redis_retry_s)
+        self.metrics = metrics or {}
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._redis = None
+        self._redis_retry_at = 0.0  # time.monotonic() before which the Redis tier is skipped
+        if redis_url and aioredis:
+            timeout = max(0.001, redis_timeout_ms / 1000.0)
+            self._redis = aioredis.from_url(redis_url, socket_timeout=timeout, socket_connect_timeout=timeout)
+
+    def key(self, text: str) -> str:
+        norm = _WS.sub(" ", (text or "").strip())
+        return hashlib.sha256(f"{self.model_name}\x00{norm}".encode("utf-8")).hexdigest()
+
+    def _count(self, result: str) -> None:
+        if "EMBED_CACHE_LOOKUPS" in self.metrics:
+            self.metrics["EMBED_CACHE_LOOKUPS"].labels(result=result).inc()
+
+    def _remember(self, key: str, vec: np.ndarray) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = vec
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _redis_up(self) -> bool:
+        return self._redis is not None and time.monotonic() >= self._redis_retry_at
+
+    def _redis_failed(self, e: Exception) -> None:
+        if time.monotonic() >= self._redis_retry_at:
+            logger.warning("query embedding cache: redis paused for %.0fs (%s)", self.redis_retry_s, e)
+        self._redis_retry_at = time.monotonic() + self.redis_retry_s
+
+    async def get(self, text: str) -> Optional[np.ndarray]:
+        key = self.key(text)
+        vec = self._entries.get(key)
+        if vec is not None:
+            self._entries.move_to_end(key)
+            self._count("hit_memory")
+            return vec
+        if self._redis_up():
+            try:
+                raw = await self._redis.get(f"embq:{key}")
+            except Exception as e:
+                self._redis_failed(e)
+                raw = None
+            if raw:
+                vec = np.frombuffer(raw, dtype=np.float32)
+                self._remember(key, vec)
+                self._count("hit_redis")
+                return vec
+        self._count("miss")
+        return None
+
+    async def put(self, text: str, vec: Any) -> np.ndarray:
+        # own copy: `vec` is often a row view of the batch array, which would otherwise stay alive
+        arr = np.array(vec, dtype=np.float32, copy=True)
+        arr.setflags(write=False)  # shared between requests
+        key = self.key(text)
+        self._remember(key, arr)
+        if self._redis_up():
+            try:
+                await self._redis.set(f"embq:{key}", arr.tobytes(), ex=self.redis_ttl_s)
+            except Exception as e:
+                self._redis_failed(e)
+        return arr
+
+    async def aclose(self) -> None:
+        if self._redis is not None:
+            close = getattr(self._redis, "aclose", None) or self._redis.close
+            await close()
@@ -0,0 +1,109 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from .embed_cache import QueryEmbeddingCache
+
+if TYPE_CHECKING:  # the model stack is only needed where an Embedder is built (main)
+    from .embedder import Embedder
+
+# (text, future, enqueued_at)
+_Item = Tuple[str, asyncio.Future, float]
+
+
+class EmbedDispatcher:
+    """Micro-batching front for the Embedder.
+
+    Handlers await `embed(text)`; a single collector task gathers whatever queries arrive
+    within `window_ms` (up to `max_batch`) and runs one forward pass for all of them on a
+    dedicated worker thread, so the event loop never blocks on the model and concurrent
+    retrievals share batches instead of serializing at batch size 1. With a `cache`, repeated
+    queries skip the queue and the model entirely.
+    """
+
+    def __init__(self, embedder: "Embedder", max_batch: int = 32, window_ms: float = 5.0,
+                 metrics: Optional[Dict[str, Any]] = None, cache: Optional[QueryEmbeddingCache] = None):
+        self.embedder = embedder
+        self.cache = cache
+        self.max_batch = max(1, max_batch)
+        self.window = max(0.0, window_ms) / 1000.0
+        self.metrics = metrics or {}
+        self._queue: "asyncio.Queue[_Item]" = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._executor.shutdown(wait=False)
+        if self.cache is not None:
+            await self.cache.aclose()
+
+    async def embed(self, text: str) -> Any:
+        if self.cache is not None:
+            vec = await self.cache.get(text)
+            if vec is not None:
+                return vec
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, fut, time.perf_counter()))
+        vec = await fut
+        if self.cache is not None:
+            vec = await self.cache.put(text, vec)
+        return vec
+
+    async def embed_many(self, texts: List[str]) -> List[Any]:
+        return list(await asyncio.gather(*(self.embed(t) for t in texts)))
+
+    async def _collect(self) -> List[_Item]:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.window
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [item for item in await self._collect() if not item[1].done()]  # skip cancelled waiters
+            if not batch:
+                continue
+            started = time.perf_counter()
+            if "EMBED_QUEUE_WAIT" in self.metrics:
+                for _, _, enqueued in batch:
+                    self.metrics["EMBED_QUEUE_WAIT"].observe(started - enqueued)
+            if "EMBED_BATCH_SIZE" in self.metrics:
+                self.metrics["EMBED_BATCH_SIZE"].observe(len(batch))
+            try:
+                vectors = await loop.run_in_executor(self._executor, self.embedder.embed, [t for t, _, _ in batch])
+            except Exception as e:
+                for _, fut, _ in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            if "EMBED_LATENCY" in self.metrics:
+                self.metrics["EMBED_LATENCY"].observe(time.perf_counter() - started)
+            for (_, fut, _), vec in zip(batch, vectors):
+                if not fut.done():
+                    fut.set_result(vec)
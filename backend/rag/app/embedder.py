@@ -1,5 +1,7 @@
 
 from typing import List
+
+import numpy as np
 from sentence_transformers import SentenceTransformer
 
 class Embedder:
@@ -15,6 +17,9 @@ class Embedder:
     def dim(self) -> int:
         return self._dim
 
-    def embed(self, texts: List[str]) -> List[List[float]]:
-        vectors = self._model.encode(texts, batch_size=32, show_progress_bar=False, convert_to_numpy=True)
-        return [v.tolist() for v in vectors]
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """(len(texts), dim) contiguous float32, L2-normalized once here (cosine == dot downstream)."""
+        vectors = self._model.encode(
+            texts, batch_size=32, show_progress_bar=False, convert_to_numpy=True, normalize_embeddings=True
+        )
+        return np.ascontiguousarray(vectors, dtype=np.float32)
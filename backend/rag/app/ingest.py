@@ -1,13 +1,22 @@
 
 import os
 import io
+import json
 import uuid
 import time
+import asyncio
+import hashlib
+import itertools
+import signal
+import tempfile
+import threading
 import chardet
+from collections import deque
 from typing import Optional, List, Dict, Any
 
 from fastapi import APIRouter, Request, UploadFile, File, Form
 from fastapi import HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 
 from pypdf import PdfReader
@@ -25,6 +34,10 @@ router = APIRouter()
 
 MAX_TOKENS = int(os.getenv("CHUNK_TOKENS", "800"))
 OVERLAP = int(os.getenv("CHUNK_OVERLAP", "50"))
+EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH", "64"))
+PAGE_SHARD = int(os.getenv("INGEST_PAGE_SHARD", "8"))  # PDF pages per extraction call
+PAGE_TIMEOUT_S = float(os.getenv("INGEST_PAGE_TIMEOUT_S", "20"))  # per PDF page; 0 disables
+SUPPORTED_EXTS = ("pdf", "docx", "doc", "txt", "md")
 
 class IngestJSON(BaseModel):
     text: str
@@ -58,12 +71,122 @@ def chunk_text(text: str, max_tokens: int = MAX_TOKENS, overlap: int = OVERLAP)
         chunks.append(" ".join(words[i : i + words_per_chunk]))
     return [c.strip() for c in chunks if c.strip()]
 
+class ChunkStream:
+    """Incremental chunk_text: feed text page by page, get each chunk as soon as it's full.
+
+    Same windows as chunk_text over the pages joined with blank lines, but only about one
+    chunk of tokens is held at a time. Each chunk carries the pages its first and last tokens
+    came from ("page", "page_end").
+    """
+
+    def __init__(self, max_tokens: int = MAX_TOKENS, overlap: int = OVERLAP):
+        self.enc = _tokenizer()
+        if self.enc:
+            self.size, self.step = max_tokens, max(1, max_tokens - overlap)
+        else:  # word-based fallback, same ratios as chunk_text
+            approx_ratio = 3
+            self.size = max_tokens * approx_ratio
+            self.step = max(1, self.size - overlap * approx_ratio)
+        self._units: List[Any] = []  # tokens (or words) not yet fully emitted, from _pos on
+        self._pages: List[int] = []  # page of each unit
+        self._pos = 0  # start of the next window; consumed units are dropped once per call
+        self._started = False
+
+    def _render(self, units: List[Any]) -> str:
+        return (self.enc.decode(units) if self.enc else " ".join(units)).strip()
+
+    def _take(self) -> Dict[str, Any]:
+        end = self._pos + self.size
+        pages = self._pages[self._pos : end]
+        chunk = {"text": self._render(self._units[self._pos : end]), "page": pages[0], "page_end": pages[-1]}
+        self._pos += self.step
+        return chunk
+
+    def _compact(self) -> None:
+        del self._units[: self._pos]
+        del self._pages[: self._pos]
+        self._pos = 0
+
+    def feed(self, text: str, page: int = 0) -> List[Dict[str, Any]]:
+        if self.enc:
+            units = self.enc.encode(("\n\n" if self._started else "") + text)
+        else:
+            units = text.split()
+        self._started = True
+        self._units.extend(units)
+        self._pages.extend([page] * len(units))
+        out = []
+        while len(self._units) - self._pos >= self.size:
+            out.append(self._take())
+        self._compact()
+        return [c for c in out if c["text"]]
+
+    def flush(self) -> List[Dict[str, Any]]:
+        out = []
+        while self._pos < len(self._units):
+            out.append(self._take())
+        self._compact()
+        return [c for c in out if c["text"]]
+
 def extract_from_pdf(bytes_data: bytes) -> List[Dict[str, Any]]:
+    return extract_pdf_pages(bytes_data, 0, pdf_page_count(bytes_data))
+
+def pdf_page_count(bytes_data: bytes) -> int:
+    return len(PdfReader(io.BytesIO(bytes_data)).pages)
+
+def extract_pdf_pages(bytes_data: bytes, start: int, stop: int) -> List[Dict[str, Any]]:
+    """Pages [start, stop) (0-based) as {"page": 1-based number, "text"}."""
     reader = PdfReader(io.BytesIO(bytes_data))
     out = []
-    for i, page in enumerate(reader.pages, start=1):
-        txt = page.extract_text() or ""
-        out.append({"page": i, "text": txt})
+    for i in range(start, min(stop, len(reader.pages))):
+        txt = reader.pages[i].extract_text() or ""
+        out.append({"page": i + 1, "text": txt})
+    return out
+
+# Per worker process: the PDF currently being sharded, so consecutive shards of the same
+# job don't re-parse its xref table
+_worker_reader: Dict[str, Any] = {}
+
+class _PageTimeout(BaseException):
+    """BaseException so pypdf's own `except Exception` fallbacks (XObject, cmap decoding)
+    can't swallow it and keep working on the page."""
+
+def _on_alarm(signum, frame):
+    raise _PageTimeout()
+
+def _file_reader(path: str) -> PdfReader:
+    reader = _worker_reader.get(path)
+    if reader is None:
+        _worker_reader.clear()
+        reader = _worker_reader[path] = PdfReader(path)
+    return reader
+
+def pdf_file_page_count(path: str) -> int:
+    return len(_file_reader(path).pages)
+
+def extract_pdf_file_pages(path: str, start: int, stop: int, page_timeout: float = 0) -> List[Dict[str, Any]]:
+    """Pages [start, stop) of the PDF at `path`, for the ingest process pool. A page whose
+    extraction exceeds `page_timeout` seconds comes back empty with "timed_out": True."""
+    reader = _file_reader(path)
+    use_alarm = page_timeout > 0 and hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+    previous = signal.signal(signal.SIGALRM, _on_alarm) if use_alarm else None
+    out = []
+    try:
+        for i in range(start, min(stop, len(reader.pages))):
+            page: Dict[str, Any] = {"page": i + 1}
+            try:
+                if use_alarm:
+                    signal.setitimer(signal.ITIMER_REAL, page_timeout)
+                page["text"] = reader.pages[i].extract_text() or ""
+            except _PageTimeout:
+                page.update(text="", timed_out=True)
+            finally:
+                if use_alarm:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+            out.append(page)
+    finally:
+        if use_alarm:
+            signal.signal(signal.SIGALRM, previous)
     return out
 
 def extract_from_docx(bytes_data: bytes) -> List[Dict[str, Any]]:
@@ -85,21 +208,258 @@ def guess_ext(filename: Optional[str]) -> str:
         return "bin"
     return (filename.split(".")[-1] or "bin").lower()
 
+def extract_document(ext: str, bytes_data: bytes) -> List[Dict[str, Any]]:
+    """Pages for a supported upload; module-level so it can run in the ingest process pool."""
+    if ext in ("pdf",):
+        return extract_from_pdf(bytes_data)
+    if ext in ("docx", "doc"):
+        if not docx:
+            raise RuntimeError("DOCX support not installed. Install python-docx.")
+        return extract_from_docx(bytes_data)
+    if ext in ("txt", "md"):
+        return extract_from_txt(bytes_data)
+    raise ValueError(f"Unsupported file type: .{ext}")
+
+async def _iter_pdf_pages(jobs, job, data: bytes):
+    """PDF pages in order, extracted PAGE_SHARD pages per task with up to one shard per pool
+    worker in flight. The upload is written to a temp file once so shards don't each pickle it."""
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    pending: "deque" = deque()
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            await asyncio.to_thread(fh.write, data)
+        total = await jobs.run_cpu(pdf_file_page_count, path)
+        await job.update(pages_total=total)
+
+        shards = iter([(s, min(total, s + PAGE_SHARD)) for s in range(0, total, PAGE_SHARD)])
+
+        def submit(shard):
+            s, e = shard
+            # backstop for pages the in-worker alarm can't interrupt
+            timeout = PAGE_TIMEOUT_S * (e - s) + 30 if PAGE_TIMEOUT_S > 0 else None
+            pending.append((shard, asyncio.ensure_future(
+                asyncio.wait_for(jobs.run_cpu(extract_pdf_file_pages, path, s, e, PAGE_TIMEOUT_S), timeout)
+            )))
+
+        for shard in itertools.islice(shards, jobs.worker_processes):
+            submit(shard)
+        while pending:
+            (s, e), fut = pending.popleft()
+            try:
+                pages = await fut
+            except asyncio.TimeoutError:
+                pages = [{"page": i + 1, "text": "", "timed_out": True} for i in range(s, e)]
+            nxt = next(shards, None)
+            if nxt is not None:
+                submit(nxt)
+            for page in pages:
+                yield page
+    finally:
+        for _, fut in pending:
+            fut.cancel()
+        os.unlink(path)
+
+async def _iter_pages(jobs, job, ext: Optional[str], data: Optional[bytes], input_text: Optional[str]):
+    """Pages as they're extracted; PDFs are sharded across the process pool."""
+    if data is None:
+        yield {"page": 0, "text": input_text or ""}
+        return
+    if ext == "pdf":
+        async for page in _iter_pdf_pages(jobs, job, data):
+            yield page
+        return
+    pages = await jobs.run_cpu(extract_document, ext, data)
+    await job.update(pages_total=len(pages))
+    for page in pages:
+        yield page
+
+# Producer -> consumer: extraction failed, don't finish the document
+_ABORT: List[Dict[str, Any]] = []
+
+def _fingerprint(*parts: Any) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else json.dumps(part, sort_keys=True, default=str).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+async def _rollback(qdrant, lexical, ids: List[str]) -> None:
+    try:
+        await qdrant.delete_points(ids)
+    finally:
+        lexical.remove(ids)
+
+def point_id(doc_id: str, chunk_hash: str, occurrence: int) -> str:
+    """Deterministic Qdrant id: same doc + same chunk content -> same point."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"rag:{doc_id}:{chunk_hash}:{occurrence}"))
+
+async def _process(app, job, *, data: Optional[bytes], ext: Optional[str], content_type: Optional[str],
+                   input_text: Optional[str], metadata: Dict[str, Any]) -> None:
+    """Background body of an ingest job, streamed end to end: pages are extracted, chunked,
+    embedded and upserted (Qdrant + BM25 index) batch by batch (memory stays flat, early chunks
+    are searchable while later pages are still being parsed). Extraction+chunking and
+    embedding+upsert run as two stages joined by a small bounded queue.
+
+    Ingest is content-addressed: the raw upload is stored once under its hash, a re-ingest of
+    identical content for a doc_id is a no-op, and otherwise only chunks whose content changed
+    are embedded (point ids derive from doc_id + chunk hash); points of chunks that no longer
+    exist are deleted at the end. Jobs for the same doc_id are serialized by the job manager."""
+    minio = app.state.minio
+    qdrant = app.state.qdrant
+    lexical = app.state.lexical
+    embedder = app.state.embedder
+    jobs = app.state.ingest_jobs
+    metrics = app.state.metrics
+
+    start = time.perf_counter()
+    source_key = None
+    source_url = None
+
+    raw = data if data is not None else (input_text or "").encode("utf-8")
+    # Chunk identity covers everything that changes the stored vector or payload
+    scope = _fingerprint(embedder.model_name, MAX_TOKENS, OVERLAP, metadata or {})
+    content_hash = _fingerprint(hashlib.sha256(raw).hexdigest(), scope)
+
+    existing = await qdrant.doc_points(job.doc_id)
+    if existing and all(p.get("content_hash") == content_hash for p in existing.values()):
+        await job.update(chunks_total=len(existing), chunks_done=len(existing), chunks_unchanged=len(existing))
+        metrics["INGEST_DURATION"].observe(time.perf_counter() - start)
+        return
+
+    if data is not None:
+        source_key = minio.build_content_key(hashlib.sha256(data).hexdigest(), ext)
+        if not await minio.exists(source_key):
+            await minio.put_bytes(source_key, data, content_type)
+        source_url = await minio.presigned_get(source_key)  # also warms the URL cache
+
+    now_iso = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    batches: "asyncio.Queue[Optional[List[Dict[str, Any]]]]" = asyncio.Queue(maxsize=2)
+
+    async def produce():
+        stream = ChunkStream()
+        batch: List[Dict[str, Any]] = []
+        pages_done = pages_timed_out = 0
+        try:
+            async for page in _iter_pages(jobs, job, ext, data, input_text):
+                batch.extend(await asyncio.to_thread(stream.feed, page.get("text", ""), page.get("page", 0)))
+                while len(batch) >= EMBED_BATCH:
+                    await batches.put(batch[:EMBED_BATCH])
+                    batch = batch[EMBED_BATCH:]
+                pages_done += 1
+                if page.get("timed_out"):
+                    pages_timed_out += 1
+                    metrics["PDF_PAGE_TIMEOUTS"].inc()
+                await job.update(pages_done=pages_done, pages_timed_out=pages_timed_out)
+            batch.extend(stream.flush())
+            for b in range(0, len(batch), EMBED_BATCH):
+                await batches.put(batch[b : b + EMBED_BATCH])
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            await batches.put(_ABORT)  # stop the consumer without touching the old version
+            raise
+        await batches.put(None)
+
+    added: List[str] = []  # points this run wrote that the previous version didn't have
+
+    async def consume() -> bool:
+        """False when extraction failed: the document wasn't read to the end."""
+        chunk_id = unchanged = 0
+        seen: set = set()
+        occurrences: Dict[str, int] = {}
+        while True:
+            batch = await batches.get()
+            if batch is _ABORT:
+                return False
+            if batch is None:
+                break
+            fresh = []
+            for c in batch:
+                chunk_hash = _fingerprint(c["text"], scope)
+                n = occurrences[chunk_hash] = occurrences.get(chunk_hash, -1) + 1
+                pid = point_id(job.doc_id, chunk_hash, n)
+                seen.add(pid)
+                if pid in existing:
+                    unchanged += 1  # same content already indexed for this doc
+                else:
+                    fresh.append((chunk_id, pid, chunk_hash, c))
+                chunk_id += 1
+
+            if fresh:
+                texts = [c["text"] for _, _, _, c in fresh]
+                e0 = time.perf_counter()
+                vectors = await jobs.run_embed(embedder.embed, texts)
+                metrics["EMBED_LATENCY"].observe(time.perf_counter() - e0)
+
+                payloads = []
+                for cid, pid, chunk_hash, c in fresh:
+                    payloads.append({
+                        "point_id": pid,
+                        "doc_id": job.doc_id,
+                        "chunk_id": cid,
+                        "chunk_hash": chunk_hash,
+                        "content_hash": content_hash,
+                        "page": c["page"],
+                        "page_end": c["page_end"],
+                        "source_url": source_url,
+                        "object_key": source_key,
+                        "created_at": now_iso,
+                        **(metadata or {}),
+                    })
+                ids = [pid for _, pid, _, _ in fresh]
+                added.extend(ids)
+                await qdrant.upsert(texts, vectors, payloads)
+                await asyncio.to_thread(lexical.add, ids, texts, payloads)
+                metrics["CHUNKS_INGESTED"].inc(len(fresh))
+            await job.update(chunks_done=chunk_id, chunks_unchanged=unchanged)
+
+        stale = [pid for pid in existing if pid not in seen]
+        if stale:
+            await qdrant.delete_points(stale)
+            lexical.remove(stale)
+        # unchanged chunks stay as they are; mark them as part of this version of the doc
+        kept = [pid for pid in existing if pid in seen]
+        if kept:
+            await qdrant.set_payload(kept, {"content_hash": content_hash})
+            lexical.set_payload(kept, {"content_hash": content_hash})
+        await job.update(chunks_total=chunk_id, chunks_deleted=len(stale))
+        return True
+
+    # Stale points are only deleted once the whole document was read; a failed run removes what
+    # it added and leaves the previous version in place
+    producer = asyncio.ensure_future(produce())
+    try:
+        completed = await consume()
+        await producer  # re-raises extraction errors
+        if not completed:
+            raise RuntimeError("extraction stopped early")
+    except BaseException:
+        producer.cancel()
+        if added:
+            await asyncio.shield(_rollback(qdrant, lexical, added))
+        raise
+
+    metrics["INGEST_DURATION"].observe(time.perf_counter() - start)
+
 @router.post("/ingest")
 async def ingest(
     request: Request,
     file: Optional[UploadFile] = File(None),
     text: Optional[str] = Form(None),
+    doc_id: Optional[str] = Form(None),
+    wait: bool = False,
 ):
     """Accepts multipart (file or form-text) OR JSON {text, doc_id?, metadata?}.
-    Stores raw to MinIO (app-bucket), extracts+chunks+embeds, upserts to Qdrant.
-    Returns: {doc_id, chunks_ingested}
+    Queues a background job that stores raw to MinIO (app-bucket), extracts+chunks+embeds and
+    upserts to Qdrant. Returns 202 {job_id, doc_id, status, ...}; follow it with
+    GET /v1/ingest/{job_id} or GET /v1/ingest/{job_id}/events (SSE).
+    With ?wait=true the request blocks until the job finishes and returns
+    {doc_id, chunks_ingested, chunks_unchanged, chunks_deleted}.
+    Pass doc_id to update a document in place (only changed chunks are re-embedded, removed
+    ones deleted). Without it, a document is scoped to user + session + content, so the same
+    content re-sent in a session is a no-op and nobody else's document is ever replaced.
     """
     app = request.app
-    minio = app.state.minio
-    qdrant = app.state.qdrant
-    embedder = app.state.embedder
-    metrics = app.state.metrics
 
     user_id = request.headers.get("X-User-Id", "anon")
     session_id = request.headers.get("X-Session-Id", "default")
@@ -111,66 +471,76 @@ async def ingest(
 
     input_text: Optional[str] = None
     metadata: Dict[str, Any] = {}
-    doc_id = None
 
     if body and body.get("text"):
         input_text = str(body["text"])[:10_000_000]
         doc_id = body.get("doc_id")
         metadata = body.get("metadata") or {}
+    elif text:
+        input_text = text[:10_000_000]
 
-    source_key = None
-    source_url = None
+    data: Optional[bytes] = None
+    ext: Optional[str] = None
+    content_type: Optional[str] = None
 
     # File path
     if file is not None:
-        data = await file.read()
         ext = guess_ext(file.filename)
-        source_key = minio.build_object_key(user_id, session_id, ext)
-        minio.put_bytes(source_key, data, content_type=file.content_type)
-        source_url = minio.presigned_get(source_key)
-
-        if ext in ("pdf",):
-            pages = extract_from_pdf(data)
-        elif ext in ("docx", "doc"):
-            pages = extract_from_docx(data)
-        elif ext in ("txt", "md"):
-            pages = extract_from_txt(data)
-        else:
+        if ext not in SUPPORTED_EXTS:
             raise HTTPException(status_code=415, detail=f"Unsupported file type: .{ext}")
+        data = await file.read()
+        content_type = file.content_type
+    elif not input_text:
+        raise HTTPException(status_code=400, detail="Provide a file upload or JSON with 'text'.")
 
-        corpus = "\n\n".join(p.get("text", "") for p in pages)
-        _doc_id = doc_id or uuid.uuid4().hex
-    elif input_text:
-        corpus = input_text
-        _doc_id = doc_id or uuid.uuid4().hex
+    if doc_id:
+        _doc_id = doc_id
     else:
-        raise HTTPException(status_code=400, detail="Provide a file upload or JSON with 'text'.")
+        raw = data if data is not None else (input_text or "").encode("utf-8")
+        _doc_id = _fingerprint("doc", user_id, session_id, hashlib.sha256(raw).hexdigest())[:32]
 
-    start = time.perf_counter()
-    chunks = chunk_text(corpus)
+    async def work(job):
+        await _process(app, job, data=data, ext=ext, content_type=content_type, input_text=input_text,
+                       metadata=metadata)
 
-    e0 = time.perf_counter()
-    vectors = embedder.embed(chunks)
-    e1 = time.perf_counter()
-    metrics["EMBED_LATENCY"].observe(e1 - e0)
+    job = app.state.ingest_jobs.submit(_doc_id, work)
 
-    now_iso = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
-    payloads = []
-    for i, chunk in enumerate(chunks):
-        payloads.append({
-            "doc_id": _doc_id,
-            "chunk_id": i,
-            "page": 0,
-            "source_url": source_url,
-            "object_key": source_key,
-            "created_at": now_iso,
-            **(metadata or {}),
-        })
-
-    qdrant.upsert(texts=chunks, vectors=vectors, payloads=payloads)
-
-    duration = time.perf_counter() - start
-    metrics["INGEST_DURATION"].observe(duration)
-    metrics["CHUNKS_INGESTED"].inc(len(chunks))
-
-    return {"doc_id": _doc_id, "chunks_ingested": len(chunks)}
+    if wait:
+        await job.wait()
+        if job.status == "failed":
+            raise HTTPException(status_code=500, detail=job.error)
+        return {"doc_id": _doc_id, "chunks_ingested": job.chunks_done - job.chunks_unchanged,
+                "chunks_unchanged": job.chunks_unchanged, "chunks_deleted": job.chunks_deleted}
+
+    return JSONResponse(status_code=202, content=job.to_dict())
+
+def _job_or_404(request: Request, job_id: str):
+    job = request.app.state.ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown ingest job")
+    return job
+
+@router.get("/ingest/{job_id}")
+async def ingest_status(request: Request, job_id: str):
+    return _job_or_404(request, job_id).to_dict()
+
+@router.get("/ingest/{job_id}/events")
+async def ingest_events(request: Request, job_id: str):
+    """SSE: ingest.progress on every change, then ingest.done or ingest.failed."""
+    job = _job_or_404(request, job_id)
+
+    async def gen():
+        seen = -1
+        while True:
+            if job.version != seen:
+                seen = job.version
+                snap = job.to_dict()
+                event = {"done": "ingest.done", "failed": "ingest.failed"}.get(job.status, "ingest.progress")
+                yield f"event: {event}\ndata: {json.dumps(snap)}\n\n"
+                if job.finished:
+                    return
+            if await request.is_disconnected():
+                return
+            await job.wait_change(seen, timeout=15.0)
+
+    return StreamingResponse(gen(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
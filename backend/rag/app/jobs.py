@@ -0,0 +1,165 @@
+import asyncio
+import multiprocessing
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+TERMINAL = ("done", "failed")
+
+
+class IngestJob:
+    """Progress of one background ingest; handlers read snapshots or wait for changes."""
+
+    def __init__(self, doc_id: str):
+        self.id = uuid.uuid4().hex
+        self.doc_id = doc_id
+        self.status = "queued"
+        self.pages_total: Optional[int] = None
+        self.pages_done = 0
+        self.pages_timed_out = 0
+        self.chunks_total: Optional[int] = None
+        self.chunks_done = 0
+        self.chunks_unchanged = 0
+        self.chunks_deleted = 0
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.version = 0
+        self._changed = asyncio.Condition()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "doc_id": self.doc_id,
+            "status": self.status,
+            "pages_total": self.pages_total,
+            "pages_done": self.pages_done,
+            "pages_timed_out": self.pages_timed_out,
+            "chunks_total": self.chunks_total,
+            "chunks_done": self.chunks_done,
+            "chunks_unchanged": self.chunks_unchanged,
+            "chunks_deleted": self.chunks_deleted,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+    async def update(self, **fields: Any) -> None:
+        async with self._changed:
+            for k, v in fields.items():
+                setattr(self, k, v)
+            self.updated_at = time.time()
+            self.version += 1
+            self._changed.notify_all()
+
+    async def wait_change(self, seen_version: int, timeout: float) -> None:
+        async with self._changed:
+            try:
+                await asyncio.wait_for(self._changed.wait_for(lambda: self.version != seen_version), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def wait(self) -> None:
+        while self.status not in TERMINAL:
+            await self.wait_change(self.version, timeout=30.0)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in TERMINAL
+
+
+class IngestJobManager:
+    """Runs ingests in the background, at most `max_concurrent` at a time.
+
+    CPU-heavy extraction goes to a small process pool and embedding to its own worker thread,
+    so a large upload can't starve retrieval (event loop and query-embedding thread) of CPU.
+    Finished jobs are kept for status lookups, bounded to `history`. Jobs for the same doc_id
+    run one after another (each diffs against what the previous one left in the index); the
+    lock is per process, so replicas must not ingest the same doc_id concurrently.
+    """
+
+    def __init__(self, max_concurrent: int = 2, worker_processes: int = 2, history: int = 1000,
+                 metrics: Optional[Dict[str, Any]] = None):
+        self._sem = asyncio.Semaphore(max(1, max_concurrent))
+        self.worker_processes = max(1, worker_processes)
+        # forkserver: workers start from a clean process, not a fork of this one mid-request
+        # (event loop, client threads and locks held by other threads don't carry over)
+        self._procs = ProcessPoolExecutor(max_workers=self.worker_processes,
+                                          mp_context=multiprocessing.get_context("forkserver"))
+        self._embed_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-embed")
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._tasks: set = set()
+        self._doc_locks: Dict[str, asyncio.Lock] = {}
+        self._doc_waiters: Dict[str, int] = {}
+        self.history = history
+        self.metrics = metrics or {}
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        return self._jobs.get(job_id)
+
+    def submit(self, doc_id: str, work: Callable[[IngestJob], Awaitable[Any]]) -> IngestJob:
+        job = IngestJob(doc_id)
+        self._jobs[job.id] = job
+        self._prune()
+        task = asyncio.get_running_loop().create_task(self._run(job, work))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job: IngestJob, work: Callable[[IngestJob], Awaitable[Any]]) -> None:
+        queued = self.metrics.get("INGEST_QUEUED")
+        if queued is not None:
+            queued.inc()
+        lock = self._doc_locks.setdefault(job.doc_id, asyncio.Lock())
+        self._doc_waiters[job.doc_id] = self._doc_waiters.get(job.doc_id, 0) + 1
+        try:
+            async with lock:
+                try:
+                    await self._sem.acquire()
+                finally:
+                    if queued is not None:
+                        queued.dec()
+                    queued = None
+                try:
+                    await job.update(status="running")
+                    await work(job)
+                finally:
+                    self._sem.release()
+        except asyncio.CancelledError:
+            # shutdown or a cancelled task: never leave the job "queued"/"running" forever
+            await job.update(status="failed", error="cancelled")
+            raise
+        except Exception as e:
+            await job.update(status="failed", error=str(e) or type(e).__name__)
+        else:
+            await job.update(status="done")
+        finally:
+            if queued is not None:  # cancelled while waiting for the doc lock
+                queued.dec()
+            self._doc_waiters[job.doc_id] -= 1
+            if not self._doc_waiters[job.doc_id]:
+                del self._doc_waiters[job.doc_id]
+                del self._doc_locks[job.doc_id]
+            if "INGEST_JOBS" in self.metrics:
+                self.metrics["INGEST_JOBS"].labels(status=job.status).inc()
+
+    def _prune(self) -> None:
+        if len(self._jobs) <= self.history:
+            return
+        for job_id in [j.id for j in self._jobs.values() if j.finished][: len(self._jobs) - self.history]:
+            del self._jobs[job_id]
+
+    async def run_cpu(self, fn: Callable, *args: Any) -> Any:
+        """Run a picklable module-level function in the process pool."""
+        return await asyncio.get_running_loop().run_in_executor(self._procs, fn, *args)
+
+    async def run_embed(self, fn: Callable, *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._embed_thread, fn, *args)
+
+    async def shutdown(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        self._procs.shutdown(wait=False, cancel_futures=True)
+        self._embed_thread.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,134 @@
+import math
+import re
+import threading
+from collections import Counter
+from heapq import nlargest
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Identifiers stay whole ("err_4031", "v2.3.1", "x-request-id") and are also indexed by their
+# parts, so "4031" or "request" still match
+_TOKEN = re.compile(r"[a-z0-9]+(?:[._\-/:][a-z0-9]+)*")
+_PART = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    out: List[str] = []
+    for tok in _TOKEN.findall((text or "").lower()):
+        out.append(tok)
+        parts = _PART.findall(tok)
+        if len(parts) > 1:
+            out.extend(parts)
+    return out
+
+
+def rrf_fuse(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Reciprocal rank fusion: sum of 1 / (k + rank) over the rankings an id appears in."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, pid in enumerate(ranking, start=1):
+            scores[pid] = scores.get(pid, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+
+
+class BM25Index:
+    """In-process BM25 inverted index over chunk texts, keyed by Qdrant point id.
+
+    Kept in step with the collection by ingest (add/remove next to the Qdrant writes) and
+    rebuilt from a Qdrant scroll at startup. Only payloads without the text are held here
+    (for filters); callers fetch texts of lexical-only hits from Qdrant.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}  # term -> point id -> tf
+        self._terms: Dict[str, Tuple[str, ...]] = {}    # point id -> its distinct terms
+        self._lengths: Dict[str, int] = {}
+        self._payloads: Dict[str, Dict[str, Any]] = {}
+        self._total_len = 0
+        self._lock = threading.RLock()
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, ids: Sequence[str], texts: Sequence[str], payloads: Sequence[Dict[str, Any]]) -> None:
+        with self._lock:
+            for pid, text, payload in zip(ids, texts, payloads):
+                pid = str(pid)
+                self._remove(pid)
+                tf = Counter(tokenize(text))
+                for term, n in tf.items():
+                    self._postings.setdefault(term, {})[pid] = n
+                self._terms[pid] = tuple(tf)
+                length = sum(tf.values())
+                self._lengths[pid] = length
+                self._total_len += length
+                self._payloads[pid] = {k: v for k, v in payload.items() if k != "text"}
+
+    def remove(self, ids: Iterable[str]) -> None:
+        with self._lock:
+            for pid in ids:
+                self._remove(str(pid))
+
+    def set_payload(self, ids: Iterable[str], payload: Dict[str, Any]) -> None:
+        with self._lock:
+            for pid in ids:
+                stored = self._payloads.get(str(pid))
+                if stored is not None:
+                    stored.update(payload)
+
+    def _remove(self, pid: str) -> None:
+        terms = self._terms.pop(pid, None)
+        if terms is None:
+            return
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(pid, None)
+                if not posting:
+                    del self._postings[term]
+        self._total_len -= self._lengths.pop(pid)
+        self._payloads.pop(pid, None)
+
+    def search(self, query: str, top_k: int = 10,
+               filters: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """[(point id, bm25 score, payload without text)], best first."""
+        terms = set(tokenize(query))
+        with self._lock:
+            n_docs = len(self._lengths)
+            if not terms or not n_docs:
+                return []
+            avg_len = self._total_len / n_docs
+            scores: Dict[str, float] = {}
+            for term in terms:
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1.0 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                for pid, tf in posting.items():
+                    norm = self.k1 * (1.0 - self.b + self.b * self._lengths[pid] / avg_len)
+                    scores[pid] = scores.get(pid, 0.0) + idf * tf * (self.k1 + 1.0) / (tf + norm)
+            if filters:
+                scores = {pid: s for pid, s in scores.items()
+                          if all(self._payloads[pid].get(k) == v for k, v in filters.items())}
+            best = nlargest(top_k, scores.items(), key=lambda kv: kv[1])
+            return [(pid, score, dict(self._payloads[pid])) for pid, score in best]
+
+    def rebuild(self, points: Iterable[Tuple[str, Dict[str, Any]]], batch: int = 1024) -> int:
+        """Load (point id, payload with "text") pairs, e.g. a Qdrant scroll."""
+        ids: List[str] = []
+        texts: List[str] = []
+        payloads: List[Dict[str, Any]] = []
+        count = 0
+        for pid, payload in points:
+            ids.append(str(pid))
+            texts.append(payload.get("text") or "")
+            payloads.append(payload)
+            if len(ids) >= batch:
+                self.add(ids, texts, payloads)
+                count += len(ids)
+                ids, texts, payloads = [], [], []
+        self.add(ids, texts, payloads)
+        self.ready = True
+        return count + len(ids)
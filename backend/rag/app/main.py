@@ -1,6 +1,7 @@
 
 import os
 import time
+import asyncio
 import logging
 from typing import Dict, Any
 
@@ -13,6 +14,7 @@ from prometheus_client import (
     CollectorRegistry,
     generate_latest,
     Counter,
+    Gauge,
     Histogram,
 )
 
@@ -32,13 +34,20 @@ except Exception:
         return app
 
 from .minio_client import MinioStore
-from .qdrant_client import QdrantStore
+from .vector_store import make_vector_store
+from .aio import AsyncMinioStore, AsyncVectorStore, Limiter
 from .embedder import Embedder
+from .embed_dispatcher import EmbedDispatcher
+from .embed_cache import QueryEmbeddingCache
+from .jobs import IngestJobManager
+from .lexical import BM25Index
+from .reranker import Reranker
 from .ingest import router as ingest_router
 from .retrieve import router as retrieve_router
 
 SERVICE_NAME = os.getenv("SERVICE_NAME", "rag")
 PORT = int(os.getenv("PORT", "8000"))
+VECTOR_STORE = os.getenv("VECTOR_STORE", "qdrant")
 
 # ---- Logging ----
 logger = logging.getLogger(SERVICE_NAME)
@@ -55,9 +64,56 @@ EMBED_LATENCY = Histogram(
 ANN_LATENCY = Histogram(
     "rag_ann_latency_seconds", "Vector search latency", registry=registry
 )
+LEXICAL_LATENCY = Histogram(
+    "rag_lexical_latency_seconds", "BM25 search latency", registry=registry
+)
+RERANK_LATENCY = Histogram(
+    "rag_rerank_latency_seconds", "Cross-encoder rerank latency (reranks that completed)", registry=registry
+)
+RERANK_SKIPS = Counter(
+    "rag_rerank_skips_total", "Reranks skipped, by reason (budget, timeout, busy, error, evicted)",
+    ["reason"], registry=registry
+)
+RERANK_CACHE_LOOKUPS = Counter(
+    "rag_rerank_cache_lookups_total", "(query, chunk) rerank score cache lookups by result", ["result"],
+    registry=registry
+)
+PRESIGN_CACHE_LOOKUPS = Counter(
+    "rag_presign_cache_lookups_total", "Presigned URL cache lookups by result (hit, stale, miss)", ["result"],
+    registry=registry
+)
+STORAGE_QUEUE_WAIT = Histogram(
+    "rag_storage_queue_wait_seconds", "Time a storage call waited for its dependency's concurrency limit",
+    ["dependency"], buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+    registry=registry
+)
+STORAGE_INFLIGHT = Gauge(
+    "rag_storage_inflight", "Storage calls in flight per dependency", ["dependency"], registry=registry
+)
 CHUNKS_INGESTED = Counter(
     "rag_chunks_ingested_total", "Total chunks ingested", registry=registry
 )
+INGEST_JOBS = Counter(
+    "rag_ingest_jobs_total", "Finished ingest jobs by status", ["status"], registry=registry
+)
+PDF_PAGE_TIMEOUTS = Counter(
+    "rag_pdf_page_timeouts_total", "PDF pages skipped because text extraction timed out", registry=registry
+)
+INGEST_QUEUED = Gauge(
+    "rag_ingest_jobs_queued", "Ingest jobs waiting for a worker slot", registry=registry
+)
+EMBED_BATCH_SIZE = Histogram(
+    "rag_embed_batch_size", "Queries per micro-batched embedding forward pass",
+    buckets=(1, 2, 4, 8, 16, 32, 64), registry=registry
+)
+EMBED_CACHE_LOOKUPS = Counter(
+    "rag_embed_cache_lookups_total", "Query embedding cache lookups by result (hit_memory, hit_redis, miss)",
+    ["result"], registry=registry
+)
+EMBED_QUEUE_WAIT = Histogram(
+    "rag_embed_queue_wait_seconds", "Time a query waited for its embedding batch to start",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0), registry=registry
+)
 
 
 def build_app() -> FastAPI:
@@ -78,24 +134,99 @@ def build_app() -> FastAPI:
     @app.on_event("startup")
     async def _startup():
         logger.info("[startup] initializing clients and embedder")
-        app.state.minio = MinioStore(
+        # Storage clients are wrapped in async adapters: blocking calls run in a bounded pool per
+        # dependency, with its own concurrency limit, so one slow dependency can't stall the rest
+        app.state.minio = AsyncMinioStore(MinioStore(
             endpoint=os.getenv("MINIO_ENDPOINT", "http://minio:9000"),
             access_key=os.getenv("MINIO_ACCESS_KEY", "minioadmin"),
             secret_key=os.getenv("MINIO_SECRET_KEY", "minioadmin"),
             secure=os.getenv("MINIO_SECURE", "false").lower() == "true",
             bucket=os.getenv("MINIO_BUCKET", "app-bucket"),
             presign_days=int(os.getenv("MINIO_PRESIGN_DAYS", "7")),
-        )
+            presign_refresh=float(os.getenv("MINIO_PRESIGN_REFRESH", "0.5")),
+            presign_cache_entries=int(os.getenv("MINIO_PRESIGN_CACHE_ENTRIES", "10000")),
+            metrics=app.state.metrics,
+        ), Limiter("minio", int(os.getenv("MINIO_MAX_CONCURRENCY", "8")), app.state.metrics))
         app.state.embedder = Embedder(model_name=os.getenv(
             "EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2"))
-        app.state.qdrant = QdrantStore(
-            url=os.getenv("QDRANT_URL", "http://qdrant:6333"),
-            api_key=os.getenv("QDRANT_API_KEY"),
+        # Vector store: Qdrant, or VECTOR_STORE=local for the in-process store (small corpora, dev, tests)
+        app.state.qdrant = AsyncVectorStore(make_vector_store(
+            VECTOR_STORE,
             collection=os.getenv("QDRANT_COLLECTION", "rag_chunks"),
             vector_size=app.state.embedder.dim,
+            qdrant_url=os.getenv("QDRANT_URL", "http://qdrant:6333"),
+            qdrant_api_key=os.getenv("QDRANT_API_KEY"),
+            local_dir=os.getenv("LOCAL_VECTOR_DIR", "/data/vectors"),
+            ivf_min_points=int(os.getenv("LOCAL_IVF_MIN_POINTS", "20000")),
+            ivf_nprobe=int(os.getenv("LOCAL_IVF_NPROBE", "8")),
+        ), Limiter("qdrant", int(os.getenv("QDRANT_MAX_CONCURRENCY", "16")), app.state.metrics))
+        # BM25 side of hybrid retrieval: in-process, rebuilt from the collection in the background
+        app.state.lexical = BM25Index()
+
+        async def _rebuild_lexical():
+            try:
+                n = await asyncio.to_thread(app.state.lexical.rebuild, app.state.qdrant.sync.iter_points())
+                logger.info("[startup] BM25 index rebuilt from %d chunks", n)
+            except Exception:
+                logger.exception("[startup] BM25 index rebuild failed; lexical results stay partial")
+
+        app.state.lexical_rebuild = asyncio.get_running_loop().create_task(_rebuild_lexical())
+        # Query embeddings: micro-batched on a dedicated worker thread
+        app.state.embed_dispatcher = EmbedDispatcher(
+            app.state.embedder,
+            max_batch=int(os.getenv("EMBED_MAX_BATCH", "32")),
+            window_ms=float(os.getenv("EMBED_BATCH_WINDOW_MS", "5")),
+            metrics=app.state.metrics,
+            cache=QueryEmbeddingCache(
+                app.state.embedder.model_name,
+                max_entries=int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "4096")),
+                redis_url=os.getenv("EMBED_CACHE_REDIS_URL") or None,
+                redis_ttl_s=int(os.getenv("EMBED_CACHE_REDIS_TTL_S", "86400")),
+                redis_timeout_ms=float(os.getenv("EMBED_CACHE_REDIS_TIMEOUT_MS", "100")),
+                redis_retry_s=float(os.getenv("EMBED_CACHE_REDIS_RETRY_S", "30")),
+                metrics=app.state.metrics,
+            ),
+        )
+        app.state.embed_dispatcher.start()
+        # Cross-encoder rerank stage (per request, or by default with RERANK_DEFAULT=true);
+        # the model loads on first use. RERANK_MODEL="" turns it off.
+        rerank_model = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+        app.state.reranker = Reranker(
+            rerank_model,
+            max_batch=int(os.getenv("RERANK_MAX_BATCH", "32")),
+            budget_ms=float(os.getenv("RERANK_BUDGET_MS", "150")),
+            cache_entries=int(os.getenv("RERANK_CACHE_ENTRIES", "8192")),
+            metrics=app.state.metrics,
+        ) if rerank_model else None
+        # Background ingest jobs; limits keep large uploads from starving retrieval
+        app.state.ingest_jobs = IngestJobManager(
+            max_concurrent=int(os.getenv("INGEST_MAX_CONCURRENT_JOBS", "2")),
+            worker_processes=int(os.getenv("INGEST_WORKER_PROCESSES", "2")),
+            metrics=app.state.metrics,
         )
         logger.info("[startup] ready")
 
+    @app.on_event("shutdown")
+    async def _shutdown():
+        rebuild = getattr(app.state, "lexical_rebuild", None)
+        if rebuild is not None:
+            rebuild.cancel()
+        dispatcher = getattr(app.state, "embed_dispatcher", None)
+        if dispatcher is not None:
+            await dispatcher.stop()
+        reranker = getattr(app.state, "reranker", None)
+        if reranker is not None:
+            reranker.stop()
+        jobs = getattr(app.state, "ingest_jobs", None)
+        if jobs is not None:
+            await jobs.shutdown()
+        store = getattr(app.state, "qdrant", None)
+        if store is not None:
+            await store.aclose()
+        minio = getattr(app.state, "minio", None)
+        if minio is not None:
+            minio.close()
+
     @app.get("/v1/health")
     async def health(deep: int = 0):
         data: Dict[str, Any] = {"status": "ok", "service": SERVICE_NAME}
@@ -105,6 +236,8 @@ def build_app() -> FastAPI:
                 "qdrant_collection": app.state.qdrant.collection,
                 "embed_model": app.state.embedder.model_name,
                 "embed_dim": app.state.embedder.dim,
+                "lexical_ready": app.state.lexical.ready,
+                "lexical_chunks": len(app.state.lexical),
             })
         return data
 
@@ -113,6 +246,7 @@ def build_app() -> FastAPI:
         return {
             "service": SERVICE_NAME,
             "minio": {"endpoint": os.getenv("MINIO_ENDPOINT"), "bucket": app.state.minio.bucket},
+            "vector_store": VECTOR_STORE,
             "qdrant": {"url": os.getenv("QDRANT_URL"), "collection": app.state.qdrant.collection},
             "embed_model": app.state.embedder.model_name,
         }
@@ -130,7 +264,20 @@ def build_app() -> FastAPI:
         "INGEST_DURATION": INGEST_DURATION,
         "EMBED_LATENCY": EMBED_LATENCY,
         "ANN_LATENCY": ANN_LATENCY,
+        "LEXICAL_LATENCY": LEXICAL_LATENCY,
+        "RERANK_LATENCY": RERANK_LATENCY,
+        "RERANK_SKIPS": RERANK_SKIPS,
+        "RERANK_CACHE_LOOKUPS": RERANK_CACHE_LOOKUPS,
+        "PRESIGN_CACHE_LOOKUPS": PRESIGN_CACHE_LOOKUPS,
+        "STORAGE_QUEUE_WAIT": STORAGE_QUEUE_WAIT,
+        "STORAGE_INFLIGHT": STORAGE_INFLIGHT,
         "CHUNKS_INGESTED": CHUNKS_INGESTED,
+        "EMBED_BATCH_SIZE": EMBED_BATCH_SIZE,
+        "EMBED_QUEUE_WAIT": EMBED_QUEUE_WAIT,
+        "EMBED_CACHE_LOOKUPS": EMBED_CACHE_LOOKUPS,
+        "INGEST_JOBS": INGEST_JOBS,
+        "INGEST_QUEUED": INGEST_QUEUED,
+        "PDF_PAGE_TIMEOUTS": PDF_PAGE_TIMEOUTS,
     }
 
     return app
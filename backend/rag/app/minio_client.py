@@ -1,17 +1,35 @@
 
 import io
+import threading
+import time
 import uuid
+from collections import OrderedDict
 from datetime import timedelta
-from typing import Optional
+from typing import Any, Dict, Iterable, Optional, Tuple
 from minio import Minio
 from minio.error import S3Error
 
 class MinioStore:
-    def __init__(self, endpoint: str, access_key: str, secret_key: str, secure: bool, bucket: str, presign_days: int = 7):
+    """MinIO bucket access plus a cache of presigned GET URLs.
+
+    A presigned URL is reused until `presign_refresh` of its lifetime has passed (half by
+    default), then it's stale: still valid for the rest of its life, so it's served while a
+    fresh one is signed (see `cached_presigned`). Bounded LRU of `presign_cache_entries` keys.
+    """
+
+    def __init__(self, endpoint: str, access_key: str, secret_key: str, secure: bool, bucket: str, presign_days: int = 7,
+                 presign_refresh: float = 0.5, presign_cache_entries: int = 10000,
+                 metrics: Optional[Dict[str, Any]] = None):
         endpoint = endpoint.replace("http://", "").replace("https://", "")
         self.client = Minio(endpoint, access_key=access_key, secret_key=secret_key, secure=secure)
         self.bucket = bucket
         self.presign_days = presign_days
+        self.presign_refresh = min(max(presign_refresh, 0.0), 0.9)
+        self.presign_cache_entries = presign_cache_entries
+        self.metrics = metrics or {}
+        # key -> (url, refresh_at, expires_at) on time.time()
+        self._presigned: "OrderedDict[str, Tuple[str, float, float]]" = OrderedDict()
+        self._presign_lock = threading.Lock()
         self.ensure_bucket()
 
     def ensure_bucket(self):
@@ -27,14 +45,62 @@ class MinioStore:
             content_type=content_type or "application/octet-stream",
         )
 
-    def presigned_get(self, key: str) -> str:
+    def exists(self, key: str) -> bool:
         try:
-            return self.client.presigned_get_object(self.bucket, key, expires=timedelta(days=self.presign_days))
+            self.client.stat_object(self.bucket, key)
+            return True
         except S3Error:
-            return f"s3://{self.bucket}/{key}"
+            return False
+
+    def _sign(self, key: str) -> str:
+        lifetime = timedelta(days=self.presign_days).total_seconds()
+        now = time.time()
+        try:
+            url = self.client.presigned_get_object(self.bucket, key, expires=timedelta(days=self.presign_days))
+        except S3Error:
+            return f"s3://{self.bucket}/{key}"  # not cached: retried on the next lookup
+        with self._presign_lock:
+            self._presigned[key] = (url, now + lifetime * self.presign_refresh, now + lifetime)
+            self._presigned.move_to_end(key)
+            while len(self._presigned) > self.presign_cache_entries:
+                self._presigned.popitem(last=False)
+        return url
+
+    def cached_presigned(self, key: str) -> Tuple[Optional[str], bool]:
+        """(url, needs_refresh) without signing: (None, True) on a miss, (url, True) when stale."""
+        now = time.time()
+        with self._presign_lock:
+            hit = self._presigned.get(key)
+            if hit is not None and now >= hit[2]:
+                del self._presigned[key]
+                hit = None
+            if hit is not None:
+                self._presigned.move_to_end(key)
+        if hit is None:
+            result = (None, True)
+        else:
+            result = (hit[0], now >= hit[1])
+        if "PRESIGN_CACHE_LOOKUPS" in self.metrics:
+            self.metrics["PRESIGN_CACHE_LOOKUPS"].labels(
+                result="miss" if hit is None else ("stale" if result[1] else "hit")).inc()
+        return result
+
+    def presigned_get(self, key: str) -> str:
+        url, stale = self.cached_presigned(key)
+        return url if url is not None and not stale else self._sign(key)
+
+    def presign_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        """Sign (and cache) each key; blocking, meant for a worker thread."""
+        return {key: self._sign(key) for key in keys}
 
     @staticmethod
     def build_object_key(user_id: str, session_id: str, ext: str) -> str:
         rid = uuid.uuid4().hex[:8]
         ext = (ext or "").lstrip(".") or "bin"
         return f"u/{user_id}/sess/{session_id}/{rid}.{ext}"
+
+    @staticmethod
+    def build_content_key(sha256_hex: str, ext: str) -> str:
+        """Content-addressed key: identical uploads share one object."""
+        ext = (ext or "").lstrip(".") or "bin"
+        return f"blobs/{sha256_hex[:2]}/{sha256_hex}.{ext}"
@@ -1,19 +1,24 @@
-from typing import List, Optional, Dict, Any
+import asyncio
+from typing import List, Optional, Dict, Any, Iterator, Tuple
 from uuid import uuid4
 
-from qdrant_client import QdrantClient
+import numpy as np
+from qdrant_client import AsyncQdrantClient, QdrantClient
 from qdrant_client.models import (
     Distance,
     VectorParams,
-    PointStruct,
     Filter,
     FieldCondition,
     MatchValue,
+    PointIdsList,
 )
 
 class QdrantStore:
     def __init__(self, url: str, api_key: Optional[str], collection: str, vector_size: int):
-        self.client = QdrantClient(url=url, api_key=api_key)
+        # ":memory:" runs qdrant-client's embedded local mode (benchmarks, tests)
+        self.client = QdrantClient(location=":memory:") if url == ":memory:" else QdrantClient(url=url, api_key=api_key)
+        # Non-blocking client for the query path; local mode has a single in-process store, so none there
+        self.aclient = None if url == ":memory:" else AsyncQdrantClient(url=url, api_key=api_key)
         self.collection = collection
         self.vector_size = vector_size
         self._ensure_collection()
@@ -26,40 +31,109 @@ class QdrantStore:
                 vectors_config=VectorParams(size=self.vector_size, distance=Distance.COSINE),
             )
 
-    def upsert(self, texts: List[str], vectors: List[List[float]], payloads: List[Dict[str, Any]]):
-        points: List[PointStruct] = []
-        for txt, vec, payload in zip(texts, vectors, payloads):
-            # ensure a valid ID and sane payload/vector types
-            point_id = payload.get("point_id") or str(uuid4())
+    def upsert(self, texts: List[str], vectors: Any, payloads: List[Dict[str, Any]], batch_size: int = 256):
+        """`vectors` is an (n, dim) float32 array; it's handed to the client's bulk uploader
+        as-is (batched), without building per-point Python float lists."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        ids: List[str] = []
+        docs: List[Dict[str, Any]] = []
+        for txt, payload in zip(texts, payloads):
+            # ensure a valid ID and sane payload
+            ids.append(payload.get("point_id") or str(uuid4()))
             payload = dict(payload)  # shallow copy
             payload["text"] = txt
-            vec = [float(x) for x in vec]
+            docs.append(payload)
 
-            points.append(
-                PointStruct(
-                    id=point_id,
-                    vector=vec,
-                    payload=payload,
-                )
+        self.client.upload_collection(
+            collection_name=self.collection,
+            vectors=vectors[: len(ids)],
+            payload=docs,
+            ids=ids,
+            batch_size=batch_size,
+            wait=True,
+        )
+
+    def doc_points(self, doc_id: str) -> Dict[str, Dict[str, Any]]:
+        """point id -> {"content_hash"} for every point of a document."""
+        flt = Filter(must=[FieldCondition(key="doc_id", match=MatchValue(value=doc_id))])
+        out: Dict[str, Dict[str, Any]] = {}
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection,
+                scroll_filter=flt,
+                limit=1024,
+                offset=offset,
+                with_payload=["content_hash"],
+                with_vectors=False,
+            )
+            for p in points:
+                out[str(p.id)] = dict(p.payload or {})
+            if offset is None:
+                return out
+
+    def iter_points(self, batch: int = 1024) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """(point id, payload) for the whole collection, without vectors."""
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection, limit=batch, offset=offset,
+                with_payload=True, with_vectors=False,
             )
+            for p in points:
+                yield str(p.id), dict(p.payload or {})
+            if offset is None:
+                return
+
+    def get_payloads(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        if not ids:
+            return {}
+        points = self.client.retrieve(collection_name=self.collection, ids=ids, with_payload=True, with_vectors=False)
+        return {str(p.id): dict(p.payload or {}) for p in points}
+
+    def delete_points(self, ids: List[str]):
+        self.client.delete(collection_name=self.collection, points_selector=PointIdsList(points=ids), wait=True)
 
-        self.client.upsert(collection_name=self.collection, points=points)
+    def set_payload(self, ids: List[str], payload: Dict[str, Any]):
+        self.client.set_payload(collection_name=self.collection, payload=payload, points=ids, wait=True)
 
     def search(
         self,
-        query_vec: List[float],
+        query_vec: Any,
         top_k: int = 3,
         filters: Optional[Dict[str, Any]] = None,
     ):
-        f: Optional[Filter] = None
-        if filters:
-            must = [FieldCondition(key=k, match=MatchValue(value=v)) for k, v in filters.items()]
-            f = Filter(must=must)
-
         return self.client.search(
             collection_name=self.collection,
-            query_vector=[float(x) for x in query_vec],
+            query_vector=np.asarray(query_vec, dtype=np.float32),
             limit=top_k,
-            query_filter=f,
+            query_filter=self._filter(filters),
         )
 
+    async def asearch(
+        self,
+        query_vec: Any,
+        top_k: int = 3,
+        filters: Optional[Dict[str, Any]] = None,
+    ):
+        if self.aclient is None:
+            return await asyncio.to_thread(self.search, query_vec, top_k=top_k, filters=filters)
+        return await self.aclient.search(
+            collection_name=self.collection,
+            query_vector=np.asarray(query_vec, dtype=np.float32),
+            limit=top_k,
+            query_filter=self._filter(filters),
+        )
+
+    @staticmethod
+    def _filter(filters: Optional[Dict[str, Any]]) -> Optional[Filter]:
+        if not filters:
+            return None
+        return Filter(must=[FieldCondition(key=k, match=MatchValue(value=v)) for k, v in filters.items()])
+
+    def close(self):
+        self.client.close()
+
+    async def aclose(self):
+        if self.aclient is not None:
+            await self.aclient.close()
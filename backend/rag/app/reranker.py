@@ -0,0 +1,126 @@
+import asyncio
+import hashlib
+import logging
+import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .retrieve import Hit
+
+logger = logging.getLogger("rag.reranker")
+
+_WS = re.compile(r"\s+")
+
+
+class Reranker:
+    """Cross-encoder second stage for /v1/retrieve.
+
+    Scores (query, chunk text) pairs in batches on a dedicated worker thread, so the event loop
+    and the query-embedding thread never wait on it. Scores are cached per (query, text) in an
+    LRU; only uncached candidates go to the model. The model is loaded lazily on that thread.
+
+    Reranking is best effort within `budget_ms`: it's skipped up front when the uncached pairs
+    would take longer than the budget at the measured per-pair cost, or when `max_inflight`
+    batches are already queued, and abandoned (first-stage order returned) when it overruns.
+    An abandoned batch still finishes in the background and fills the cache for the next ask.
+    """
+
+    def __init__(self, model_name: str, max_batch: int = 32, budget_ms: float = 150.0,
+                 cache_entries: int = 8192, max_inflight: int = 2, metrics: Optional[Dict[str, Any]] = None):
+        self.model_name = model_name
+        self.max_batch = max(1, max_batch)
+        self.budget = max(0.0, budget_ms) / 1000.0
+        self.cache_entries = cache_entries
+        self.max_inflight = max(1, max_inflight)
+        self.metrics = metrics or {}
+        self._model = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+        self._cache: "OrderedDict[bytes, float]" = OrderedDict()
+        self._pair_s: Optional[float] = None  # EMA of model seconds per pair
+        self._inflight = 0
+
+    def _key(self, query: str, text: str) -> bytes:
+        norm = _WS.sub(" ", (query or "").strip()).casefold()
+        return hashlib.blake2b(f"{self.model_name}\x00{norm}\x00{text}".encode("utf-8"), digest_size=16).digest()
+
+    def _predict(self, query: str, texts: Sequence[str]) -> Tuple[np.ndarray, float]:
+        if self._model is None:
+            from sentence_transformers import CrossEncoder
+            self._model = CrossEncoder(self.model_name)
+            logger.info("reranker: loaded %s", self.model_name)
+        t0 = time.perf_counter()
+        scores = self._model.predict([(query, t) for t in texts], batch_size=self.max_batch,
+                                     show_progress_bar=False, convert_to_numpy=True)
+        return np.asarray(scores, dtype=np.float32).reshape(-1), time.perf_counter() - t0
+
+    def _skip(self, reason: str) -> None:
+        if "RERANK_SKIPS" in self.metrics:
+            self.metrics["RERANK_SKIPS"].labels(reason=reason).inc()
+
+    async def _score(self, query: str, keys: List[bytes], texts: List[str]) -> None:
+        try:
+            scores, seconds = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._predict, query, texts)
+        finally:
+            self._inflight -= 1
+        per_pair = seconds / max(1, len(texts))
+        self._pair_s = per_pair if self._pair_s is None else 0.8 * self._pair_s + 0.2 * per_pair
+        for key, score in zip(keys, scores):
+            self._cache[key] = float(score)
+            self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_entries:
+            self._cache.popitem(last=False)
+
+    async def rerank(self, query: str, hits: List[Hit], top_k: int) -> Optional[List[Tuple[Hit, float]]]:
+        """[(hit, rerank score)] best first, or None when skipped (caller keeps first-stage order)."""
+        if not hits:
+            return []
+        t0 = time.perf_counter()
+        keys = [self._key(query, (p.get("text") or "")) for _, _, p in hits]
+        missing = [i for i, k in enumerate(keys) if k not in self._cache]
+        if "RERANK_CACHE_LOOKUPS" in self.metrics:
+            self.metrics["RERANK_CACHE_LOOKUPS"].labels(result="hit").inc(len(keys) - len(missing))
+            self.metrics["RERANK_CACHE_LOOKUPS"].labels(result="miss").inc(len(missing))
+
+        if missing:
+            if self._inflight >= self.max_inflight:
+                self._skip("busy")
+                return None
+            if self._pair_s is not None and self._pair_s * len(missing) > self.budget:
+                # relax the estimate so one slow batch doesn't switch reranking off for good
+                self._pair_s *= 0.9
+                self._skip("budget")
+                return None
+            self._inflight += 1
+            task = asyncio.ensure_future(self._score(query, [keys[i] for i in missing],
+                                                     [hits[i][2].get("text") or "" for i in missing]))
+            task.add_done_callback(_log_failure)
+            try:
+                await asyncio.wait_for(asyncio.shield(task), self.budget)
+            except asyncio.TimeoutError:
+                self._skip("timeout")
+                return None
+            except Exception:
+                self._skip("error")
+                return None
+
+        scored = [(hit, self._cache[k]) for hit, k in zip(hits, keys) if k in self._cache]
+        if len(scored) < len(hits):
+            self._skip("evicted")
+            return None
+        scored.sort(key=lambda hs: hs[1], reverse=True)
+        if "RERANK_LATENCY" in self.metrics:
+            self.metrics["RERANK_LATENCY"].observe(time.perf_counter() - t0)
+        return scored[:top_k]
+
+    def stop(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _log_failure(task: "asyncio.Future") -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("reranker: scoring failed (%s)", task.exception())
@@ -1,14 +1,33 @@
-
+import os
 import json
 import time
-from typing import Optional, Dict, Any
+import asyncio
+from typing import Optional, Dict, Any, List, Set, Tuple
 from fastapi import APIRouter, Request, HTTPException
 
+from .lexical import rrf_fuse
+
 router = APIRouter()
 
+# (point id, score, payload)
+Hit = Tuple[str, float, Dict[str, Any]]
+
+# Background presigned-URL refreshes: keys being re-signed, and their tasks
+_refreshing: Set[str] = set()
+_background: Set["asyncio.Future"] = set()
+
+RETRIEVE_MODE = os.getenv("RETRIEVE_MODE", "dense")          # dense | lexical | hybrid
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))  # per-ranker depth before fusion
+RRF_K = int(os.getenv("RRF_K", "60"))
+MODES = ("dense", "lexical", "hybrid")
+RERANK_DEFAULT = os.getenv("RERANK_DEFAULT", "false").lower() == "true"
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))  # first-stage depth when reranking
+
+
 @router.get("/retrieve")
-async def retrieve_get(request: Request, q: str, top_k: int = 3, filters: Optional[str] = None):
-    return await _retrieve(request, q, top_k, filters)
+async def retrieve_get(request: Request, q: str, top_k: int = 3, filters: Optional[str] = None,
+                       mode: Optional[str] = None, rerank: Optional[bool] = None):
+    return await _retrieve(request, q, top_k, filters, mode, rerank)
 
 @router.post("/retrieve")
 async def retrieve_post(request: Request, payload: Dict[str, Any]):
@@ -17,48 +36,135 @@ async def retrieve_post(request: Request, payload: Dict[str, Any]):
         raise HTTPException(status_code=400, detail="Missing 'q'")
     top_k = int(payload.get("top_k", 3))
     filters = payload.get("filters")
-    return await _retrieve(request, q, top_k, json.dumps(filters) if filters else None)
+    return await _retrieve(request, q, top_k, json.dumps(filters) if filters else None, payload.get("mode"),
+                           payload.get("rerank"))
+
+
+async def _dense(state, q: str, limit: int, filters: Optional[Dict[str, Any]]) -> List[Hit]:
+    t0 = time.perf_counter()
+    qvec = await state.embed_dispatcher.embed(q)
+    hits = await state.qdrant.search(qvec, top_k=limit, filters=filters)
+    state.metrics["ANN_LATENCY"].observe(time.perf_counter() - t0)
+    return [(str(h.id), float(h.score), h.payload or {}) for h in hits]
+
+
+async def _lexical(state, q: str, limit: int, filters: Optional[Dict[str, Any]]) -> List[Hit]:
+    t0 = time.perf_counter()
+    hits = await asyncio.to_thread(state.lexical.search, q, limit, filters)
+    state.metrics["LEXICAL_LATENCY"].observe(time.perf_counter() - t0)
+    return hits
 
-async def _retrieve(request: Request, q: str, top_k: int, filters: Optional[str]):
+
+async def search(state, q: str, top_k: int, filters: Optional[Dict[str, Any]] = None,
+                 mode: str = "dense") -> List[Hit]:
+    """[(point id, score, payload)] best first. "hybrid" runs BM25 and dense search concurrently
+    and orders by reciprocal rank fusion of the two rankings. Its score stays a first-stage score
+    (cosine, or BM25 for hits only the lexical ranker found), since callers threshold on it; the
+    RRF score goes to payload["fusion_score"]."""
+    if mode == "dense":
+        return await _dense(state, q, top_k, filters)
+    if mode == "lexical":
+        hits = await _lexical(state, q, top_k, filters)
+    else:
+        depth = max(top_k, HYBRID_CANDIDATES)
+        dense, lexical = await asyncio.gather(_dense(state, q, depth, filters), _lexical(state, q, depth, filters))
+        first = {pid: (score, payload) for pid, score, payload in lexical}
+        first.update((pid, (score, payload)) for pid, score, payload in dense)
+        fused = rrf_fuse([[pid for pid, _, _ in dense], [pid for pid, _, _ in lexical]], k=RRF_K)[:top_k]
+        hits = [(pid, first[pid][0], dict(first[pid][1], fusion_score=fusion)) for pid, fusion in fused]
+    # The BM25 index holds no texts; fetch them for hits that dense search didn't return
+    missing = [pid for pid, _, payload in hits if "text" not in payload]
+    if missing:
+        stored = await state.qdrant.get_payloads(missing)
+        hits = [(pid, score, payload if "text" in payload else {**payload, **stored[pid]})
+                for pid, score, payload in hits if "text" in payload or pid in stored]
+    return hits
+
+
+async def _refresh_urls(minio, keys: Set[str]) -> None:
+    try:
+        await minio.presign_many(keys)
+    except Exception:
+        pass
+    finally:
+        _refreshing.difference_update(keys)
+
+
+async def _source_urls(minio, keys: Set[str]) -> Dict[str, str]:
+    """Presigned URL per object key from the MinIO store's cache. Only keys never seen (or
+    expired) are signed, together and off the event loop; stale ones are served as they are
+    (still valid) and re-signed in the background."""
+    urls: Dict[str, str] = {}
+    missing: List[str] = []
+    stale: Set[str] = set()
+    for key in keys:
+        url, needs_refresh = minio.cached_presigned(key)
+        if url is None:
+            missing.append(key)
+            continue
+        urls[key] = url
+        if needs_refresh and key not in _refreshing:
+            stale.add(key)
+    if stale:
+        _refreshing.update(stale)
+        task = asyncio.ensure_future(_refresh_urls(minio, stale))
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+    if missing:
+        try:
+            urls.update(await minio.presign_many(missing))
+        except Exception:
+            pass  # fall back to the URL stored at ingest
+    return urls
+
+
+async def _retrieve(request: Request, q: str, top_k: int, filters: Optional[str], mode: Optional[str] = None,
+                    rerank: Optional[bool] = None):
     if not q:
         raise HTTPException(status_code=400, detail="Missing 'q' query parameter")
+    mode = mode or RETRIEVE_MODE
+    if mode not in MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid 'mode' (one of {', '.join(MODES)})")
 
     app = request.app
-    embedder = app.state.embedder
-    qdrant = app.state.qdrant
     minio = app.state.minio
-    metrics = app.state.metrics
 
     try:
         f_dict = json.loads(filters) if filters else None
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid 'filters' JSON")
 
-    t0 = time.perf_counter()
-    qvec = embedder.embed([q])[0]
-    hits = qdrant.search(qvec, top_k=top_k, filters=f_dict)
-    t1 = time.perf_counter()
-    metrics["ANN_LATENCY"].observe(t1 - t0)
+    # Optional cross-encoder stage: over-fetch, rerank, keep top_k. "score" stays the first-stage
+    # score (callers threshold on it); the cross-encoder's goes to "rerank_score"
+    reranker = app.state.reranker
+    use_rerank = reranker is not None and (RERANK_DEFAULT if rerank is None else bool(rerank))
+    hits = await search(app.state, q, max(top_k, RERANK_CANDIDATES) if use_rerank else top_k, f_dict, mode)
+    rerank_scores: List[Optional[float]] = [None] * top_k
+    reranked = None
+    if use_rerank:
+        reranked = await reranker.rerank(q, hits, top_k)
+        if reranked is not None:
+            hits = [hit for hit, _ in reranked]
+            rerank_scores = [score for _, score in reranked]
+    hits = hits[:top_k]
+
+    urls = await _source_urls(minio, {p["object_key"] for _, _, p in hits if p.get("object_key")})
 
     results = []
-    for h in hits:
-        p = h.payload or {}
+    for (_, score, p), rerank_score in zip(hits, rerank_scores):
         text = p.get("text", "")
         doc_id = p.get("doc_id")
         chunk_id = p.get("chunk_id")
-        score = float(h.score)
         key = p.get("object_key")
-        source_url = p.get("source_url")
-        if key:
-            try:
-                source_url = minio.presigned_get(key)
-            except Exception:
-                pass
+        source_url = urls.get(key) or p.get("source_url")
         results.append({
             "text": text,
-            "score": score,
+            "score": float(score),
             "source_url": source_url,
             "doc_id": doc_id,
             "chunk_id": chunk_id,
+            "page": p.get("page"),
+            "rerank_score": rerank_score,
+            "fusion_score": p.get("fusion_score"),
         })
-    return {"results": results}
+    return {"results": results, "mode": mode, "reranked": reranked is not None}
@@ -0,0 +1,293 @@
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from uuid import uuid4
+
+import numpy as np
+
+logger = logging.getLogger("rag.vector_store")
+
+
+class Hit(NamedTuple):
+    """Search result; same attributes as qdrant-client's ScoredPoint that callers read."""
+    id: str
+    score: float
+    payload: Dict[str, Any]
+
+
+def make_vector_store(kind: str, *, collection: str, vector_size: int, qdrant_url: Optional[str] = None,
+                      qdrant_api_key: Optional[str] = None, local_dir: Optional[str] = None,
+                      ivf_min_points: int = 20000, ivf_nprobe: int = 8):
+    """VECTOR_STORE=qdrant (default) or local. Both expose the QdrantStore interface
+    (upsert, search, doc_points, iter_points, get_payloads, delete_points, set_payload, close)."""
+    if kind == "local":
+        return LocalVectorStore(local_dir or "/data/vectors", collection, vector_size,
+                                ivf_min_points=ivf_min_points, ivf_nprobe=ivf_nprobe)
+    if kind != "qdrant":
+        raise ValueError(f"Unknown VECTOR_STORE {kind!r} (qdrant or local)")
+    from .qdrant_client import QdrantStore  # only needs qdrant-client when selected
+    return QdrantStore(url=qdrant_url, api_key=qdrant_api_key, collection=collection, vector_size=vector_size)
+
+
+class LocalVectorStore:
+    """In-process vector store for small deployments, dev and tests: no network hop per search.
+
+    Vectors live in a memory-mapped float32 matrix (`vectors.f32`, L2-normalized, cosine == dot);
+    ids and payloads in an append-only log (`points.jsonl`) replayed on load and compacted when it
+    outgrows the live set. Files are opened lazily on first use. Below `ivf_min_points` live
+    points search is an exact scan; above it an IVF index (spherical k-means lists, `ivf_nprobe`
+    probed per query) is built and rebuilt whenever the collection doubles. Filters are exact
+    payload matches, like the Qdrant store; a filtered IVF search that comes up short falls back
+    to an exact scan of the matching points.
+
+    Single-process: two services must not share one directory.
+    """
+
+    _GROW = 1024
+
+    def __init__(self, path: str, collection: str, vector_size: int,
+                 ivf_min_points: int = 20000, ivf_nprobe: int = 8):
+        self.collection = collection
+        self.vector_size = vector_size
+        self.dir = os.path.join(path, collection)
+        self.ivf_min_points = ivf_min_points
+        self.ivf_nprobe = max(1, ivf_nprobe)
+        self._lock = threading.RLock()
+        self._loaded = False
+
+    # ---- storage ----
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            os.makedirs(self.dir, exist_ok=True)
+            self._ids: List[Optional[str]] = []
+            self._rows: Dict[str, int] = {}
+            self._payloads: List[Optional[Dict[str, Any]]] = []
+            self._free: List[int] = []
+            self._log_lines = 0
+            log_path = os.path.join(self.dir, "points.jsonl")
+            if os.path.exists(log_path):
+                with open(log_path, encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            self._apply(json.loads(line))
+                            self._log_lines += 1
+            self._free = [row for row, pid in enumerate(self._ids) if pid is None]
+            vec_path = os.path.join(self.dir, "vectors.f32")
+            capacity = max(len(self._ids), self._GROW)
+            if not os.path.exists(vec_path) or os.path.getsize(vec_path) < capacity * self.vector_size * 4:
+                with open(vec_path, "ab") as f:
+                    f.truncate(capacity * self.vector_size * 4)
+            self._open_matrix()
+            self._log = open(log_path, "a", encoding="utf-8")
+            self._ivf: Optional[np.ndarray] = None  # centroids
+            self._assign = np.full(self._capacity, -1, dtype=np.int32)
+            self._alive = np.zeros(self._capacity, dtype=bool)
+            self._alive[list(self._rows.values())] = True
+            self._ivf_built_at = 0
+            self._loaded = True
+            self._maybe_build_ivf()
+
+    def _open_matrix(self) -> None:
+        vec_path = os.path.join(self.dir, "vectors.f32")
+        self._capacity = os.path.getsize(vec_path) // (self.vector_size * 4)
+        self._matrix = np.memmap(vec_path, dtype=np.float32, mode="r+", shape=(self._capacity, self.vector_size))
+
+    def _grow(self, needed: int) -> None:
+        if needed <= self._capacity:
+            return
+        capacity = max(needed, self._capacity * 2)
+        self._matrix.flush()
+        del self._matrix
+        with open(os.path.join(self.dir, "vectors.f32"), "ab") as f:
+            f.truncate(capacity * self.vector_size * 4)
+        self._open_matrix()
+        extra = self._capacity - len(self._assign)
+        self._assign = np.concatenate([self._assign, np.full(extra, -1, dtype=np.int32)])
+        self._alive = np.concatenate([self._alive, np.zeros(extra, dtype=bool)])
+
+    def _apply(self, op: Dict[str, Any]) -> None:
+        """Replay one log record (also the in-memory side of a write)."""
+        if op["op"] == "put":
+            row = op["row"]
+            while len(self._ids) <= row:
+                self._ids.append(None)
+                self._payloads.append(None)
+            self._ids[row] = op["id"]
+            self._payloads[row] = op["payload"]
+            self._rows[op["id"]] = row
+        elif op["op"] == "del":
+            for pid in op["ids"]:
+                row = self._rows.pop(pid, None)
+                if row is not None:
+                    self._ids[row] = None
+                    self._payloads[row] = None
+        elif op["op"] == "set":
+            for pid in op["ids"]:
+                row = self._rows.get(pid)
+                if row is not None:
+                    self._payloads[row].update(op["payload"])
+
+    def _write(self, ops: List[Dict[str, Any]]) -> None:
+        for op in ops:
+            self._log.write(json.dumps(op, ensure_ascii=False) + "\n")
+        self._log.flush()
+        self._log_lines += len(ops)
+        if self._log_lines > 2 * len(self._rows) + 10_000:
+            self._compact()
+
+    def _compact(self) -> None:
+        log_path = os.path.join(self.dir, "points.jsonl")
+        tmp = log_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for row, pid in enumerate(self._ids):
+                if pid is not None:
+                    f.write(json.dumps({"op": "put", "id": pid, "row": row, "payload": self._payloads[row]},
+                                       ensure_ascii=False) + "\n")
+        self._log.close()
+        os.replace(tmp, log_path)
+        self._log = open(log_path, "a", encoding="utf-8")
+        self._log_lines = len(self._rows)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._loaded:
+                self._matrix.flush()
+                self._log.close()
+                del self._matrix
+                self._loaded = False
+
+    # ---- IVF ----
+    def _maybe_build_ivf(self) -> None:
+        n = len(self._rows)
+        if n < self.ivf_min_points or (self._ivf is not None and n < 2 * self._ivf_built_at):
+            return
+        live = np.fromiter(self._rows.values(), dtype=np.int64, count=n)
+        nlist = max(2, int(np.sqrt(n)))
+        rng = np.random.default_rng(0)
+        sample = np.asarray(self._matrix[np.sort(rng.choice(live, size=min(n, nlist * 64), replace=False))])
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(8):  # spherical k-means on a sample
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            filled = np.bincount(labels, minlength=nlist) > 0
+            centroids[filled] = sums[filled]  # empty lists keep their old centroid
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-9)
+        self._ivf = centroids
+        self._assign[:] = -1
+        for start in range(0, n, 65536):
+            rows = live[start:start + 65536]
+            self._assign[rows] = np.argmax(self._matrix[rows] @ centroids.T, axis=1)
+        self._ivf_built_at = n
+        logger.info("local vector store %s: IVF built over %d points, %d lists", self.collection, n, nlist)
+
+    # ---- QdrantStore interface ----
+    def upsert(self, texts: List[str], vectors: Any, payloads: List[Dict[str, Any]], batch_size: int = 256):
+        self._load()
+        vectors = np.asarray(vectors, dtype=np.float32)[: len(texts)]
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+        with self._lock:
+            ops = []
+            rows = []
+            assigned: Dict[str, int] = {}
+            next_row = len(self._ids)
+            for txt, payload in zip(texts, payloads):
+                pid = str(payload.get("point_id") or uuid4())
+                payload = dict(payload)
+                payload["text"] = txt
+                row = assigned.get(pid, self._rows.get(pid))
+                if row is None:
+                    if self._free:
+                        row = self._free.pop()
+                    else:
+                        row, next_row = next_row, next_row + 1
+                assigned[pid] = row
+                rows.append(row)
+                ops.append({"op": "put", "id": pid, "row": row, "payload": payload})
+            self._grow(max(rows, default=-1) + 1)
+            idx = np.asarray(rows, dtype=np.int64)
+            self._matrix[idx] = vectors
+            self._matrix.flush()
+            self._alive[idx] = True
+            for op in ops:
+                self._apply(op)
+            if self._ivf is not None:
+                self._assign[idx] = np.argmax(vectors @ self._ivf.T, axis=1)
+            self._write(ops)
+            self._maybe_build_ivf()
+
+    def _matches(self, row: int, filters: Dict[str, Any]) -> bool:
+        payload = self._payloads[row]
+        return payload is not None and all(payload.get(k) == v for k, v in filters.items())
+
+    def _hits(self, rows: np.ndarray, scores: np.ndarray, top_k: int) -> List[Hit]:
+        k = min(top_k, len(rows))
+        if k <= 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [Hit(self._ids[rows[i]], float(scores[i]), dict(self._payloads[rows[i]])) for i in best]
+
+    def search(self, query_vec: Any, top_k: int = 3, filters: Optional[Dict[str, Any]] = None) -> List[Hit]:
+        self._load()
+        q = np.asarray(query_vec, dtype=np.float32).reshape(-1)
+        q = q / max(float(np.linalg.norm(q)), 1e-9)
+        with self._lock:
+            n = len(self._ids)
+            if self._ivf is not None:
+                probe = np.argsort(-(self._ivf @ q))[: self.ivf_nprobe]
+                rows = np.flatnonzero(np.isin(self._assign[:n], probe))
+                if filters:
+                    rows = rows[[self._matches(r, filters) for r in rows]] if len(rows) else rows
+                if len(rows) >= top_k:
+                    return self._hits(rows, self._matrix[rows] @ q, top_k)
+            if filters:
+                rows = np.asarray(sorted(r for r in self._rows.values() if self._matches(r, filters)), dtype=np.int64)
+                return self._hits(rows, self._matrix[rows] @ q, top_k) if len(rows) else []
+            # exact scan straight off the mapped matrix; free rows are masked out
+            scores = self._matrix[:n] @ q
+            scores[~self._alive[:n]] = -np.inf
+            rows = np.arange(n)
+            return self._hits(rows, scores, min(top_k, len(self._rows)))
+
+    def doc_points(self, doc_id: str) -> Dict[str, Dict[str, Any]]:
+        self._load()
+        with self._lock:
+            return {pid: {"content_hash": self._payloads[row].get("content_hash")}
+                    for pid, row in self._rows.items() if self._payloads[row].get("doc_id") == doc_id}
+
+    def iter_points(self, batch: int = 1024) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        self._load()
+        with self._lock:
+            snapshot = [(pid, dict(self._payloads[row])) for pid, row in self._rows.items()]
+        return iter(snapshot)
+
+    def get_payloads(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        self._load()
+        with self._lock:
+            return {pid: dict(self._payloads[self._rows[pid]]) for pid in ids if pid in self._rows}
+
+    def delete_points(self, ids: List[str]):
+        self._load()
+        with self._lock:
+            rows = [self._rows[pid] for pid in ids if pid in self._rows]
+            self._apply({"op": "del", "ids": list(ids)})
+            if rows:
+                self._matrix[np.asarray(rows)] = 0.0
+                self._assign[np.asarray(rows)] = -1
+                self._alive[np.asarray(rows)] = False
+                self._free.extend(rows)
+            self._write([{"op": "del", "ids": list(ids)}])
+
+    def set_payload(self, ids: List[str], payload: Dict[str, Any]):
+        self._load()
+        with self._lock:
+            op = {"op": "set", "ids": list(ids), "payload": payload}
+            self._apply(op)
+            self._write([op])
@@ -0,0 +1,88 @@
+# tests/test_aio.py
+"""
+Per-dependency storage limits: a Limiter never runs more than max_concurrent blocking calls at
+once and reports the time callers spent queued; AsyncVectorStore uses the store's native
+asearch when it has one, under the same limit.
+"""
+
+import asyncio
+import threading
+import time
+
+from prometheus_client import CollectorRegistry, Gauge, Histogram
+
+from app.aio import AsyncVectorStore, Limiter
+
+
+class _Peak:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+
+    def work(self, seconds):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(seconds)
+        with self.lock:
+            self.running -= 1
+        return threading.current_thread().name
+
+
+def _metrics():
+    registry = CollectorRegistry()
+    return registry, {
+        "STORAGE_QUEUE_WAIT": Histogram("wait", "wait", ["dependency"], registry=registry),
+        "STORAGE_INFLIGHT": Gauge("inflight", "inflight", ["dependency"], registry=registry),
+    }
+
+
+def test_limiter_caps_concurrency_and_records_queue_wait():
+    async def run():
+        registry, metrics = _metrics()
+        limiter = Limiter("qdrant", 3, metrics)
+        peak = _Peak()
+        names = await asyncio.gather(*(limiter.run(peak.work, 0.02) for _ in range(12)))
+        limiter.shutdown()
+
+        assert peak.peak == 3
+        assert all(name.startswith("qdrant") for name in names)  # its own pool, not the default one
+        assert registry.get_sample_value("wait_count", {"dependency": "qdrant"}) == 12
+        assert registry.get_sample_value("wait_sum", {"dependency": "qdrant"}) >= 0.02 * 3
+        assert registry.get_sample_value("inflight", {"dependency": "qdrant"}) == 0
+
+    asyncio.run(run())
+
+
+class _SyncStore:
+    def __init__(self):
+        self.calls = []
+
+    def search(self, query_vec, top_k=3, filters=None):
+        self.calls.append(("search", threading.current_thread().name))
+        return ["sync"]
+
+    def close(self):
+        pass
+
+
+class _NativeStore(_SyncStore):
+    async def asearch(self, query_vec, top_k=3, filters=None):
+        self.calls.append(("asearch", top_k, filters))
+        return ["native"]
+
+
+def test_vector_store_prefers_native_async_search():
+    async def run():
+        native = AsyncVectorStore(_NativeStore(), Limiter("native", 1))
+        assert await native.search([1.0], top_k=5, filters={"doc_id": "d"}) == ["native"]
+        assert native.sync.calls == [("asearch", 5, {"doc_id": "d"})]
+
+        threaded = AsyncVectorStore(_SyncStore(), Limiter("local", 1))
+        assert await threaded.search([1.0]) == ["sync"]
+        assert threaded.sync.calls[0][1].startswith("local")
+        await native.aclose()
+        await threaded.aclose()
+
+    asyncio.run(run())
@@ -0,0 +1,87 @@
+# tests/test_embed_cache.py
+"""
+Query embedding cache: normalized keys, bounded LRU, Redis tier (shared across replicas) that
+pauses itself on errors and comes back after the retry window, and cached vectors that don't pin or alias the batch array.
+"""
+
+import asyncio
+
+import numpy as np
+
+from app import embed_cache
+from app.embed_cache import QueryEmbeddingCache
+
+
+class _FakeRedis:
+    def __init__(self, fail=False):
+        self.data, self.fail, self.calls = {}, fail, 0
+
+    async def get(self, key):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("redis down")
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("redis down")
+        self.data[key] = value
+
+
+def test_lru_hits_on_normalized_text_and_evicts_oldest():
+    async def run():
+        cache = QueryEmbeddingCache("m", max_entries=2)
+        await cache.put("what is  qdrant", np.ones(4))
+        assert (await cache.get("  what is qdrant ")).tolist() == [1.0] * 4
+        await cache.put("b", np.zeros(4))
+        await cache.get("what is qdrant")  # most recently used
+        await cache.put("c", np.zeros(4))
+        assert await cache.get("b") is None
+        assert await cache.get("what is qdrant") is not None
+        assert QueryEmbeddingCache("other").key("q") != cache.key("q")  # model is part of the key
+
+    asyncio.run(run())
+
+
+def test_put_stores_a_readonly_copy_not_a_view_of_the_batch():
+    async def run():
+        cache = QueryEmbeddingCache("m")
+        batch = np.arange(8, dtype=np.float32).reshape(2, 4)
+        stored = await cache.put("q", batch[1])
+        assert stored.base is None and not stored.flags.writeable
+        batch[1] = -1.0
+        assert (await cache.get("q")).tolist() == [4.0, 5.0, 6.0, 7.0]
+
+    asyncio.run(run())
+
+
+def test_redis_tier_is_shared_and_paused_on_errors(monkeypatch):
+    async def run():
+        shared = _FakeRedis()
+        a, b = QueryEmbeddingCache("m"), QueryEmbeddingCache("m")
+        a._redis = b._redis = shared
+        await a.put("q", np.full(4, 0.5))
+        assert (await b.get("q")).tolist() == [0.5] * 4  # another replica's vector
+
+        now = [1000.0]
+        monkeypatch.setattr(embed_cache.time, "monotonic", lambda: now[0])
+        broken = QueryEmbeddingCache("m", redis_retry_s=30)
+        redis = broken._redis = _FakeRedis(fail=True)
+        assert await broken.get("q") is None
+        await broken.put("q", np.ones(4))
+        assert await broken.get("q") is not None and await broken.get("r") is None
+        assert redis.calls == 1  # memory tier only during the pause
+
+        redis.fail = False
+        now[0] += 31
+        await broken.put("r", np.zeros(4))
+        assert broken._redis is redis and "embq:" + broken.key("r") in redis.data  # back after the window
+
+    asyncio.run(run())
+
+
+def test_redis_client_uses_short_timeouts():
+    cache = QueryEmbeddingCache("m", redis_url="redis://localhost:6379/0", redis_timeout_ms=80)
+    kwargs = cache._redis.connection_pool.connection_kwargs
+    assert kwargs["socket_timeout"] == kwargs["socket_connect_timeout"] == 0.08
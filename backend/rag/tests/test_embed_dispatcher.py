@@ -0,0 +1,70 @@
+# tests/test_embed_dispatcher.py
+"""
+Query embedding micro-batcher: concurrent queries share one forward pass (up to max_batch),
+errors reach every waiter, and cached queries skip the model.
+"""
+
+import asyncio
+
+import numpy as np
+
+from app.embed_cache import QueryEmbeddingCache
+from app.embed_dispatcher import EmbedDispatcher
+
+
+class _CountingEmbedder:
+    model_name = "count"
+
+    def __init__(self, fail=False):
+        self.batches, self.fail = [], fail
+
+    def embed(self, texts):
+        self.batches.append(list(texts))
+        if self.fail:
+            raise RuntimeError("model crashed")
+        return np.array([[float(len(t)), 1.0] for t in texts], dtype=np.float32)
+
+
+def test_concurrent_queries_share_batches():
+    async def run():
+        embedder = _CountingEmbedder()
+        dispatcher = EmbedDispatcher(embedder, max_batch=4, window_ms=20)
+        dispatcher.start()
+        texts = [f"q{'x' * i}" for i in range(10)]
+        vectors = await dispatcher.embed_many(texts)
+        await dispatcher.stop()
+
+        assert [v[0] for v in vectors] == [float(len(t)) for t in texts]  # each caller gets its own row
+        assert sorted(len(b) for b in embedder.batches) == [2, 4, 4]
+        assert sorted(t for b in embedder.batches for t in b) == sorted(texts)
+
+    asyncio.run(run())
+
+
+def test_model_errors_fail_the_whole_batch_and_the_loop_keeps_going():
+    async def run():
+        embedder = _CountingEmbedder(fail=True)
+        dispatcher = EmbedDispatcher(embedder, max_batch=8, window_ms=5)
+        dispatcher.start()
+        results = await asyncio.gather(dispatcher.embed("a"), dispatcher.embed("b"), return_exceptions=True)
+        assert [str(r) for r in results] == ["model crashed"] * 2
+
+        embedder.fail = False
+        assert (await dispatcher.embed("abc"))[0] == 3.0
+        await dispatcher.stop()
+
+    asyncio.run(run())
+
+
+def test_cached_queries_skip_the_model():
+    async def run():
+        embedder = _CountingEmbedder()
+        dispatcher = EmbedDispatcher(embedder, window_ms=1, cache=QueryEmbeddingCache("count"))
+        dispatcher.start()
+        first = await dispatcher.embed("what is bm25")
+        again = await dispatcher.embed("  what is  bm25")
+        await dispatcher.stop()
+        assert len(embedder.batches) == 1
+        assert again is first and not again.flags.writeable
+
+    asyncio.run(run())
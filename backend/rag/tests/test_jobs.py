@@ -0,0 +1,87 @@
+# tests/test_jobs.py
+"""
+IngestJobManager: job lifecycle, failure states and per-document ordering.
+"""
+
+import asyncio
+
+from app.jobs import IngestJobManager
+
+
+def test_jobs_for_the_same_doc_run_one_at_a_time():
+    async def run():
+        jobs = IngestJobManager(max_concurrent=4, worker_processes=1)
+        running = {"a": 0, "b": 0}
+        peak = {"a": 0, "b": 0}
+        order = []
+
+        def work_for(doc, n):
+            async def work(job):
+                running[doc] += 1
+                peak[doc] = max(peak[doc], running[doc])
+                order.append((doc, n))
+                await asyncio.sleep(0.01)
+                running[doc] -= 1
+            return work
+
+        submitted = [jobs.submit("a", work_for("a", n)) for n in range(3)] + [jobs.submit("b", work_for("b", 0))]
+        await asyncio.gather(*(j.wait() for j in submitted))
+
+        assert [j.status for j in submitted] == ["done"] * 4
+        assert peak == {"a": 1, "b": 1}
+        assert [n for doc, n in order if doc == "a"] == [0, 1, 2]  # in submission order
+        assert order.index(("b", 0)) < order.index(("a", 1))      # other docs don't wait
+        assert not jobs._doc_locks
+        await jobs.shutdown()
+
+    asyncio.run(run())
+
+
+def test_job_lifecycle_and_failure_states():
+    async def run():
+        jobs = IngestJobManager(max_concurrent=1, worker_processes=1, history=2)
+        seen = []
+
+        async def ok(job):
+            seen.append(job.status)
+            await job.update(chunks_done=3)
+
+        async def boom(job):
+            raise ValueError("bad page")
+
+        done, failed = jobs.submit("a", ok), jobs.submit("b", boom)
+        assert done.status == "queued"
+        await asyncio.gather(done.wait(), failed.wait())
+        assert seen == ["running"]
+        assert (done.status, done.chunks_done, done.error) == ("done", 3, None)
+        assert (failed.status, failed.error) == ("failed", "bad page")
+        assert failed.to_dict()["job_id"] == failed.id and jobs.get(failed.id) is failed
+
+        assert await jobs.run_cpu(pow, 2, 10) == 1024  # forkserver process pool
+
+        jobs.submit("c", ok)
+        await asyncio.sleep(0.05)
+        assert jobs.get(done.id) is None  # oldest finished job pruned past `history`
+        await jobs.shutdown()
+
+    asyncio.run(run())
+
+
+def test_cancelled_jobs_do_not_stay_running():
+    async def run():
+        jobs = IngestJobManager(max_concurrent=1, worker_processes=1)
+        started = asyncio.Event()
+
+        async def slow(job):
+            started.set()
+            await asyncio.sleep(60)
+
+        running, queued = jobs.submit("a", slow), jobs.submit("b", slow)
+        await started.wait()
+        await jobs.shutdown()
+        await asyncio.sleep(0)
+        await asyncio.wait_for(asyncio.gather(running.wait(), queued.wait()), 1.0)
+        assert (running.status, running.error) == ("failed", "cancelled")
+        assert (queued.status, queued.error) == ("failed", "cancelled")
+
+    asyncio.run(run())
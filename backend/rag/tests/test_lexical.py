@@ -0,0 +1,92 @@
+# tests/test_lexical.py
+"""
+BM25 index and reciprocal rank fusion: identifiers are searchable whole and by parts, the
+index follows adds/removes/payload updates, and hybrid search fuses dense and BM25 rankings
+(fetching texts of lexical-only hits from the vector store).
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from prometheus_client import CollectorRegistry, Histogram
+
+from app.aio import AsyncVectorStore, Limiter
+from app.lexical import BM25Index, rrf_fuse, tokenize
+from app.qdrant_client import QdrantStore
+from app.retrieve import search
+from tools.bench_retrieval import DirectEmbed, HashEmbedder
+
+DOCS = {
+    "00000000-0000-0000-0000-000000000001": ("Error ERR_4031 means the upload token expired.", "a"),
+    "00000000-0000-0000-0000-000000000002": ("Set the X-Request-Id header to trace a request.", "a"),
+    "00000000-0000-0000-0000-000000000003": ("Refunds are issued within 14 days of the return.", "b"),
+    "00000000-0000-0000-0000-000000000004": ("Uploads larger than 2 GB are rejected by the gateway.", "b"),
+}
+
+
+def _index():
+    index = BM25Index()
+    ids = list(DOCS)
+    index.add(ids, [t for t, _ in DOCS.values()], [{"doc_id": d, "text": t} for t, d in DOCS.values()])
+    return index, ids
+
+
+def test_identifiers_tokenize_whole_and_by_parts():
+    assert tokenize("See ERR_4031 in v2.3.1") == ["see", "err_4031", "err", "4031", "in", "v2.3.1", "v2", "3", "1"]
+    index, ids = _index()
+    assert index.search("err_4031")[0][0] == ids[0]
+    assert index.search("4031")[0][0] == ids[0]
+    assert index.search("x-request-id")[0][0] == ids[1]
+    assert index.search("nothing matches this") == []
+
+
+def test_index_follows_removes_payload_updates_and_filters():
+    index, ids = _index()
+    (pid, score, payload), = index.search("refunds", top_k=1)
+    assert pid == ids[2] and score > 0 and "text" not in payload  # texts aren't held in memory
+
+    assert [h[0] for h in index.search("uploads upload", filters={"doc_id": "b"})] == [ids[3]]
+    index.set_payload([ids[3]], {"doc_id": "c"})
+    assert index.search("uploads", filters={"doc_id": "b"}) == []
+
+    index.remove([ids[0]])
+    assert len(index) == 3 and index.search("err_4031") == []
+    rebuilt = BM25Index()
+    assert rebuilt.rebuild(((pid, {"text": t, "doc_id": d}) for pid, (t, d) in DOCS.items()), batch=3) == 4
+    assert rebuilt.ready and rebuilt.search("4031")[0][0] == ids[0]
+
+
+def test_rrf_rewards_agreement_between_rankings():
+    fused = rrf_fuse([["a", "b", "c"], ["b", "d"]], k=60)
+    assert [pid for pid, _ in fused] == ["b", "a", "d", "c"]
+    assert fused[0][1] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused[1][1] == pytest.approx(1 / 61)
+
+
+def test_hybrid_search_fuses_dense_and_lexical():
+    async def run():
+        embedder = HashEmbedder()
+        store = QdrantStore(":memory:", None, "test", embedder.dim)
+        texts = [t for t, _ in DOCS.values()]
+        store.upsert(texts, embedder.embed(texts), [{"point_id": pid, "doc_id": d} for pid, (_, d) in DOCS.items()])
+        index, ids = _index()
+        registry = CollectorRegistry()
+        state = SimpleNamespace(
+            qdrant=AsyncVectorStore(store, Limiter("qdrant", 2)), lexical=index,
+            embed_dispatcher=DirectEmbed(embedder),
+            metrics={"ANN_LATENCY": Histogram("ann", "ann", registry=registry),
+                     "LEXICAL_LATENCY": Histogram("lex", "lex", registry=registry)},
+        )
+        lexical = await search(state, "ERR_4031", 2, None, "lexical")
+        hybrid = await search(state, "ERR_4031", 2, None, "hybrid")
+        dense = {pid: score for pid, score, _ in await search(state, "ERR_4031", 4, None, "dense")}
+        filtered = await search(state, "ERR_4031 refunds", 4, {"doc_id": "b"}, "hybrid")
+        await state.qdrant.aclose()
+        return ids, lexical, hybrid, dense, filtered
+
+    ids, lexical, hybrid, dense, filtered = asyncio.run(run())
+    assert lexical[0][0] == ids[0] and lexical[0][2]["text"].startswith("Error ERR_4031")  # text from the store
+    assert hybrid[0][0] == ids[0] and hybrid[0][2]["fusion_score"] == pytest.approx(2 / 61)  # first in both
+    assert hybrid[0][1] == pytest.approx(dense[ids[0]])  # "score" stays the cosine callers threshold on
+    assert all(h[2]["doc_id"] == "b" for h in filtered) and filtered[0][0] == ids[2]
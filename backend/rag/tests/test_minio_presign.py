@@ -0,0 +1,100 @@
+# tests/test_minio_presign.py
+"""
+Presigned URL cache in MinioStore: a URL is reused until its refresh point, then served stale
+while /v1/retrieve re-signs it in the background, and dropped once it expires. Signing
+failures fall back to an s3:// URL that isn't cached.
+"""
+
+import asyncio
+
+import pytest
+from minio.error import S3Error
+
+from app import minio_client, retrieve
+from app.aio import AsyncMinioStore, Limiter
+
+DAY = 86400.0
+
+
+class _FakeMinio:
+    def __init__(self, endpoint, access_key=None, secret_key=None, secure=False):
+        self.signed = []
+        self.missing = set()
+
+    def bucket_exists(self, bucket):
+        return True
+
+    def presigned_get_object(self, bucket, key, expires):
+        if key in self.missing:
+            raise S3Error("NoSuchKey", "missing", key, None, None, None)
+        self.signed.append(key)
+        return f"https://minio/{bucket}/{key}?sig={len(self.signed)}"
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = _Clock()
+    monkeypatch.setattr(minio_client.time, "time", c.time)
+    return c
+
+
+@pytest.fixture
+def store(monkeypatch, clock):
+    monkeypatch.setattr(minio_client, "Minio", _FakeMinio)
+    return minio_client.MinioStore("http://minio:9000", "a", "s", False, "docs", presign_days=2,
+                                   presign_refresh=0.5, presign_cache_entries=3)
+
+
+def test_reuse_until_refresh_then_stale_then_expired(store, clock):
+    assert store.cached_presigned("k") == (None, True)
+    url = store.presigned_get("k")
+    assert store.presigned_get("k") == url and store.client.signed == ["k"]
+    assert store.cached_presigned("k") == (url, False)
+
+    clock.now += 1.5 * DAY  # past half of the two-day lifetime: still valid, due for refresh
+    assert store.cached_presigned("k") == (url, True)
+    fresh = store.presigned_get("k")
+    assert fresh != url and store.cached_presigned("k") == (fresh, False)
+
+    clock.now += 2 * DAY + 1
+    assert store.cached_presigned("k") == (None, True)
+    assert "k" not in store._presigned
+
+
+def test_lru_bound_and_sign_failures(store):
+    urls = store.presign_many(["a", "b", "c"])
+    assert set(urls) == {"a", "b", "c"}
+    store.cached_presigned("a")  # touch: "b" is now least recently used
+    store.presigned_get("d")
+    assert list(store._presigned) == ["c", "a", "d"]
+
+    store.client.missing.add("gone")
+    assert store.presigned_get("gone") == "s3://docs/gone"
+    assert store.cached_presigned("gone") == (None, True)
+
+
+def test_source_urls_serves_stale_and_refreshes_in_background(store, clock):
+    async def run():
+        minio = AsyncMinioStore(store, Limiter("minio", 2))
+        first = await retrieve._source_urls(minio, {"a", "b"})
+        assert sorted(store.client.signed) == ["a", "b"]
+
+        clock.now += 1.5 * DAY
+        stale = await retrieve._source_urls(minio, {"a", "b"})
+        assert stale == first  # answered from the cache, not signed inline
+        await asyncio.gather(*list(retrieve._background))
+        assert len(store.client.signed) == 4 and not retrieve._refreshing
+
+        fresh = await retrieve._source_urls(minio, {"a", "b"})
+        assert fresh["a"] != first["a"] and len(store.client.signed) == 4
+        minio.close()
+
+    asyncio.run(run())
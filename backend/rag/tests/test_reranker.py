@@ -0,0 +1,82 @@
+# tests/test_reranker.py
+"""
+Cross-encoder rerank stage: hits come back best first by model score, scores are cached per
+(query, text) so a repeat costs no model call, and reranking is skipped (None, first-stage order
+kept) when the model is busy or over budget.
+"""
+
+import asyncio
+import threading
+
+import numpy as np
+
+from app.reranker import Reranker
+
+
+class _FakeCrossEncoder:
+    """Scores a pair by how many query words the text contains."""
+
+    def __init__(self, gate=None):
+        self.calls = []
+        self.gate = gate
+
+    def predict(self, pairs, batch_size, show_progress_bar, convert_to_numpy):
+        self.calls.append(list(pairs))
+        if self.gate is not None:
+            self.gate.wait(5)
+        return np.array([len(set(q.split()) & set(t.split())) for q, t in pairs], dtype=np.float32)
+
+
+def _reranker(model, **kwargs):
+    r = Reranker("fake-cross-encoder", **{"budget_ms": 5000, **kwargs})
+    r._model = model  # never loads sentence_transformers
+    return r
+
+
+def _hits(*texts):
+    return [(f"p{i}", 1.0 - i / 10, {"text": t}) for i, t in enumerate(texts)]
+
+
+def test_orders_by_score_and_caches_pairs():
+    async def run():
+        model = _FakeCrossEncoder()
+        r = _reranker(model)
+        hits = _hits("nothing here", "reset the password", "password")
+        ranked = await r.rerank("reset password", hits, top_k=2)
+        assert [h[0] for h, _ in ranked] == ["p1", "p2"]
+        assert [s for _, s in ranked] == [2.0, 1.0]
+
+        again = await r.rerank("  Reset   PASSWORD ", hits, top_k=3)  # same normalized query
+        assert [h[0] for h, _ in again] == ["p1", "p2", "p0"]
+        assert len(model.calls) == 1
+
+        await r.rerank("reset password", hits + [("p3", 0.5, {"text": "reset"})], top_k=4)
+        assert len(model.calls) == 2 and len(model.calls[1]) == 1  # only the new text is scored
+        assert await r.rerank("reset password", [], top_k=3) == []
+        r.stop()
+
+    asyncio.run(run())
+
+
+def test_skips_when_busy_or_over_budget():
+    async def run():
+        gate = threading.Event()
+        model = _FakeCrossEncoder(gate)
+        r = _reranker(model, max_inflight=1, budget_ms=50)
+        first = asyncio.ensure_future(r.rerank("a", _hits("a b"), top_k=1))
+        await asyncio.sleep(0)
+        assert await r.rerank("b", _hits("b c"), top_k=1) is None  # one batch already in flight
+        assert await first is None  # timed out behind the gate: first-stage order
+        gate.set()
+        while r._inflight:
+            await asyncio.sleep(0.01)
+        ranked = await r.rerank("a", _hits("a b"), top_k=1)  # the abandoned batch filled the cache
+        assert ranked is not None and ranked[0][1] == 1.0
+
+        r._pair_s = 1.0  # measured cost far above the 50 ms budget
+        assert await r.rerank("new query", _hits("x", "y"), top_k=1) is None
+        assert r._pair_s == 0.9  # estimate relaxed for the next ask
+        assert len(model.calls) == 1
+        r.stop()
+
+    asyncio.run(run())
@@ -0,0 +1,134 @@
+# tests/test_vector_store.py
+"""
+Vector stores behind app.state.qdrant: float32 (n, dim) batches go in as arrays, cosine search
+with exact-match payload filters, and the per-document bookkeeping ingest relies on
+(doc_points, get_payloads, set_payload, delete_points). The shared tests run against both
+QdrantStore (":memory:") and LocalVectorStore; the rest cover the local store's files and IVF.
+"""
+
+import numpy as np
+import pytest
+
+from app.qdrant_client import QdrantStore
+from app.vector_store import LocalVectorStore
+
+DIM = 16
+
+
+def _vectors(n, seed=0):
+    rng = np.random.default_rng(seed)
+    v = rng.standard_normal((n, DIM)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def _ids(n):
+    return [f"00000000-0000-0000-0000-{i:012d}" for i in range(n)]
+
+
+@pytest.fixture(params=["qdrant", "local"])
+def store(request, tmp_path):
+    if request.param == "local":
+        s = LocalVectorStore(str(tmp_path), "test", DIM)
+    else:
+        s = QdrantStore(":memory:", None, "test", DIM)
+    yield s
+    s.close()
+
+
+def _load(store, n=50):
+    vectors = _vectors(n)
+    ids = _ids(n)
+    payloads = [{"point_id": pid, "doc_id": f"doc{i % 3}", "chunk_id": i, "content_hash": "h1"}
+                for i, pid in enumerate(ids)]
+    store.upsert([f"text {i}" for i in range(n)], vectors, payloads)
+    return ids, vectors
+
+
+def test_float32_batches_round_trip_and_search_by_cosine(store):
+    ids, vectors = _load(store)
+    hits = store.search(vectors[7], top_k=3)
+    assert str(hits[0].id) == ids[7] and hits[0].score == pytest.approx(1.0, abs=1e-4)
+    assert hits[0].payload["text"] == "text 7" and hits[0].payload["chunk_id"] == 7
+    assert [h.score for h in hits] == sorted((h.score for h in hits), reverse=True)
+
+    filtered = store.search(vectors[7], top_k=5, filters={"doc_id": "doc2"})
+    assert filtered and all(h.payload["doc_id"] == "doc2" for h in filtered)
+    assert str(store.search(vectors[8].astype(np.float64).tolist(), top_k=1)[0].id) == ids[8]  # any array-like
+
+
+def test_document_bookkeeping(store):
+    ids, vectors = _load(store)
+    doc0 = store.doc_points("doc0")
+    assert set(doc0) == set(ids[0::3]) and all(p["content_hash"] == "h1" for p in doc0.values())
+
+    store.set_payload(ids[:2], {"content_hash": "h2"})
+    assert {p["content_hash"] for p in store.get_payloads(ids[:3]).values()} == {"h1", "h2"}
+
+    store.delete_points(ids[0::3])
+    assert store.doc_points("doc0") == {}
+    assert all(str(h.id) not in ids[0::3] for h in store.search(vectors[0], top_k=50))
+    assert len(list(store.iter_points())) == len(ids) - len(ids[0::3])
+
+
+def test_local_store_survives_reopen(tmp_path):
+    s = LocalVectorStore(str(tmp_path), "test", DIM)
+    ids, vectors = _load(s)
+    s.delete_points(ids[:5])
+    s.set_payload(ids[5:6], {"content_hash": "h2"})
+    s.close()
+
+    reopened = LocalVectorStore(str(tmp_path), "test", DIM)
+    try:
+        assert len(list(reopened.iter_points())) == len(ids) - 5
+        assert reopened.get_payloads([ids[0], ids[5]]) == {
+            ids[5]: {"point_id": ids[5], "doc_id": "doc2", "chunk_id": 5, "content_hash": "h2", "text": "text 5"}}
+        hit = reopened.search(vectors[9], top_k=1)[0]
+        assert hit.id == ids[9] and hit.score == pytest.approx(1.0, abs=1e-4)
+    finally:
+        reopened.close()
+
+
+def test_local_upsert_of_same_id_replaces_and_deleted_rows_are_reused(tmp_path):
+    s = LocalVectorStore(str(tmp_path), "test", DIM)
+    try:
+        ids, vectors = _load(s, n=10)
+        s.upsert(["moved"], vectors[3:4], [{"point_id": ids[0], "doc_id": "doc0"}])
+        assert len(list(s.iter_points())) == 10
+        hits = s.search(vectors[3], top_k=2)
+        assert {h.id for h in hits} == {ids[0], ids[3]}
+        assert s.get_payloads([ids[0]])[ids[0]]["text"] == "moved"
+
+        s.delete_points(ids[5:8])
+        assert all(h.id not in ids[5:8] for h in s.search(vectors[6], top_k=10))
+        fresh = _vectors(3, seed=1)
+        new_ids = [f"00000000-0000-0000-0001-{i:012d}" for i in range(3)]
+        s.upsert(["new"] * 3, fresh, [{"point_id": pid, "doc_id": "new"} for pid in new_ids])
+        assert len(s._ids) == 10  # freed rows were reused
+        assert s.search(fresh[1], top_k=1)[0].id == new_ids[1]
+    finally:
+        s.close()
+
+
+def test_local_ivf_search_finds_exact_neighbours(tmp_path):
+    n = 600
+    exact = LocalVectorStore(str(tmp_path), "exact", DIM, ivf_min_points=n + 1)
+    ivf = LocalVectorStore(str(tmp_path), "ivf", DIM, ivf_min_points=n, ivf_nprobe=8)
+    try:
+        ids, vectors = _load(exact, n)
+        _load(ivf, n)
+        assert exact._ivf is None and ivf._ivf is not None
+        queries = _vectors(20, seed=2)
+        found = 0
+        for q in queries:
+            truth = {h.id for h in exact.search(q, top_k=5)}
+            found += len(truth.intersection(h.id for h in ivf.search(q, top_k=5)))
+        assert found / (5 * len(queries)) >= 0.8
+        assert ivf.search(vectors[42], top_k=1)[0].id == ids[42]
+
+        filtered = ivf.search(vectors[42], top_k=3, filters={"doc_id": "doc1"})
+        assert len(filtered) == 3 and all(h.payload["doc_id"] == "doc1" for h in filtered)
+        ivf.delete_points([ids[42]])
+        assert all(h.id != ids[42] for h in ivf.search(vectors[42], top_k=5))
+    finally:
+        exact.close()
+        ivf.close()
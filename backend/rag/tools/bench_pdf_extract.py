@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+PDF text extraction: the original single-threaded pass (extract_from_pdf) vs the ingest
+job path (page-range shards across the process pool, per-page timeouts).
+
+A synthetic text PDF is generated unless a file is given. Only extraction is timed; chunking,
+embedding and upsert are out of scope here.
+Usage: PYTHONPATH=. python tools/bench_pdf_extract.py [--pages 300] [--workers 4] [--file manual.pdf]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from app import ingest
+from app.ingest import _iter_pdf_pages, extract_from_pdf
+from app.jobs import IngestJob, IngestJobManager
+
+
+def synthetic_pdf(pages: int, lines: int = 45) -> bytes:
+    """Minimal multi-page PDF with `lines` lines of Helvetica text per page."""
+    objs = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for p in range(pages):
+        body = "BT /F1 9 Tf 40 800 Td 11 TL " + " ".join(
+            f"(Page {p + 1} line {n}: lorem ipsum dolor sit amet consectetur adipiscing elit sed do) '"
+            for n in range(lines)
+        ) + " ET"
+        stream = body.encode("latin-1")
+        objs.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_ref = len(objs)
+        objs.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                    b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref)
+        kids.append(len(objs))
+    objs[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join(f"{k} 0 R" for k in kids).encode(), pages)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objs, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objs) + 1)
+    out += b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objs) + 1, xref)
+    return bytes(out)
+
+
+async def sharded(data: bytes, workers: int):
+    jobs = IngestJobManager(max_concurrent=1, worker_processes=workers)
+    try:
+        return [p async for p in _iter_pdf_pages(jobs, IngestJob("bench"), data)]
+    finally:
+        await jobs.shutdown()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=300)
+    ap.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    ap.add_argument("--shard", type=int, default=ingest.PAGE_SHARD)
+    ap.add_argument("--file", default=None)
+    args = ap.parse_args()
+    ingest.PAGE_SHARD = args.shard
+
+    if args.file:
+        with open(args.file, "rb") as fh:
+            data = fh.read()
+    else:
+        data = synthetic_pdf(args.pages)
+    print(f"{len(data) / 2**20:.1f} MiB PDF, {args.workers} workers, {args.shard} pages/shard")
+
+    t0 = time.perf_counter()
+    legacy = extract_from_pdf(data)
+    t_legacy = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    pages = asyncio.run(sharded(data, args.workers))
+    t_sharded = time.perf_counter() - t0
+
+    assert [p["page"] for p in pages] == [p["page"] for p in legacy]
+    assert [p["text"] for p in pages] == [p["text"] for p in legacy]
+    print(f"single-threaded: {t_legacy:7.2f} s  ({len(legacy)} pages)")
+    print(f"sharded pool   : {t_sharded:7.2f} s  (incl. pool start-up)")
+    print(f"speedup: {t_legacy / t_sharded:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Retrieval quality and latency by /v1/retrieve mode (dense, lexical, hybrid) on a fixture corpus.
+
+Each fixture document is indexed as one chunk in Qdrant (local ":memory:" mode unless
+--qdrant-url is given) and in the BM25 index; every query runs through app.retrieve.search,
+the same code path as the endpoint. Reports recall@k and MRR@k against the fixture's relevant
+doc ids, and p50/p95/p99 latency over --repeat runs per query.
+
+The default corpus (tools/fixtures/support_corpus.json) mixes identifier lookups (error codes,
+header names, versions) with paraphrased questions. --model hash swaps the sentence-transformers
+model for a hashed character-trigram vectorizer, for machines without the model; its dense
+numbers say nothing about the real model.
+
+Usage: PYTHONPATH=. python tools/bench_retrieval.py [--model NAME|hash] [--corpus FILE] [--k 3] [--repeat 20]
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import zlib
+from types import SimpleNamespace
+from typing import List
+from uuid import uuid4
+
+import numpy as np
+from prometheus_client import CollectorRegistry, Histogram
+
+from app.aio import AsyncVectorStore, Limiter
+from app.lexical import BM25Index
+from app.qdrant_client import QdrantStore
+from app.retrieve import MODES, search
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "support_corpus.json")
+
+
+class HashEmbedder:
+    model_name = "hash-trigram"
+    dim = 512
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            padded = f"  {text.lower()} "
+            for i in range(len(padded) - 2):
+                out[row, zlib.crc32(padded[i:i + 3].encode("utf-8")) % self.dim] += 1.0
+        out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-9)
+        return out
+
+
+class DirectEmbed:
+    """Query embedding without the dispatcher's batching window, so it isn't what's measured."""
+
+    def __init__(self, embedder):
+        self.embedder = embedder
+
+    async def embed(self, text: str) -> np.ndarray:
+        return (await asyncio.to_thread(self.embedder.embed, [text]))[0]
+
+
+def _pct(samples: List[float], p: float) -> float:
+    return float(np.percentile(np.asarray(samples), p)) * 1000.0
+
+
+async def run(args) -> None:
+    with open(args.corpus, encoding="utf-8") as f:
+        corpus = json.load(f)
+    docs, queries = corpus["docs"], corpus["queries"]
+
+    if args.model == "hash":
+        embedder = HashEmbedder()
+    else:
+        from app.embedder import Embedder
+        embedder = Embedder(args.model)
+
+    store = QdrantStore(url=args.qdrant_url, api_key=None, collection=f"bench_retrieval_{uuid4().hex[:8]}",
+                        vector_size=embedder.dim)
+    texts = [d["text"] for d in docs]
+    payloads = [{"point_id": str(uuid4()), "doc_id": d["id"], "chunk_id": 0} for d in docs]
+    store.upsert(texts, embedder.embed(texts), payloads)
+    lexical = BM25Index()
+    lexical.add([p["point_id"] for p in payloads], texts, payloads)
+
+    registry = CollectorRegistry()
+    state = SimpleNamespace(
+        qdrant=AsyncVectorStore(store, Limiter("qdrant", 16)),
+        lexical=lexical,
+        embed_dispatcher=DirectEmbed(embedder),
+        metrics={
+            "ANN_LATENCY": Histogram("ann", "ann", registry=registry),
+            "LEXICAL_LATENCY": Histogram("lex", "lex", registry=registry),
+        },
+    )
+    print(f"{len(docs)} docs, {len(queries)} queries, model={embedder.model_name}, k={args.k}, repeat={args.repeat}")
+    print(f"{'mode':>8} {'recall@k':>9} {'mrr@k':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+
+    try:
+        for mode in MODES:
+            await search(state, "warm up", args.k, None, mode)
+            hits_at_k = 0.0
+            rr = 0.0
+            latencies: List[float] = []
+            for query in queries:
+                relevant = set(query["relevant"])
+                for _ in range(args.repeat):
+                    t0 = time.perf_counter()
+                    hits = await search(state, query["q"], args.k, None, mode)
+                    latencies.append(time.perf_counter() - t0)
+                ranked = [payload.get("doc_id") for _, _, payload in hits]
+                hits_at_k += len(relevant.intersection(ranked)) / len(relevant)
+                rr += next((1.0 / i for i, doc_id in enumerate(ranked, start=1) if doc_id in relevant), 0.0)
+            n = len(queries)
+            print(f"{mode:>8} {hits_at_k / n:9.3f} {rr / n:7.3f} "
+                  f"{_pct(latencies, 50):8.2f} {_pct(latencies, 95):8.2f} {_pct(latencies, 99):8.2f}")
+    finally:
+        store.client.delete_collection(store.collection)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default=os.getenv("EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2"))
+    ap.add_argument("--corpus", default=FIXTURE)
+    ap.add_argument("--k", type=int, default=3)
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--qdrant-url", default=":memory:")
+    asyncio.run(run(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
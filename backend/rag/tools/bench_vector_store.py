@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Vector store hot path offline: search latency and recall of the stores behind app.state.qdrant.
+
+local-exact: LocalVectorStore below its IVF threshold (exact scan of the memory-mapped matrix)
+local-ivf:   LocalVectorStore with the IVF index built
+qdrant:      QdrantStore in qdrant-client's ":memory:" mode, or a server with --qdrant-url
+
+Vectors are synthetic and clustered (--clusters centers plus noise, L2-normalized), which is
+closer to real embeddings than uniform noise; queries are perturbed corpus points. Recall@k
+is measured against exact search. The local stores write to a temporary directory.
+
+Usage: PYTHONPATH=. python tools/bench_vector_store.py [--points 50000] [--dim 384] [--queries 200] [--k 10]
+"""
+import argparse
+import tempfile
+import time
+from uuid import uuid4
+
+import numpy as np
+
+from app.vector_store import LocalVectorStore
+
+
+def _data(args):
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((args.clusters, args.dim), dtype=np.float32)
+    vectors = centers[rng.integers(0, args.clusters, args.points)] + 0.6 * rng.standard_normal(
+        (args.points, args.dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = vectors[rng.integers(0, args.points, args.queries)] + 0.2 * rng.standard_normal(
+        (args.queries, args.dim), dtype=np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return vectors, queries
+
+
+def _load(store, vectors, batch=4096):
+    ids = [str(uuid4()) for _ in range(len(vectors))]
+    t0 = time.perf_counter()
+    for start in range(0, len(vectors), batch):
+        part = ids[start:start + batch]
+        store.upsert([""] * len(part), vectors[start:start + batch],
+                     [{"point_id": pid, "doc_id": "bench"} for pid in part])
+    return ids, time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--points", type=int, default=50_000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--clusters", type=int, default=200)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--nprobe", type=int, default=8)
+    ap.add_argument("--qdrant-url", default=":memory:")
+    ap.add_argument("--skip-qdrant", action="store_true")
+    args = ap.parse_args()
+
+    vectors, queries = _data(args)
+    truth = np.argsort(-(queries @ vectors.T), axis=1)[:, : args.k]
+    print(f"{args.points} points x {args.dim} dims, {args.queries} queries, k={args.k}")
+    print(f"{'store':>12} {'load s':>8} {'p50 ms':>8} {'p95 ms':>8} {'recall@k':>9}")
+
+    stores = []
+    tmp = tempfile.TemporaryDirectory()
+    stores.append(("local-exact", LocalVectorStore(tmp.name, "exact", args.dim, ivf_min_points=args.points + 1)))
+    # IVF built once, when the last batch lands
+    stores.append(("local-ivf", LocalVectorStore(tmp.name, "ivf", args.dim, ivf_min_points=args.points,
+                                                 ivf_nprobe=args.nprobe)))
+    if not args.skip_qdrant:
+        from app.qdrant_client import QdrantStore
+        stores.append(("qdrant", QdrantStore(url=args.qdrant_url, api_key=None,
+                                             collection=f"bench_store_{uuid4().hex[:8]}", vector_size=args.dim)))
+
+    for name, store in stores:
+        ids, load_s = _load(store, vectors)
+        row_of = {pid: i for i, pid in enumerate(ids)}
+        latencies = []
+        found = 0
+        for qi, q in enumerate(queries):
+            t0 = time.perf_counter()
+            hits = store.search(q, top_k=args.k)
+            latencies.append(time.perf_counter() - t0)
+            found += len(set(truth[qi]).intersection(row_of[str(h.id)] for h in hits))
+        lat = np.asarray(latencies) * 1000.0
+        print(f"{name:>12} {load_s:8.2f} {np.percentile(lat, 50):8.3f} {np.percentile(lat, 95):8.3f} "
+              f"{found / (args.k * len(queries)):9.3f}")
+        if name == "qdrant":
+            store.client.delete_collection(store.collection)
+        store.close()
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Ingest-side vector path: peak Python memory and wall time for embedding output -> Qdrant.
+
+legacy:  per-vector .tolist(), then [float(x) for x in vec] per point into PointStruct lists
+float32: one contiguous (n, dim) float32 array handed to QdrantStore.upsert (bulk uploader)
+
+Vectors are random and L2-normalized by default so the model isn't what's measured; pass
+--model to embed real chunks. Qdrant runs in qdrant-client's local ":memory:" mode unless
+--qdrant-url is given.
+
+Usage: PYTHONPATH=. python tools/bench_vectors.py [--chunks 10000] [--dim 384] [--model NAME] [--qdrant-url URL]
+"""
+import argparse
+import time
+import tracemalloc
+from uuid import uuid4
+
+import numpy as np
+from qdrant_client.models import PointStruct
+
+from app.qdrant_client import QdrantStore
+
+
+def _vectors(args, texts):
+    if args.model:
+        from app.embedder import Embedder
+        return Embedder(args.model).embed(texts)
+    v = np.random.default_rng(0).standard_normal((len(texts), args.dim), dtype=np.float32)
+    v /= np.linalg.norm(v, axis=1, keepdims=True)
+    return v
+
+
+def legacy(store, texts, vectors, payloads):
+    as_lists = [v.tolist() for v in vectors]  # old Embedder.embed
+    points = []
+    for txt, vec, payload in zip(texts, as_lists, payloads):  # old QdrantStore.upsert
+        payload = dict(payload)
+        payload["text"] = txt
+        points.append(PointStruct(id=str(uuid4()), vector=[float(x) for x in vec], payload=payload))
+    store.client.upsert(collection_name=store.collection, points=points)
+
+
+def float32(store, texts, vectors, payloads):
+    store.upsert(texts=texts, vectors=vectors, payloads=payloads)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chunks", type=int, default=10_000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--model", default=None)
+    ap.add_argument("--qdrant-url", default=":memory:")
+    args = ap.parse_args()
+
+    texts = [f"chunk {i} " + "lorem ipsum " * 60 for i in range(args.chunks)]
+    vectors = _vectors(args, texts)
+    payloads = [{"doc_id": "bench", "chunk_id": i, "page": 0} for i in range(args.chunks)]
+    print(f"{args.chunks} chunks x {vectors.shape[1]} dims, qdrant={args.qdrant_url}")
+
+    for name, fn in (("legacy", legacy), ("float32", float32)):
+        store = QdrantStore(url=args.qdrant_url, api_key=None, collection=f"bench_{name}_{uuid4().hex[:8]}",
+                            vector_size=vectors.shape[1])
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        fn(store, texts, vectors, payloads)
+        wall = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        store.client.delete_collection(store.collection)
+        print(f"{name:>8}: {wall:7.2f} s wall, {peak / 2**20:8.1f} MiB peak (Python allocations)")
+
+
+if __name__ == "__main__":
+    main()
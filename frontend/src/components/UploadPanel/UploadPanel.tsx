@@ -10,7 +10,8 @@ export function UploadPanel(){
     if(!file) return
     const res = await ingest(file)
     setDocId(res.doc_id)
-    alert(`Ingested: ${res.doc_id} chunks=${res.chunks_ingested}`)
+    // indexing runs in the background: the response is the queued job, not its result
+    alert(`Ingest ${res.status}: ${res.doc_id} job=${res.job_id}`)
   }
 
   async function doRetrieve(){
@@ -35,7 +35,7 @@ export const handlers = [
     })
     return new Response(stream, { headers: { 'Content-Type': 'text/event-stream' } })
   }),
-  http.post('*/v1/ingest', async () => { await delay(200); return json({ doc_id: `doc_${Math.random().toString(36).slice(2,7)}`, chunks_ingested: 5 }) }),
+  http.post('*/v1/ingest', async () => { await delay(200); return json({ job_id: Math.random().toString(16).slice(2), doc_id: `doc_${Math.random().toString(36).slice(2,7)}`, status: 'queued' }) }),
   http.get('*/v1/retrieve', async ({ request }) => {
     await delay(200)
     const url = new URL(request.url)